@@ -0,0 +1,334 @@
+"""
+langfarm hooks 的离线基准测试，请求由 mock 的 _do_call 返回，不需要 API key 和 langfuse 服务。
+
+测量：
+- import：各模块在新进程中的导入耗时（dashscope、langfuse callback 与对应的 langfarm hook）
+- call：Generation.call 同步、流式、重试路径每次调用的耗时，与直接调用 _do_call 的差值即 langfarm 的额外开销
+- stream：长流式（默认 2000 个 chunk）每个 chunk 的处理耗时，以及启用指标（langfarm.hooks.metrics）后的耗时
+- callback：langfuse 原来的 _parse_usage 与 hook 后的 usage 解析
+- alloc：每次调用的峰值内存、调用后仍存活的内存块数（tracemalloc）
+
+结果为 JSON，每一项为 {"name", "value", "unit"}，数值越小越好，可与之前版本的结果比较：
+
+    python benchmarks/bench_hooks.py --output bench.json
+    python benchmarks/bench_hooks.py --quick --compare bench.json --threshold 0.2
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from importlib import metadata
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from dashscope.api_entities.dashscope_response import GenerationOutput, GenerationResponse, GenerationUsage
+from langfuse.decorators import langfuse_context, observe
+
+from langfarm.hooks.dashscope import Generation, RetryPolicy
+from langfarm.hooks.metrics import disable_metrics, enable_metrics
+
+OUTPUT_TEXT = "mock for benchmark"
+IMPORT_MODULES = [
+    "langfarm.hooks",
+    "dashscope",
+    "langfarm.hooks.dashscope",
+    "langfuse.callback",
+    "langfarm.hooks.langfuse.callback",
+    "langchain_community.llms.tongyi",
+    "langfarm.hooks.langchain_community.llms.tongyi",
+    "langchain_community.chat_models.tongyi",
+    "langfarm.hooks.langchain_community.chat_models.tongyi",
+]
+
+
+def _response(status_code: int = 200, text: str = OUTPUT_TEXT, output_tokens: int = 5) -> GenerationResponse:
+    return GenerationResponse(
+        status_code=status_code,
+        code="" if status_code == 200 else "Throttling",
+        message="",
+        usage=GenerationUsage(input_tokens=20, output_tokens=output_tokens),
+        output=GenerationOutput(text=text, finish_reason="stop"),
+    )
+
+
+class BenchGeneration(Generation):
+    """非流式返回固定响应，流式返回 chunk_cnt 个增量 chunk。"""
+
+    chunk_cnt = 2000
+
+    @classmethod
+    def _do_call(cls, model: str, **kwargs: Any) -> Any:
+        if kwargs.get("stream"):
+            return (_response(text="x", output_tokens=i + 1) for i in range(cls.chunk_cnt))
+        return _response()
+
+
+class BenchRetryGeneration(Generation):
+    """每次调用的第一次请求返回 429，第二次成功。"""
+
+    fail_next = True
+
+    @classmethod
+    def _do_call(cls, model: str, **kwargs: Any) -> Any:
+        cls.fail_next = not cls.fail_next
+        return _response(429) if not cls.fail_next else _response()
+
+
+# 重试不等待，只测量重试路径本身的开销
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+
+@observe(as_type="generation", capture_input=False, capture_output=False)
+def _observed(fn: Callable[..., Any], **kwargs: Any) -> Any:
+    # langfarm 的 observation 更新需要在 observe 上下文中，基线也在同样的上下文中执行
+    result = fn(**kwargs)
+    if isinstance(result, Iterator):
+        for _ in result:
+            pass
+    return result
+
+
+def _raw_call():
+    return _observed(BenchGeneration._do_call, model="qwen-plus", prompt="你好")
+
+
+def _hook_call():
+    return _observed(BenchGeneration.call, model="qwen-plus", prompt="你好")
+
+
+def _retry_call():
+    return _observed(BenchRetryGeneration.call, model="qwen-plus", prompt="你好", retry_policy=NO_WAIT_RETRY)
+
+
+def _raw_stream():
+    return _observed(BenchGeneration._do_call, model="qwen-plus", prompt="你好", stream=True)
+
+
+def _hook_stream():
+    return _observed(BenchGeneration.call, model="qwen-plus", prompt="你好", stream=True, incremental_output=True)
+
+
+def _time_per_op(fn: Callable[[], Any], number: int, rounds: int) -> float:
+    """rounds 轮、每轮 number 次，返回每次耗时（ns）的中位数。"""
+    fn()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter_ns() - start) / number)
+    return statistics.median(samples)
+
+
+def _time_with_metrics(fn: Callable[[], Any], number: int, rounds: int) -> tuple:
+    """
+    每轮交替测量关闭、启用指标时每次的耗时（ns），返回两者的中位数和每轮差值的中位数。
+    同一轮内比较，机器负载的漂移不会使差值为负。
+    """
+    fn()
+    off, on, diffs = [], [], []
+    for _ in range(rounds):
+        samples = []
+        for enabled in (False, True):
+            if enabled:
+                enable_metrics()
+            try:
+                start = time.perf_counter_ns()
+                for _ in range(number):
+                    fn()
+                samples.append((time.perf_counter_ns() - start) / number)
+            finally:
+                disable_metrics()
+        off.append(samples[0])
+        on.append(samples[1])
+        diffs.append(samples[1] - samples[0])
+    return statistics.median(off), statistics.median(on), statistics.median(diffs)
+
+
+def _alloc_per_op(fn: Callable[[], Any], number: int) -> Dict[str, float]:
+    """每次调用的峰值分配字节数、调用 number 次后仍存活的内存块数（除以 number）。"""
+    fn()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peak = 0
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, op_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, op_peak - current)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_bytes": peak, "retained_blocks": retained / number}
+
+
+def _import_time(module: str, rounds: int) -> float:
+    """新进程中导入 module 的耗时（ms）的最小值，不包含 Python 解释器的启动。"""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    env = {**os.environ, "LANGFARM_AUTO_HOOK": "1"}
+    samples = []
+    for _ in range(rounds):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+        samples.append(float(output.stdout.strip().splitlines()[-1]) * 1000)
+    return min(samples)
+
+
+class Suite:
+    def __init__(self, quick: bool = False):
+        self.number = 50 if quick else 500
+        self.rounds = 3 if quick else 7
+        self.import_rounds = 1 if quick else 5
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, name: str, value: float, unit: str):
+        self.results.append({"name": name, "value": round(value, 3), "unit": unit})
+        print(f"{name:<64} {value:>14.3f} {unit}", file=sys.stderr)
+
+    def bench_import(self):
+        for module in IMPORT_MODULES:
+            try:
+                self.add(f"import.{module}", _import_time(module, self.import_rounds), "ms")
+            except subprocess.CalledProcessError as e:
+                print(f"skip import.{module}: {e.stderr.strip().splitlines()[-1]}", file=sys.stderr)
+
+    def bench_call(self):
+        raw = _time_per_op(_raw_call, self.number, self.rounds)
+        hook = _time_per_op(_hook_call, self.number, self.rounds)
+        retry = _time_per_op(_retry_call, self.number, self.rounds)
+        self.add("call.sync.raw_do_call", raw, "ns/op")
+        self.add("call.sync.langfarm", hook, "ns/op")
+        self.add("call.sync.overhead", hook - raw, "ns/op")
+        self.add("call.retry.langfarm", retry, "ns/op")
+        self.add("call.retry.overhead", retry - raw, "ns/op")
+
+    def bench_stream(self):
+        number = max(1, self.number // 50)
+        raw = _time_per_op(_raw_stream, number, self.rounds)
+        hook, with_metrics, metrics_overhead = _time_with_metrics(_hook_stream, number, self.rounds)
+        chunks = BenchGeneration.chunk_cnt
+        self.add("stream.raw_do_call", raw / chunks, "ns/chunk")
+        self.add("stream.langfarm", hook / chunks, "ns/chunk")
+        self.add("stream.overhead", (hook - raw) / chunks, "ns/chunk")
+        self.add("stream.langfarm_metrics", with_metrics / chunks, "ns/chunk")
+        self.add("stream.metrics.overhead", metrics_overhead / chunks, "ns/chunk")
+
+    def bench_callback(self):
+        from langchain_core.outputs import Generation as LCGeneration
+        from langchain_core.outputs import LLMResult
+
+        from langfarm.hooks.langfuse.callback import CallbackHandler
+        from langfarm.hooks.langfuse.callback.langchain import hook_parse_usage, langfuse_parse_usage
+
+        token_usage = {"input_tokens": 20, "output_tokens": 5, "total_tokens": 25}
+        result = LLMResult(generations=[[LCGeneration(text="mock", generation_info={"token_usage": token_usage})]])
+        handler = CallbackHandler()
+        number = self.number * 10
+        self.add(
+            "callback.parse_usage.langfuse",
+            _time_per_op(lambda: langfuse_parse_usage(result), number, self.rounds),
+            "ns/op",
+        )
+        self.add(
+            "callback.parse_usage.langfarm",
+            _time_per_op(lambda: hook_parse_usage(result), number, self.rounds),
+            "ns/op",
+        )
+        self.add(
+            "callback.handler.parse_usage",
+            _time_per_op(lambda: handler.parse_usage(result, uuid.uuid4()), number, self.rounds),
+            "ns/op",
+        )
+
+    def bench_alloc(self):
+        number = max(10, self.number // 10)
+        for name, fn, n in (
+            ("call.sync.raw_do_call", _raw_call, number),
+            ("call.sync.langfarm", _hook_call, number),
+            ("stream.langfarm", _hook_stream, 3),
+        ):
+            alloc = _alloc_per_op(fn, n)
+            self.add(f"alloc.{name}.peak_bytes", alloc["peak_bytes"], "bytes/op")
+            self.add(f"alloc.{name}.retained_blocks", alloc["retained_blocks"], "blocks/op")
+
+    def run(self, groups: List[str]) -> Dict[str, Any]:
+        for group in groups:
+            getattr(self, f"bench_{group}")()
+        return {"meta": _meta(), "results": self.results}
+
+
+def _meta() -> Dict[str, Any]:
+    versions = {}
+    for dist in ("langfarm", "dashscope", "langfuse", "langchain-core", "langchain-community"):
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            versions[dist] = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": versions,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """返回比基线慢（大）超过 threshold 比例的项。overhead 等差值项波动大，只比较绝对值。"""
+    base = {r["name"]: r["value"] for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        old = base.get(r["name"])
+        if old is None or old <= 0 or r["name"].endswith(".overhead"):
+            continue
+        ratio = r["value"] / old - 1
+        if ratio > threshold:
+            regressions.append(f"{r['name']}: {old} -> {r['value']} {r['unit']} (+{ratio:.0%})")
+    return regressions
+
+
+GROUPS = ["import", "call", "stream", "callback", "alloc"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for langfarm hooks.")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到 stdout")
+    parser.add_argument("--quick", action="store_true", help="减少迭代次数，用于快速检查")
+    parser.add_argument("--group", action="append", choices=GROUPS, help=f"只运行指定的组，默认全部：{GROUPS}")
+    parser.add_argument("--compare", help="与之前的结果 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="比较时允许变慢的比例")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    langfuse_context.configure(enabled=False)
+
+    result = Suite(args.quick).run(args.group or GROUPS)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+本地的 DashScope 文本生成服务替身，只依赖标准库，用于离线的性能测试（不需要 API key）。
+
+实现 ``POST /api/v1/services/aigc/text-generation/generation``：非流式返回 JSON，
+请求头 ``X-DashScope-SSE: enable`` 时按 SSE 流式返回（incremental_output、result_format 与 DashScope 一致）。
+可配置首字节延迟、每个 chunk 的间隔、输出 token 数、usage，以及按比例注入 429、5xx、流式中途的错误。
+
+    python benchmarks/dashscope_stub.py --port 8089 --latency 0.2 --chunk-interval 0.02 --error-429 0.05
+
+dashscope 指向替身服务：
+
+    dashscope.base_http_api_url = "http://127.0.0.1:8089/api/v1"
+
+也可以在进程内启动（端口为 0 时随机选择）：
+
+    with StubServer(StubOptions(latency=0.1)) as server:
+        dashscope.base_http_api_url = server.base_url
+"""
+
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+GENERATION_PATH = "/api/v1/services/aigc/text-generation/generation"
+OUTPUT_TEXT = "春眠不觉晓处处闻啼鸟夜来风雨声花落知多少"
+
+
+class StubOptions:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        chunk_interval: float = 0.0,
+        output_tokens: int = 20,
+        input_tokens: Optional[int] = None,
+        error_429: float = 0.0,
+        error_5xx: float = 0.0,
+        stream_error: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        :param latency: 首字节之前的延迟（秒）
+        :param latency_jitter: 延迟增加 [0, latency_jitter) 的随机值
+        :param chunk_interval: 每个输出 token 的生成时间（秒），流式为 chunk 的间隔，非流式累加到响应时间
+        :param output_tokens: 输出 token 数，每个 token 一个字、流式一个 chunk
+        :param input_tokens: usage 中的输入 token 数，None 时为输入的字数
+        :param error_429: 返回 429 Throttling 的比例
+        :param error_5xx: 返回 500 InternalError 的比例
+        :param stream_error: 流式输出一半后返回错误事件的比例
+        :param seed: 随机数种子
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.chunk_interval = chunk_interval
+        self.output_tokens = output_tokens
+        self.input_tokens = input_tokens
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.stream_error = stream_error
+        self.random = random.Random(seed)
+
+
+def _input_chars(body: Dict[str, Any]) -> int:
+    data = body.get("input") or {}
+    cnt = len(data.get("prompt") or "")
+    for message in (data.get("history") or []) + (data.get("messages") or []):
+        for value in message.values():
+            if isinstance(value, str):
+                cnt += len(value)
+    return cnt
+
+
+def _output(text: str, finish_reason: str, result_format: Optional[str]) -> Dict[str, Any]:
+    if result_format == "message":
+        return {
+            "choices": [{"finish_reason": finish_reason, "message": {"role": "assistant", "content": text}}],
+        }
+    return {"text": text, "finish_reason": finish_reason}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive，与真实服务一样复用连接
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def setup(self):
+        super().setup()
+        # 流式的小 chunk 立即发送，避免 Nagle 算法与延迟确认叠加的 40ms 延迟
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path.split("?")[0] != GENERATION_PATH:
+            self._send_json(404, {"code": "NotFound", "message": f"{self.path} not found"})
+            return
+
+        options = self.server.options
+        request_id = str(uuid.uuid4())
+        stream = self.headers.get("X-DashScope-SSE") == "enable"
+        time.sleep(options.latency + options.random.random() * options.latency_jitter)
+
+        dice = options.random.random()
+        if dice < options.error_429:
+            self._send_error(429, "Throttling", "Requests rate limit exceeded, please try again later.", request_id)
+            return
+        if dice < options.error_429 + options.error_5xx:
+            self._send_error(500, "InternalError", "An internal error has occured, please try again later.", request_id)
+            return
+
+        parameters = body.get("parameters") or {}
+        input_tokens = options.input_tokens if options.input_tokens is not None else _input_chars(body)
+        if stream:
+            fail_at = options.output_tokens // 2 if options.random.random() < options.stream_error else None
+            self._send_stream(parameters, input_tokens, request_id, fail_at)
+        else:
+            time.sleep(options.chunk_interval * options.output_tokens)
+            text = "".join(OUTPUT_TEXT[i % len(OUTPUT_TEXT)] for i in range(options.output_tokens))
+            self._send_json(
+                200,
+                {
+                    "output": _output(text, "stop", parameters.get("result_format")),
+                    "usage": self._usage(input_tokens, options.output_tokens),
+                    "request_id": request_id,
+                },
+            )
+
+    @staticmethod
+    def _usage(input_tokens: int, output_tokens: int) -> Dict[str, int]:
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _send_json(self, status: int, data: Dict[str, Any]):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.record(status)
+
+    def _send_error(self, status: int, code: str, message: str, request_id: str):
+        self._send_json(status, {"code": code, "message": message, "request_id": request_id})
+
+    def _write_chunk(self, data: bytes):
+        # chunked 编码，流式结束后连接可以复用
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_stream(self, parameters: Dict[str, Any], input_tokens: int, request_id: str, fail_at: Optional[int]):
+        options = self.server.options
+        incremental = parameters.get("incremental_output", False)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream;charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        text = ""
+        status = 200
+        try:
+            for i in range(options.output_tokens):
+                if i > 0:
+                    time.sleep(options.chunk_interval)
+                if i == fail_at:
+                    status = 500
+                    data = {"code": "InternalError", "message": "mock mid-stream error", "request_id": request_id}
+                    event = f"id:{i + 1}\nevent:error\nstatus:500\ndata:{json.dumps(data)}\n\n"
+                    self._write_chunk(event.encode("utf-8"))
+                    break
+                token = OUTPUT_TEXT[i % len(OUTPUT_TEXT)]
+                text += token
+                finish_reason = "stop" if i == options.output_tokens - 1 else "null"
+                data = {
+                    "output": _output(token if incremental else text, finish_reason, parameters.get("result_format")),
+                    "usage": self._usage(input_tokens, i + 1),
+                    "request_id": request_id,
+                }
+                event = f"id:{i + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{json.dumps(data, ensure_ascii=False)}\n\n"
+                self._write_chunk(event.encode("utf-8"))
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 调用方提前关闭了连接
+            status = 499
+            self.close_connection = True
+        self.server.record(status)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, options: Optional[StubOptions] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), StubHandler)
+        self.options = options or StubOptions()
+        self._lock = threading.Lock()
+        # 状态码 -> 请求数，499 为调用方提前断开
+        self.status_counts: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def handle_error(self, request: Any, client_address: Any):
+        # 调用方关闭 keep-alive 连接是正常的，不打印异常
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def record(self, status: int):
+        with self._lock:
+            self.status_counts[status] += 1
+
+    def start(self) -> "StubServer":
+        """在后台线程中启动。"""
+        self._thread = threading.Thread(target=self.serve_forever, name="dashscope-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *args: Any):
+        self.stop()
+
+
+def add_options_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.0, help="首字节之前的延迟（秒）")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="延迟增加 [0, jitter) 的随机值（秒）")
+    parser.add_argument("--chunk-interval", type=float, default=0.0, help="每个输出 token 的生成时间（秒）")
+    parser.add_argument("--output-tokens", type=int, default=20, help="输出 token 数")
+    parser.add_argument("--input-tokens", type=int, help="usage 的输入 token 数，默认为输入的字数")
+    parser.add_argument("--error-429", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--stream-error", type=float, default=0.0, help="流式输出一半后返回错误的比例")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+
+
+def options_from_args(args: argparse.Namespace) -> StubOptions:
+    return StubOptions(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        chunk_interval=args.chunk_interval,
+        output_tokens=args.output_tokens,
+        input_tokens=args.input_tokens,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        stream_error=args.stream_error,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the DashScope text generation API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_options_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = StubServer(options_from_args(args), args.host, args.port)
+    print(f"dashscope stub listening, set dashscope.base_http_api_url = {server.base_url!r}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"status counts: {dict(server.status_counts)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
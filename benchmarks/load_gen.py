@@ -0,0 +1,222 @@
+"""
+Generation.call 的压测：按目标 QPS（开环）或固定并发（闭环）调用，统计吞吐量、延迟分位数、错误。
+
+默认在进程内启动 dashscope_stub 替身服务，不需要 API key，langfuse 默认关闭：
+
+    python benchmarks/load_gen.py --qps 50 --concurrency 32 --duration 30 --latency 0.2 --chunk-interval 0.01
+    python benchmarks/load_gen.py --concurrency 8 --stream --error-429 0.05 --output load.json
+
+--url 指定外部的替身服务（python benchmarks/dashscope_stub.py 启动）或真实服务，--langfuse 按环境变量上报到 Langfuse。
+
+开环时延迟从计划的发送时间算起（包含等待空闲并发的时间，避免协调遗漏），service 为调用本身的耗时。
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import dashscope
+from dashscope_stub import StubServer, add_options_arguments, options_from_args
+from langfuse.decorators import langfuse_context, observe
+
+from langfarm.hooks.dashscope import Generation, RetryPolicy
+from langfarm.hooks.misc import percentile
+
+
+class Sample:
+    __slots__ = ("latency", "service", "ttft", "output_tokens", "error")
+
+    def __init__(
+        self,
+        latency: float,
+        service: float,
+        ttft: Optional[float] = None,
+        output_tokens: int = 0,
+        error: Optional[str] = None,
+    ):
+        self.latency = latency
+        self.service = service
+        self.ttft = ttft
+        self.output_tokens = output_tokens
+        self.error = error
+
+
+@observe(as_type="generation", capture_input=False, capture_output=False)
+def _call(stream: bool, **kwargs: Any) -> Dict[str, Any]:
+    """调用一次，返回 ttft、输出 token 数、错误（状态码不是 200 时为 code）。"""
+    start = time.perf_counter()
+    if not stream:
+        response = Generation.call(**kwargs)
+        last = response
+        ttft = None
+    else:
+        last = None
+        ttft = None
+        for last in Generation.call(stream=True, incremental_output=True, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+    error = None
+    if last is None:
+        error = "EmptyStream"
+    elif last.status_code != 200:
+        error = f"{last.status_code}/{last.code}"
+    usage = (last.usage if last is not None else None) or {}
+    return {"ttft": ttft, "output_tokens": usage.get("output_tokens") or 0, "error": error}
+
+
+class LoadGenerator:
+    def __init__(self, qps: Optional[float], concurrency: int, duration: float, stream: bool, call_kwargs: dict):
+        """
+        :param qps: 目标 QPS，None 时闭环（每个并发连续调用）
+        :param concurrency: 最大并发数
+        :param duration: 持续时间（秒）
+        :param stream: 是否流式调用
+        :param call_kwargs: Generation.call 的参数
+        """
+        self.qps = qps
+        self.concurrency = concurrency
+        self.duration = duration
+        self.stream = stream
+        self.call_kwargs = call_kwargs
+        self.samples: List[Sample] = []
+        self._lock = threading.Lock()
+
+    def _one(self, scheduled: float):
+        start = time.perf_counter()
+        try:
+            result = _call(self.stream, **self.call_kwargs)
+        except Exception as e:
+            result = {"ttft": None, "output_tokens": 0, "error": type(e).__name__}
+        end = time.perf_counter()
+        sample = Sample(end - scheduled, end - start, result["ttft"], result["output_tokens"], result["error"])
+        with self._lock:
+            self.samples.append(sample)
+
+    def _closed_loop(self, end: float):
+        while time.perf_counter() < end:
+            self._one(time.perf_counter())
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        end = start + self.duration
+        slots = threading.BoundedSemaphore(self.concurrency)
+
+        def _task(scheduled: float):
+            try:
+                self._one(scheduled)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="load") as pool:
+            if self.qps is None:
+                for _ in range(self.concurrency):
+                    pool.submit(self._closed_loop, end)
+            else:
+                for i in itertools.count():
+                    scheduled = start + i / self.qps
+                    if scheduled >= end:
+                        break
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    slots.acquire()
+                    pool.submit(_task, scheduled)
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        ok = [s for s in self.samples if s.error is None]
+        errors = Counter(s.error for s in self.samples if s.error is not None)
+        report: Dict[str, Any] = {
+            "requests": len(self.samples),
+            "ok": len(ok),
+            "errors": dict(errors),
+            "elapsed_second": round(elapsed, 3),
+            "target_qps": self.qps,
+            "concurrency": self.concurrency,
+            "throughput_qps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0,
+            "output_tokens_per_second": round(sum(s.output_tokens for s in ok) / elapsed, 3) if elapsed > 0 else 0,
+        }
+        for name, values in (
+            ("latency", [s.latency for s in ok]),
+            ("service", [s.service for s in ok]),
+            ("ttft", [s.ttft for s in ok if s.ttft is not None]),
+        ):
+            if values:
+                report[name] = _percentiles(sorted(values))
+        return report
+
+
+def _percentiles(sorted_values: List[float]) -> Dict[str, float]:
+    result = {f"p{int(q * 100)}_ms": round(percentile(sorted_values, q) * 1000, 3) for q in (0.5, 0.9, 0.99)}
+    result["max_ms"] = round(sorted_values[-1] * 1000, 3)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load generator for langfarm Generation.call.")
+    parser.add_argument("--qps", type=float, help="目标 QPS，不指定时闭环：每个并发连续调用")
+    parser.add_argument("--concurrency", type=int, default=8, help="最大并发数")
+    parser.add_argument("--duration", type=float, default=10, help="持续时间（秒）")
+    parser.add_argument("--stream", action="store_true", help="流式调用（incremental_output）")
+    parser.add_argument("--model", default="qwen-plus")
+    parser.add_argument("--prompt", default="写一首关于春天的诗")
+    parser.add_argument("--max-retries", type=int, default=3, help="重试次数")
+    parser.add_argument("--no-retry-wait", action="store_true", help="重试不等待，只测量重试路径的开销")
+    parser.add_argument("--url", help="外部服务的 base_http_api_url，不指定时在进程内启动替身服务")
+    parser.add_argument("--langfuse", action="store_true", help="上报到 Langfuse（按 LANGFUSE_* 环境变量）")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到 stdout")
+    add_options_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    if not args.langfuse:
+        langfuse_context.configure(enabled=False)
+
+    retry_policy = (
+        RetryPolicy(max_retries=args.max_retries, min_seconds=0, max_seconds=0)
+        if args.no_retry_wait
+        else RetryPolicy(max_retries=args.max_retries)
+    )
+    call_kwargs = {
+        "model": args.model,
+        "prompt": args.prompt,
+        "api_key": os.environ.get("DASHSCOPE_API_KEY", "stub"),
+        "retry_policy": retry_policy,
+    }
+    generator = LoadGenerator(args.qps, args.concurrency, args.duration, args.stream, call_kwargs)
+
+    server = None
+    if args.url:
+        dashscope.base_http_api_url = args.url
+    else:
+        server = StubServer(options_from_args(args)).start()
+        dashscope.base_http_api_url = server.base_url
+    try:
+        report = generator.run()
+    finally:
+        if server is not None:
+            server.stop()
+        if args.langfuse:
+            langfuse_context.flush()
+    if server is not None:
+        report["server_status_counts"] = {str(k): v for k, v in sorted(server.status_counts.items())}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+from .registry import install, installed_hooks, measure_import_time, uninstall
+
+__all__ = ["install", "installed_hooks", "measure_import_time", "uninstall"]
@@ -1,3 +1,25 @@
+try:
+    import dashscope  # noqa: F401
+except ImportError:
+    raise ModuleNotFoundError("Please install Dashscope to use this feature: 'pip install dashscope'")
+
+from .breaker import CircuitBreaker
+from .cache import ResponseCache
+from .coalesce import SingleFlight
 from .generation import Generation
+from .hedge import HedgePolicy
+from .payload import PayloadPolicy
+from .ratelimit import RateLimiter
+from .retry import RetryBudget, RetryPolicy
 
-__all__ = [Generation]  # type: ignore
+__all__ = [
+    "CircuitBreaker",
+    "Generation",
+    "HedgePolicy",
+    "PayloadPolicy",
+    "RateLimiter",
+    "ResponseCache",
+    "RetryBudget",
+    "RetryPolicy",
+    "SingleFlight",
+]
@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from dashscope.api_entities.dashscope_response import GenerationResponse
+from langfuse.decorators import langfuse_context, observe
+
+from langfarm.hooks.langfuse.context import ContextThreadPoolExecutor
+
+
+class BatchResult:
+    """批量调用中一项的结果：response 或 error（调用抛出的异常）二者之一。"""
+
+    def __init__(
+        self,
+        index: int,
+        input: Any,
+        response: Optional[GenerationResponse] = None,
+        error: Optional[BaseException] = None,
+        elapsed: float = 0,
+    ):
+        self.index = index
+        self.input = input
+        self.response = response
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.response is not None and self.response.status_code == 200
+
+    def __repr__(self) -> str:
+        status = self.response.status_code if self.response is not None else None
+        return f"BatchResult(index={self.index}, status_code={status}, error={self.error!r})"
+
+
+class BatchStat:
+    """批量调用的汇总：成功数、失败数、token 数、耗时。"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, result: BatchResult):
+        self.total += 1
+        if result.ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        usage = result.response.usage if result.response is not None else None
+        if usage:
+            self.input_tokens += usage.get("input_tokens") or 0
+            self.output_tokens += usage.get("output_tokens") or 0
+
+    @property
+    def wall_second(self) -> float:
+        return time.monotonic() - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "wall_second": round(self.wall_second, 3),
+        }
+
+
+def item_to_call_kwargs(item: Any) -> dict:
+    """str 为 prompt，dict 为 call 的参数（如 {"prompt": ..., "seed": 1}），其他（list）为 messages。"""
+    if isinstance(item, str):
+        return {"prompt": item}
+    if isinstance(item, dict):
+        return dict(item)
+    return {"messages": item}
+
+
+@observe(as_type="generation", capture_input=False, capture_output=False)
+def _observe_generation(call: Callable[..., GenerationResponse], **kwargs: Any) -> GenerationResponse:
+    # 每一项一个 generation observation，由 Generation.call 填充
+    return call(**kwargs)
+
+
+def _run_item(
+    call: Callable[..., GenerationResponse],
+    index: int,
+    item: Any,
+    kwargs: dict,
+    to_call_kwargs: Callable[[Any], dict],
+) -> BatchResult:
+    start = time.monotonic()
+    try:
+        response = _observe_generation(call, **{**kwargs, **to_call_kwargs(item)})
+        return BatchResult(index, item, response, elapsed=time.monotonic() - start)
+    except Exception as e:
+        return BatchResult(index, item, error=e, elapsed=time.monotonic() - start)
+
+
+def run_batch(
+    call: Callable[..., GenerationResponse],
+    inputs: Iterable[Any],
+    max_workers: int,
+    kwargs: dict,
+    to_call_kwargs: Callable[[Any], dict] = item_to_call_kwargs,
+) -> Iterator[BatchResult]:
+    """
+    按完成顺序返回结果。inputs 按需读取，同时最多 max_workers 个请求在执行。
+    to_call_kwargs 把一项输入转为 call 的参数（与 kwargs 合并）。
+
+    每个请求在提交时复制当前的 contextvars，observation 嵌套在调用方当前的 observation 下。
+    """
+    pending: Set[Future] = set()
+    items: Iterator[Tuple[int, Any]] = enumerate(inputs)
+    with ContextThreadPoolExecutor(max_workers, thread_name_prefix="langfarm-batch") as executor:
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < max_workers:
+                    next_item = next(items, None)
+                    if next_item is None:
+                        exhausted = True
+                        break
+                    index, item = next_item
+                    pending.add(executor.submit(_run_item, call, index, item, kwargs, to_call_kwargs))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # 提前结束迭代时不再提交新的请求，已经开始的请求执行完后退出
+            for future in pending:
+                future.cancel()
+
+
+@observe(name="Dashscope-batch", capture_input=False, capture_output=False)
+def observe_batch(
+    call: Callable[..., GenerationResponse],
+    model: str,
+    inputs: Iterable[Any],
+    max_workers: int,
+    kwargs: dict,
+) -> Iterator[BatchResult]:
+    """run_batch 外面包一个 span，迭代结束时汇总 token、失败数和耗时。"""
+    stat = BatchStat()
+    try:
+        for result in run_batch(call, inputs, max_workers, {**kwargs, "model": model}):
+            stat.add(result)
+            yield result
+    finally:
+        langfuse_context.update_current_observation(
+            input={"model": model, "max_workers": max_workers},
+            output=stat.to_dict(),
+            level="WARNING" if stat.failed else None,
+        )
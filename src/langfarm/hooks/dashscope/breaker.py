@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_failure_status(status_code: Optional[int]) -> bool:
+    """服务端问题才算失败：异常（无响应）、429、5xx。400/401 是调用方的问题，不影响熔断。"""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class _ModelCircuit:
+    def __init__(self):
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        # (时间, 是否失败或慢调用)
+        self.calls: Deque[Tuple[float, bool]] = deque()
+        self.bad_calls = 0
+
+
+class CircuitBreaker:
+    """
+    按模型熔断（closed / open / half_open）。
+
+    最近 window 秒内调用数不少于 min_calls，且失败（含慢调用）比例达到 failure_rate_threshold 时打开，
+    打开 open_seconds 秒后进入半开，放行 half_open_max_calls 个探测请求：成功则关闭，失败则重新打开。
+    一个实例可在所有调用间共享。
+    """
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        window: float = 30,
+        open_seconds: float = 30,
+        half_open_max_calls: int = 1,
+        slow_call_seconds: Optional[float] = None,
+    ):
+        """
+        :param failure_rate_threshold: 打开熔断的失败比例
+        :param min_calls: 窗口内最少调用数，少于这个数不熔断
+        :param window: 统计窗口（秒）
+        :param open_seconds: 打开后多久进入半开
+        :param half_open_max_calls: 半开时最多放行的探测请求数
+        :param slow_call_seconds: 超过这个耗时的调用按失败计，None 不统计慢调用
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_seconds = slow_call_seconds
+        self._circuits: Dict[str, _ModelCircuit] = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, model: str) -> _ModelCircuit:
+        circuit = self._circuits.get(model)
+        if circuit is None:
+            circuit = self._circuits.setdefault(model, _ModelCircuit())
+        return circuit
+
+    def state(self, model: str) -> str:
+        with self._lock:
+            circuit = self._circuit(model)
+            if circuit.state == OPEN and time.monotonic() - circuit.opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return circuit.state
+
+    def allow(self, model: str) -> bool:
+        """是否允许请求这个模型。半开时会占用一个探测名额，请求结束后必须 record()。"""
+        with self._lock:
+            circuit = self._circuit(model)
+            if circuit.state == CLOSED:
+                return True
+            if circuit.state == OPEN:
+                if time.monotonic() - circuit.opened_at < self.open_seconds:
+                    return False
+                circuit.state = HALF_OPEN
+                circuit.half_open_calls = 0
+            if circuit.half_open_calls < self.half_open_max_calls:
+                circuit.half_open_calls += 1
+                return True
+            return False
+
+    def record(self, model: str, status_code: Optional[int], latency: float):
+        bad = is_failure_status(status_code) or (
+            self.slow_call_seconds is not None and latency >= self.slow_call_seconds
+        )
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuit(model)
+            if circuit.state == HALF_OPEN:
+                if bad:
+                    self._open(circuit, now)
+                else:
+                    circuit.state = CLOSED
+                    circuit.calls.clear()
+                    circuit.bad_calls = 0
+                return
+            if circuit.state == OPEN:
+                return
+
+            circuit.calls.append((now, bad))
+            circuit.bad_calls += bad
+            while circuit.calls and circuit.calls[0][0] <= now - self.window:
+                _, old_bad = circuit.calls.popleft()
+                circuit.bad_calls -= old_bad
+            total = len(circuit.calls)
+            if total >= self.min_calls and circuit.bad_calls / total >= self.failure_rate_threshold:
+                self._open(circuit, now)
+
+    def cancel(self, model: str):
+        """allow() 之后请求被取消，不计入统计；半开时归还探测名额。"""
+        with self._lock:
+            circuit = self._circuit(model)
+            if circuit.state == HALF_OPEN and circuit.half_open_calls > 0:
+                circuit.half_open_calls -= 1
+
+    @staticmethod
+    def _open(circuit: _ModelCircuit, now: float):
+        circuit.state = OPEN
+        circuit.opened_at = now
+        circuit.calls.clear()
+        circuit.bad_calls = 0
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dashscope.api_entities.dashscope_response import GenerationOutput, GenerationResponse, GenerationUsage
+
+# 不影响生成结果的参数，不参与缓存 key
+_NON_KEY_PARAMS = frozenset(["stream", "incremental_output", "api_key", "workspace", "headers", "request_timeout"])
+
+
+def is_deterministic(kwargs: dict) -> bool:
+    """只有确定性的采样参数（temperature=0 或指定 seed）才缓存。"""
+    return kwargs.get("temperature") == 0 or kwargs.get("seed") is not None
+
+
+def cache_key(
+    model: str,
+    prompt: Any = None,
+    history: Optional[list] = None,
+    messages: Any = None,
+    plugins: Any = None,
+    **kwargs: Any,
+) -> str:
+    """model、prompt/messages、history、采样参数的规范化 JSON 的 sha256。"""
+    params = {k: v for k, v in kwargs.items() if k not in _NON_KEY_PARAMS}
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "history": history,
+        "messages": messages,
+        "plugins": plugins,
+        "params": params,
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def dump_response(response: GenerationResponse) -> str:
+    return json.dumps(
+        {
+            "request_id": response.request_id,
+            "output": response.output,
+            "usage": response.usage,
+        },
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def load_response(value: str) -> GenerationResponse:
+    data = json.loads(value)
+    return GenerationResponse(
+        status_code=200,
+        request_id=data.get("request_id"),
+        code="",
+        message="",
+        output=GenerationOutput(**(data.get("output") or {})),
+        usage=GenerationUsage(**(data.get("usage") or {})),
+    )
+
+
+class _SqliteTier:
+    """sqlite 持久化缓存，多个进程可共享同一个文件。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS langfarm_response_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def get(self, key: str, now: float) -> Optional[Tuple[str, Optional[float]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM langfarm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM langfarm_response_cache WHERE key = ?", (key,))
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: Optional[float]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO langfarm_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM langfarm_response_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Generation 响应缓存：进程内 LRU（条数、字节数上限，TTL 过期），可选 sqlite 持久化（多进程共享）。
+
+    只缓存确定性参数（temperature=0 或指定 seed）的成功响应，key 见 cache_key()。
+    流式请求结束后缓存拼接好的完整响应，命中时以一个 chunk 回放。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        ttl: Optional[float] = 3600,
+        path: Optional[str] = None,
+    ):
+        """
+        :param max_entries: 内存中最多缓存的条数
+        :param max_bytes: 内存中缓存的最大字节数（按序列化后的大小），None 不限制
+        :param ttl: 过期秒数，None 不过期
+        :param path: sqlite 文件路径，None 只用内存缓存
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (序列化的响应, 过期时间)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _SqliteTier(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model: str, **kwargs: Any) -> Optional[str]:
+        """不可缓存时返回 None。"""
+        if not is_deterministic(kwargs):
+            return None
+        return cache_key(model, **kwargs)
+
+    def _put_memory(self, key: str, value: str, expires_at: Optional[float]):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        self._entries[key] = (value, expires_at)
+        self._bytes += len(value)
+        while self._entries and (
+            len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def get(self, key: str) -> Optional[GenerationResponse]:
+        now = time.time()
+        value = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self._bytes -= len(entry[0])
+                else:
+                    self._entries.move_to_end(key)
+                    value = entry[0]
+        if value is None and self._disk is not None:
+            row = self._disk.get(key, now)
+            if row is not None:
+                value = row[0]
+                with self._lock:
+                    self._put_memory(key, value, row[1])
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return load_response(value)
+
+    def set(self, key: str, response: GenerationResponse):
+        if response.status_code != 200:
+            return
+        value = dump_response(response)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+        if self._disk is not None:
+            self._disk.set(key, value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stat(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._entries)
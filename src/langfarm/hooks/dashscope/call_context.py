@@ -0,0 +1,198 @@
+import threading
+import time
+from typing import List, Optional
+
+from dashscope.api_entities.dashscope_response import GenerationResponse
+
+from langfarm.hooks.dashscope.breaker import CircuitBreaker
+from langfarm.hooks.dashscope.exceptions import CircuitOpenException, RetryBudgetExhaustedException
+from langfarm.hooks.dashscope.hedge import HedgePolicy
+from langfarm.hooks.dashscope.ratelimit import Permit, RateLimiter
+from langfarm.hooks.dashscope.retry import RetryBudget
+from langfarm.hooks.dashscope.timing import PhaseTimer
+from langfarm.hooks.metrics import GenerationMetrics, status_label
+
+
+def usage_tokens(response: Optional[GenerationResponse]) -> Optional[int]:
+    usage = response.get("usage") if response is not None else None
+    if not usage:
+        return None
+    return (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+
+
+class Attempt:
+    """一次请求（第一次或重试）的状态。"""
+
+    def __init__(self, model: str, permit: Optional[Permit] = None):
+        self.model = model
+        self.permit = permit
+        self.start = time.monotonic()
+        # 被取消（对冲中较慢的请求）后不再记录统计；已经结束的请求不能再取消
+        self.cancelled = False
+        self.ended = False
+
+
+class CallContext:
+    """一次 Generation 调用（包括所有重试）共享的选项，以及调用过程中产生的 metadata。"""
+
+    def __init__(
+        self,
+        models: List[str],
+        api_key: Optional[str] = None,
+        workspace: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        estimated_tokens: int = 0,
+        retry_budget: Optional[RetryBudget] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        metrics: Optional[GenerationMetrics] = None,
+        timer: Optional[PhaseTimer] = None,
+    ):
+        """
+        :param models: 请求的模型，之后是按顺序的 fallback 模型（只在熔断时使用）
+        :param metrics: 记录请求数、延迟、重试等待时间等指标，None 不记录
+        :param timer: 记录各阶段的耗时（被采样的调用），None 不记录
+        """
+        self.models = models
+        self.api_key = api_key
+        self.workspace = workspace
+        self.rate_limiter = rate_limiter
+        self.estimated_tokens = estimated_tokens
+        self.retry_budget = retry_budget
+        self.circuit_breaker = circuit_breaker
+        self.hedge_policy = hedge_policy
+        self.metrics = metrics
+        self.timer = timer
+        self.start = time.monotonic()
+        # 所有重试等待的秒数
+        self.retry_sleep = 0.0
+        self.attempts = 0
+        self._success_recorded = False
+        self.served_model = models[0]
+        self.last_response: Optional[GenerationResponse] = None
+        # 上报到 observation 的 metadata
+        self.metadata: dict = {}
+        # 对冲时两个请求可能同时结束或被取消
+        self._attempt_lock = threading.Lock()
+
+    def _check_retry_budget(self, is_hedge: bool):
+        self.attempts += 1
+        if self.retry_budget is None or self.attempts == 1:
+            return
+        if not self.retry_budget.try_retry():
+            if is_hedge:
+                self.metadata["hedge_denied"] = "retry_budget"
+            else:
+                self.metadata["retry_budget_exhausted"] = True
+            raise RetryBudgetExhaustedException("retry budget exhausted", response=self.last_response)
+
+    def _select_model(self) -> str:
+        """按顺序选第一个没有熔断的模型，metadata 记录最近一次请求使用的 fallback 模型。"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self.models[0]
+        for model in self.models:
+            if breaker.allow(model):
+                if model != self.models[0]:
+                    self.metadata["served_model"] = model
+                    self.metadata["fallback_reason"] = f"circuit open: {self.models[0]}"
+                else:
+                    # 重试时回到了请求的模型
+                    self.metadata.pop("served_model", None)
+                    self.metadata.pop("fallback_reason", None)
+                self.served_model = model
+                return model
+
+        self.metadata["circuit_open"] = True
+        message = f"circuit open for models: {', '.join(self.models)}"
+        response = GenerationResponse(status_code=503, code="CircuitOpen", message=message)
+        raise CircuitOpenException(message, response=response)
+
+    def _add_throttle(self, permit: Permit):
+        if permit.waited > 0.001:
+            self.metadata["throttle_second"] = round(self.metadata.get("throttle_second", 0) + permit.waited, 3)
+
+    def begin_attempt(self, is_hedge: bool = False) -> Attempt:
+        """每次请求（包括重试、对冲）前调用：检查重试预算，选择模型，按限流器等待。"""
+        self._check_retry_budget(is_hedge)
+        model = self._select_model()
+        permit = None
+        if self.rate_limiter is not None:
+            permit = self.rate_limiter.acquire((model, self.api_key, self.workspace), self.estimated_tokens)
+            self._add_throttle(permit)
+        return Attempt(model, permit)
+
+    async def abegin_attempt(self, is_hedge: bool = False) -> Attempt:
+        self._check_retry_budget(is_hedge)
+        model = self._select_model()
+        permit = None
+        if self.rate_limiter is not None:
+            permit = await self.rate_limiter.aacquire((model, self.api_key, self.workspace), self.estimated_tokens)
+            self._add_throttle(permit)
+        return Attempt(model, permit)
+
+    def record(self, attempt: Attempt, response: Optional[GenerationResponse]):
+        """拿到响应（流式为第一个 chunk）时调用，记录熔断、重试预算的统计。"""
+        if response is not None:
+            self.last_response = response
+        status_code = response["status_code"] if response is not None else None
+        elapsed = time.monotonic() - attempt.start
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(attempt.model, status_code, elapsed)
+        if self.retry_budget is not None and status_code == 200 and not self._success_recorded:
+            # 每次调用最多补充一次重试预算
+            self._success_recorded = True
+            self.retry_budget.record_success()
+        if self.hedge_policy is not None and status_code == 200:
+            self.hedge_policy.record(attempt.model, elapsed)
+        if self.metrics is not None:
+            self.metrics.record_attempt(attempt.model, status_label(response), elapsed)
+
+    def release(self, attempt: Attempt, response: Optional[GenerationResponse]):
+        """请求结束后调用，用实际状态码和 token 用量修正限流器。"""
+        if attempt.permit is None:
+            return
+        status_code = response["status_code"] if response is not None else None
+        attempt.permit.release(status_code, usage_tokens(response))
+
+    def end_attempt(self, attempt: Attempt, response: Optional[GenerationResponse]):
+        with self._attempt_lock:
+            if attempt.cancelled:
+                return
+            attempt.ended = True
+        self.record(attempt, response)
+        self.release(attempt, response)
+
+    def cancel_attempt(self, attempt: Attempt):
+        """
+        取消请求（对冲中较慢的请求）：只归还限流许可和熔断探测名额，不记录熔断、指标等统计。
+        同步请求无法中断，之后结束时 end_attempt 不再记录。
+        """
+        with self._attempt_lock:
+            if attempt.cancelled or attempt.ended:
+                return
+            attempt.cancelled = True
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.cancel(attempt.model)
+        if attempt.permit is not None:
+            attempt.permit.cancel()
+
+    def add_retry_stat(self, retry_stat: dict):
+        """每次 tenacity 重试结束后调用（流式续写时有多次），累计重试等待时间。"""
+        idle = retry_stat.get("idle_for", 0)
+        self.retry_sleep += idle
+        if self.timer is not None and idle > 0:
+            self.timer.add("retry_sleep", idle)
+
+    def finish(self, response: Optional[GenerationResponse], err: Optional[BaseException] = None):
+        """整个调用（包括重试、流式读完）结束时调用，记录请求的指标。response 为最终响应（流式为最后一个 chunk）。"""
+        if self.metrics is None:
+            return
+        usage = response.get("usage") if response is not None and response["status_code"] == 200 else None
+        self.metrics.record_request(
+            self.served_model,
+            status_label(response, err),
+            time.monotonic() - self.start,
+            usage,
+            self.retry_sleep,
+        )
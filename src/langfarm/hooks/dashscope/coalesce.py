@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发请求：同一时刻只有一个（leader）真正执行，其他调用方等待并拿到同一个结果（或异常）。
+
+    同步调用按线程合并；异步调用只合并同一个 event loop 里的请求。一个实例可在所有调用间共享。
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], "asyncio.Task[Any]"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """返回 (结果, 是否与其他调用共享)。"""
+        with self._lock:
+            flight = self._flights.get(key)
+            shared = flight is not None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+
+        if shared:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """do 的异步版本。请求在单独的 task 中执行，leader 被取消不影响其他等待的调用方。"""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            shared = task is not None
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(fn())  # type: ignore
+                task.add_done_callback(lambda _: self._forget(task_key))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, task_key: Tuple[asyncio.AbstractEventLoop, Hashable]):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights) + len(self._tasks)
@@ -0,0 +1,29 @@
+from typing import Any
+
+
+class FailedGenerationException(Exception):
+    def __init__(self, message: str, response: Any):
+        self.message = message
+        self.response = response
+
+
+class RetryGenerationException(FailedGenerationException):
+    pass
+
+
+class FastFailGenerationException(FailedGenerationException):
+    """不再重试，快速失败。"""
+
+    pass
+
+
+class RetryBudgetExhaustedException(FastFailGenerationException):
+    """全局重试预算用完，不再重试。response 是最后一次失败的响应。"""
+
+    pass
+
+
+class CircuitOpenException(FastFailGenerationException):
+    """模型（及所有 fallback 模型）都处于熔断状态。"""
+
+    pass
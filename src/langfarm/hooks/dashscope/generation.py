@@ -1,12 +1,14 @@
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, wait
 from datetime import datetime
-from typing import Any, List, Union, Dict, Generator, Callable, Optional
+from typing import Any, List, Union, Dict, Generator, Iterable, Iterator, Optional, AsyncGenerator, AsyncIterable
 
 from langfuse.decorators import langfuse_context
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
-
-from langfarm.hooks.misc import retry_stat_to_meta
 
+# 先检查 dashscope，下面的 langfarm 模块也依赖 dashscope
 try:
     import dashscope  # noqa: F401
 except ImportError:
@@ -18,35 +20,318 @@ try:
 except ImportError:
     raise ModuleNotFoundError("Please install Dashscope to use this feature: 'pip install dashscope'")
 
+try:
+    from dashscope import AioGeneration
+except ImportError:
+    # 旧版本 dashscope 没有 aio 客户端，只在调用 acall 时报错
+    AioGeneration = None
+
+from langfarm.hooks.dashscope.batch import BatchResult, observe_batch
+from langfarm.hooks.dashscope.breaker import CircuitBreaker
+from langfarm.hooks.dashscope.cache import ResponseCache, cache_key, dump_response, load_response
+from langfarm.hooks.dashscope.call_context import Attempt, CallContext
+from langfarm.hooks.dashscope.coalesce import SingleFlight
+from langfarm.hooks.dashscope.exceptions import FailedGenerationException, RetryGenerationException
+from langfarm.hooks.dashscope.hedge import HedgePolicy
+from langfarm.hooks.dashscope.payload import PayloadPolicy
+from langfarm.hooks.dashscope.ratelimit import RateLimiter
+from langfarm.hooks.dashscope.resume import StreamResume
+from langfarm.hooks.dashscope.retry import RetryBudget, RetryPolicy, default_retry_policy
+from langfarm.hooks.dashscope.timing import PhaseTimer
+from langfarm.hooks.metrics import StreamRecorder, get_metrics
+from langfarm.hooks.misc import retry_stat_to_meta, OutputAccumulator
+
 
 logger = logging.getLogger(__name__)
 
 
-def _create_retry_decorator(max_retries: int) -> Callable[[Any], Any]:
-    min_seconds = 1
-    max_seconds = 4
-    # Wait 2^x * 1 second between each retry starting with
-    # 4 seconds, then up to 10 seconds, then 10 seconds afterward
-    return retry(
-        reraise=True,
-        stop=stop_after_attempt(max_retries),
-        wait=wait_exponential(multiplier=1, min=min_seconds, max=max_seconds),
-        retry=(retry_if_exception_type(RetryGenerationException)),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-    )
+# 命中缓存时上报的 usage
+_ZERO_USAGE = {"input_tokens": 0, "output_tokens": 0}
+
+
+async def _aiter_responses(responses: List[GenerationResponse]) -> AsyncGenerator[GenerationResponse, None]:
+    for response in responses:
+        yield response
+
+
+def _is_success(future: Any) -> bool:
+    return not future.cancelled() and future.exception() is None and future.result()["status_code"] == 200
+
+
+class _HedgeRace:
+    """一次对冲中已经发出的请求。决出结果后，还没结束的请求归还限流许可，结束时不记录统计。"""
+
+    def __init__(self, call_context: CallContext):
+        self.call_context = call_context
+        # is_hedge -> Attempt
+        self.attempts: Dict[bool, Attempt] = {}
+        self.settled = False
+        self._lock = threading.Lock()
+
+    def join(self, is_hedge: bool, attempt: Attempt) -> bool:
+        """请求发出前调用。已经决出结果时取消这个请求，返回 False。"""
+        with self._lock:
+            if not self.settled:
+                self.attempts[is_hedge] = attempt
+                return True
+        self.call_context.cancel_attempt(attempt)
+        return False
+
+    @property
+    def hedge_sent(self) -> bool:
+        return True in self.attempts
+
+    def settle(self, winner_is_hedge: bool):
+        with self._lock:
+            self.settled = True
+            losers = [attempt for is_hedge, attempt in self.attempts.items() if is_hedge != winner_is_hedge]
+        for attempt in losers:
+            self.call_context.cancel_attempt(attempt)
+
+
+class _CallPlan:
+    """call / acall 解析好的参数：取出 langfarm 自己的选项、创建 CallContext、查缓存，同步和异步共用。"""
+
+    def __init__(
+        self,
+        generation: Any,
+        model: str,
+        prompt: Any,
+        history: Optional[list],
+        api_key: Optional[str],
+        messages: Optional[List[Message]],
+        plugins: Optional[Union[str, Dict[str, Any]]],
+        workspace: Optional[str],
+        kwargs: dict,
+    ):
+        self.model = model
+        # input
+        self.input_query = None
+        if prompt:
+            self.input_query = prompt
+        if messages:
+            self.input_query = messages
+
+        # output
+        self.result_format: Optional[str] = kwargs.get("result_format")
+        self.incremental_output: bool = kwargs.get("incremental_output", False)
+
+        # is stream
+        self.stream: bool = kwargs.get("stream", False)
+        self.retry_policy: RetryPolicy = generation._get_retry_policy(
+            kwargs.pop("max_retries", None), kwargs.pop("retry_policy", None)
+        )
+        self.deadline: Optional[float] = kwargs.pop("deadline", None)
+        self.stream_output_max_chars: Optional[int] = kwargs.pop(
+            "stream_output_max_chars", generation.stream_output_max_chars
+        )
+        self.stream_resumes: int = kwargs.pop("stream_resumes", generation.stream_resumes)
+        self.response_cache: Optional[ResponseCache] = kwargs.pop("response_cache", generation.response_cache)
+        self.single_flight: Optional[SingleFlight] = kwargs.pop("single_flight", generation.single_flight)
+        self.payload_policy: Optional[PayloadPolicy] = kwargs.pop("payload_policy", generation.payload_policy)
+        self.call_context: CallContext = generation._create_call_context(
+            model, prompt, api_key, messages, workspace, kwargs
+        )
+
+        self.key = None
+        self.cached: Optional[GenerationResponse] = None
+        if self.response_cache is not None:
+            self.key = self.response_cache.key(
+                model, prompt=prompt, history=history, messages=messages, plugins=plugins, **kwargs
+            )
+            if self.key is not None:
+                self.cached = self.response_cache.get(self.key)
+        self.flight_key = None
+        if self.single_flight is not None and not self.stream:
+            self.flight_key = generation._flight_key(
+                model, prompt, history, api_key, messages, plugins, workspace, kwargs
+            )
+        # 传给 (stream_)generate_with_retry 的参数
+        self.call_kwargs = dict(
+            model=model,
+            prompt=prompt,
+            history=history,
+            api_key=api_key,
+            messages=messages,
+            plugins=plugins,
+            workspace=workspace,
+            **kwargs,
+        )
+
+
+class _StreamObservation:
+    """
+    流式调用的 observation：逐个 chunk 累加输出、记录耗时和指标，流结束时上报，同步和异步共用。
+
+    设置了 response_cache 时，完整读完、由请求的模型返回的流合并成一个响应写入缓存。
+    """
+
+    def __init__(
+        self,
+        generation: Any,
+        input_query: Any,
+        model: str,
+        result_format: Optional[str],
+        incremental_output: bool = False,
+        max_chars: Optional[int] = None,
+        metadata: Optional[dict] = None,
+        timer: Optional[PhaseTimer] = None,
+        payload_policy: Optional[PayloadPolicy] = None,
+    ):
+        self.generation = generation
+        self.input_query = input_query
+        self.model = model
+        self.result_format = result_format
+        self.metadata = metadata
+        self.timer = timer
+        self.payload_policy = payload_policy
+        # 增量输出需要拼接，用 chunk 列表累加，最后 join 一次
+        self.output = OutputAccumulator(incremental_output, max_chars)
+        self.recorder = generation._stream_recorder(model, metadata)
+        self.to_output = (
+            generation.response_to_output if timer is None else timer.wrap("output", generation.response_to_output)
+        )
+        self.is_first = True
+        self.last_chunk: Optional[GenerationResponse] = None
+        self.last_usage = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.cache_key = ""
+        self.cache_output: Optional[OutputAccumulator] = None
+        self.call_context: Optional[CallContext] = None
+
+    def cache_to(self, response_cache: ResponseCache, key: str, incremental_output: bool, call_context: CallContext):
+        self.response_cache = response_cache
+        self.cache_key = key
+        # 缓存完整的输出，不受 max_chars 限制
+        self.cache_output = OutputAccumulator(incremental_output)
+        self.call_context = call_context
+
+    def chunk(self, chunk: GenerationResponse):
+        """收到一个 chunk，交给调用方之前调用。"""
+        timer = self.timer
+        if timer is not None:
+            timer.chunk_received()
+        if self.recorder is not None:
+            self.recorder.chunk()
+        if self.is_first:
+            self.generation._up_completion_start(timer)
+            self.is_first = False
+        self.last_chunk = chunk
+        self.last_usage = chunk.usage
+        output = self.to_output(self.result_format, chunk)
+        self.output.add(output)
+        if self.cache_output is not None:
+            self.cache_output.add(output)
+
+    def consumed(self):
+        """调用方处理完一个 chunk。"""
+        if self.timer is not None:
+            self.timer.chunk_consumed()
+
+    def finish(self, err: Optional[BaseException] = None):
+        if err is None:
+            self._set_cache()
+        self.generation._finish_stream_observation(
+            self.input_query,
+            self.model,
+            self.output,
+            self.last_usage,
+            self.metadata,
+            err,
+            self.recorder,
+            self.timer,
+            self.payload_policy,
+        )
+
+    def _set_cache(self):
+        last = self.last_chunk
+        if self.cache_output is None or last is None or last.status_code != 200:
+            return
+        call_context: CallContext = self.call_context  # type: ignore
+        # 只缓存由请求的模型返回的流
+        if call_context.served_model != call_context.models[0]:
+            return
+        response = self.generation._merge_stream_response(self.result_format, last, self.cache_output.getvalue())
+        self.response_cache.set(self.cache_key, response)  # type: ignore
+
+
+class _StreamRun:
+    """一次流式调用的重试、续写状态，同步和异步的 stream_generate_with_retry 共用，它们只负责 I/O。"""
+
+    def __init__(self, call_context: CallContext, check: Any, resume: StreamResume):
+        self.call_context = call_context
+        self.check = check
+        self.resume = resume
+        self.attempt: Optional[Attempt] = None
+        self.last_chunk: Optional[GenerationResponse] = None
+        self.err: Optional[BaseException] = None
+
+    def started(self, result: tuple) -> tuple:
+        """拿到第一个 chunk（_retry_first_chunk 的结果），返回 (responses, chunk)。"""
+        responses, chunk, self.attempt = result
+        self.last_chunk = chunk
+        return responses, chunk
 
+    def resumed(self, result: tuple) -> tuple:
+        """拿到续写请求的第一个 chunk。"""
+        responses, chunk = self.started(result)
+        self.resume.on_resumed(chunk)
+        return responses, chunk
 
-class FailedGenerationException(Exception):
-    def __init__(self, message: str, response: GenerationResponse):
-        self.message = message
-        self.response = response
+    def feed(self, resp: GenerationResponse) -> Optional[GenerationResponse]:
+        """检查一个后续 chunk，返回交给调用方的 chunk（续写时重复的部分为 None）。"""
+        self.last_chunk = resp
+        return self.resume.feed(self.check(resp))
 
+    def resume_kwargs(self, err: Exception) -> Optional[dict]:
+        """第一个 chunk 之后失败：可以续写时释放这次请求的限流许可，返回续写请求的参数，否则返回 None。"""
+        resume = self.resume
+        if not resume.can_resume(err):
+            resume.fail(err)
+            return None
+        logger.warning("stream failed after first chunk, resume %d: %s", resume.resumes + 1, err)
+        self.call_context.release(self.attempt, self.last_chunk)  # type: ignore
+        return resume.resume_kwargs()
 
-class RetryGenerationException(FailedGenerationException):
-    pass
+    def resume_failed(self, err: Exception):
+        self.attempt = None
+        self.resume.fail(err)
+
+    def close(self):
+        """流结束（包括失败、调用方提前关闭）时调用。"""
+        call_context = self.call_context
+        if self.attempt is not None:
+            call_context.release(self.attempt, self.last_chunk)
+        call_context.metadata.update(self.resume.to_meta())
+        call_context.finish(self.last_chunk, self.err)
 
 
 class Generation(TongyiGeneration):
+    # 共享的重试策略，None 时按 max_retries 参数（默认 10）使用默认策略
+    retry_policy: Optional[RetryPolicy] = None
+    # 进程内共享的客户端限流器，None 不限流
+    rate_limiter: Optional[RateLimiter] = None
+    # 全局重试预算，None 不限制
+    retry_budget: Optional[RetryBudget] = None
+    # 按模型熔断，None 不熔断
+    circuit_breaker: Optional[CircuitBreaker] = None
+    # 熔断时按顺序使用的 fallback 模型，如 {"qwen-max": ["qwen-plus", "qwen-turbo"]}
+    fallback_models: Dict[str, List[str]] = {}
+    # 非流式调用的对冲请求，None 不对冲
+    hedge_policy: Optional[HedgePolicy] = None
+    # 响应缓存，None 不缓存
+    response_cache: Optional[ResponseCache] = None
+    # 合并相同的并发非流式请求，None 不合并
+    single_flight: Optional[SingleFlight] = None
+    # 流式输出上报到 langfuse 时最多保留的字符数（保留头尾），None 不限制
+    stream_output_max_chars: Optional[int] = None
+    # 流式调用收到第一个 chunk 之后失败时最多续写的次数，0 快速失败
+    stream_resumes: int = 0
+    # 记录各阶段耗时（metadata 的 timing）的采样比例，0 不记录，1 全部记录
+    phase_timing: float = 0
+    # 上报到 langfuse 的 input、output 的大小策略（截断、hash、采样），None 上报完整内容
+    payload_policy: Optional[PayloadPolicy] = None
+
     @classmethod
     def response_to_output(cls, result_format: Optional[str], response: GenerationResponse) -> str:
         if result_format and "message" == result_format:
@@ -57,7 +342,19 @@ class Generation(TongyiGeneration):
         return output
 
     @classmethod
-    def _up_generation_observation(cls, model: str, input_query: str, output: str, usage: dict, **kwargs):
+    def _up_generation_observation(
+        cls,
+        model: str,
+        input_query: str,
+        output: str,
+        usage: dict,
+        payload_policy: Optional[PayloadPolicy] = None,
+        **kwargs,
+    ):
+        if payload_policy is not None:
+            input_query, output, kwargs["metadata"] = payload_policy.apply(
+                input_query, output, kwargs.get("level"), kwargs.get("metadata")
+            )
         # 解释 token usage
         langfuse_context.update_current_observation(
             name="Dashscope-generation",
@@ -76,55 +373,186 @@ class Generation(TongyiGeneration):
         result_format: Optional[str],
         response: GenerationResponse,
         retry_meta: Optional[dict],
+        metadata: Optional[dict] = None,
+        timer: Optional[PhaseTimer] = None,
+        payload_policy: Optional[PayloadPolicy] = None,
     ):
-        metadata = None
+        metadata = {**metadata} if metadata else None
         level = None
         if retry_meta:
             # 追加 retry 相关 meta
-            metadata = {**retry_meta}
+            metadata = {**(metadata or {}), **retry_meta}
             # 有 retry 按 warn 算
             level = "WARNING"
         if response.status_code == 200:
-            output = cls.response_to_output(result_format, response)
-            cls._up_generation_observation(model, input_query, output, response.usage, level=level, metadata=metadata)
+            to_output = cls.response_to_output if timer is None else timer.wrap("output", cls.response_to_output)
+            output = to_output(result_format, response)
+            usage = response.usage
+            if metadata and metadata.get("coalesced"):
+                # 共享其他调用的响应，不计费
+                usage = _ZERO_USAGE
+            cls._up_with_timing(
+                timer,
+                cls._up_generation_observation,
+                model,
+                input_query,
+                output,
+                usage,
+                payload_policy,
+                level=level,
+                metadata=metadata,
+            )
         else:
-            cls._up_error_observation(input_query, model, response, metadata)
+            cls._up_with_timing(
+                timer,
+                cls._up_error_observation,
+                input_query,
+                model,
+                response,
+                metadata=metadata,
+                payload_policy=payload_policy,
+            )
+
+    @classmethod
+    def _up_with_timing(cls, timer: Optional[PhaseTimer], up: Any, *args: Any, metadata: Optional[dict], **kwargs: Any):
+        """更新 observation，采样的调用在 metadata 中附加 timing。"""
+        if timer is None:
+            up(*args, metadata=metadata, **kwargs)
+            return
+        metadata = {**(metadata or {}), "timing": timer.to_meta()}
+        timer.wrap("observe", up)(*args, metadata=metadata, **kwargs)
+        # langfuse 在 observe 结束时才序列化 metadata，更新之后原地补上 observe、total 的耗时
+        timer.to_meta()
+
+    @classmethod
+    def _stream_observation(cls, plan: _CallPlan) -> _StreamObservation:
+        if plan.cached is not None:
+            return _StreamObservation(
+                cls,
+                plan.input_query,
+                plan.model,
+                plan.result_format,
+                plan.incremental_output,
+                plan.stream_output_max_chars,
+                cls._cached_metadata(plan.key, plan.cached),  # type: ignore
+                payload_policy=plan.payload_policy,
+            )
+        call_context = plan.call_context
+        observation = _StreamObservation(
+            cls,
+            plan.input_query,
+            plan.model,
+            plan.result_format,
+            plan.incremental_output,
+            plan.stream_output_max_chars,
+            call_context.metadata,
+            call_context.timer,
+            plan.payload_policy,
+        )
+        if plan.key is not None:
+            observation.cache_to(plan.response_cache, plan.key, plan.incremental_output, call_context)  # type: ignore
+        return observation
 
     @classmethod
     def _up_stream_generation_observation(
-        cls,
-        input_query: Any,
-        model: str,
-        result_format: Optional[str],
-        response: Generator[GenerationResponse, None, None],
-        incremental_output: bool = False,
+        cls, observation: _StreamObservation, response: Iterator[GenerationResponse]
     ) -> Generator[GenerationResponse, None, None]:
-        last_usage = None
-        is_first = True
-        output = ""
-
-        is_inc = incremental_output
-        for chunk in response:
-            if is_first:
-                langfuse_context.update_current_observation(completion_start_time=datetime.now())
-                is_first = False
-            last_usage = chunk.usage
-            chunk_output = cls.response_to_output(result_format, chunk)
-            if is_inc:
-                # 增量输出，需要拼接
-                output += chunk_output
-            else:
-                output = chunk_output
+        try:
+            for chunk in response:
+                observation.chunk(chunk)
+                # 生成 response 的 Generator
+                yield chunk
+                observation.consumed()
+        except Exception as err:
+            # 流式调用失败（包括第一个 chunk 之前重试用尽），上报已输出的内容和 usage
+            observation.finish(err)
+            raise
+        observation.finish()
+
+    @classmethod
+    async def _aup_stream_generation_observation(
+        cls, observation: _StreamObservation, response: AsyncIterable[GenerationResponse]
+    ) -> AsyncGenerator[GenerationResponse, None]:
+        try:
+            async for chunk in response:
+                observation.chunk(chunk)
+                yield chunk
+                observation.consumed()
+        except Exception as err:
+            observation.finish(err)
+            raise
+        observation.finish()
+
+    @classmethod
+    def _up_completion_start(cls, timer: Optional[PhaseTimer]):
+        if timer is None:
+            langfuse_context.update_current_observation(completion_start_time=datetime.now())
+        else:
+            timer.wrap("observe", langfuse_context.update_current_observation)(completion_start_time=datetime.now())
 
-            # 生成 response 的 Generator
-            yield chunk
+    @classmethod
+    def _stream_recorder(cls, model: str, metadata: Optional[dict]) -> Optional[StreamRecorder]:
+        """启用指标时记录首 token 延迟、chunk 间隔、输出速度，缓存回放不记录。"""
+        metrics = get_metrics()
+        if metrics is None or (metadata and metadata.get("cached")):
+            return None
+        return metrics.stream_recorder(model)
 
+    @classmethod
+    def _finish_stream_observation(
+        cls,
+        input_query: Any,
+        model: str,
+        output: OutputAccumulator,
+        last_usage: Optional[dict],
+        metadata: Optional[dict],
+        err: Optional[BaseException] = None,
+        recorder: Optional[StreamRecorder] = None,
+        timer: Optional[PhaseTimer] = None,
+        payload_policy: Optional[PayloadPolicy] = None,
+    ):
         # 没有 usage 加上空的
         if last_usage is None:
             last_usage = {"input_tokens": 0, "output_tokens": 0}
 
+        # metadata 在流结束时才读取，包含调用过程中追加的内容
+        metadata = {**metadata} if metadata else None
+        if metadata and metadata.get("cached"):
+            # 命中缓存不计费
+            last_usage = _ZERO_USAGE
+        if metadata and "served_model" in metadata:
+            # 熔断时由 fallback 模型提供服务
+            model = metadata["served_model"]
+        if output.truncated:
+            metadata = {**(metadata or {}), "output_chars": output.total_chars, "output_truncated": True}
+        if recorder is not None:
+            recorder.model = model
+            recorder.finish(last_usage)
         # 解释 token usage
-        cls._up_generation_observation(model, input_query, output, last_usage)
+        if err is None:
+            cls._up_with_timing(
+                timer,
+                cls._up_generation_observation,
+                model,
+                input_query,
+                output.getvalue(),
+                last_usage,
+                payload_policy,
+                metadata=metadata,
+            )
+        else:
+            cls._up_with_timing(
+                timer,
+                cls._up_generation_observation,
+                model,
+                input_query,
+                output.getvalue(),
+                last_usage,
+                payload_policy,
+                metadata=metadata,
+                level="ERROR",
+                status_message=str(getattr(err, "message", None) or err),
+            )
 
     @classmethod
     def _up_error_observation(
@@ -133,11 +561,14 @@ class Generation(TongyiGeneration):
         model: str,
         response: GenerationResponse,
         metadata: Optional[dict] = None,
+        payload_policy: Optional[PayloadPolicy] = None,
     ):
         level = "ERROR"
         err_meta = {"status_code": response.status_code, "err_code": response.code}
         if metadata:
             err_meta.update(metadata)
+        if payload_policy is not None:
+            input_query, _, err_meta = payload_policy.apply(input_query, None, level, err_meta)  # type: ignore
         langfuse_context.update_current_observation(
             name="Dashscope-generation",
             model=model,
@@ -148,6 +579,31 @@ class Generation(TongyiGeneration):
             metadata=err_meta,
         )
 
+    @classmethod
+    def _cached_metadata(cls, key: str, response: GenerationResponse) -> dict:
+        return {"cached": True, "cache_key": key, "cached_usage": dict(response.usage or _ZERO_USAGE)}
+
+    @classmethod
+    def _up_cached_generation_observation(cls, plan: _CallPlan):
+        response: GenerationResponse = plan.cached  # type: ignore
+        output = cls.response_to_output(plan.result_format, response)
+        metadata = cls._cached_metadata(plan.key, response)  # type: ignore
+        cls._up_generation_observation(
+            plan.model, plan.input_query, output, _ZERO_USAGE, plan.payload_policy, metadata=metadata
+        )
+
+    @classmethod
+    def _merge_stream_response(
+        cls, result_format: Optional[str], last: GenerationResponse, output: str
+    ) -> GenerationResponse:
+        """用最后一个 chunk 和拼接好的输出构造完整响应。"""
+        response = load_response(dump_response(last))
+        if result_format and "message" == result_format:
+            response.output.choices[0].message.content = output
+        else:
+            response.output.text = output
+        return response
+
     @classmethod
     def _do_call(
         cls,
@@ -164,6 +620,24 @@ class Generation(TongyiGeneration):
 
         return response
 
+    @classmethod
+    async def _do_acall(
+        cls,
+        model: str,
+        prompt: Any = None,
+        history: list = None,  # type: ignore
+        api_key: str = None,  # type: ignore
+        messages: List[Message] = None,  # type: ignore
+        plugins: Union[str, Dict[str, Any]] = None,  # type: ignore
+        workspace: str = None,  # type: ignore
+        **kwargs,
+    ) -> Union[GenerationResponse, AsyncGenerator[GenerationResponse, None]]:
+        if AioGeneration is None:
+            raise ModuleNotFoundError("Please upgrade Dashscope to use async feature: 'pip install -U dashscope'")
+        response = await AioGeneration.call(model, prompt, history, api_key, messages, plugins, workspace, **kwargs)
+
+        return response
+
     @classmethod
     def check_response(cls, resp: Any) -> Any:
         """Check the response from the completion call."""
@@ -182,36 +656,482 @@ class Generation(TongyiGeneration):
             )
 
     @classmethod
-    def generate_with_retry(cls, max_retries: int, **kwargs: Any) -> tuple[GenerationResponse, Optional[dict]]:
+    def _checker(cls, call_context: CallContext) -> Any:
+        """check_response，采样的调用计时。"""
+        if call_context.timer is None:
+            return cls.check_response
+        return call_context.timer.wrap("check", cls.check_response)
+
+    @classmethod
+    def _attempt(
+        cls, call_context: CallContext, is_hedge: bool = False, race: Optional[_HedgeRace] = None, **kwargs: Any
+    ) -> GenerationResponse:
+        """执行一次请求，不检查响应。"""
+        attempt = call_context.begin_attempt(is_hedge)
+        if race is not None and not race.join(is_hedge, attempt):
+            raise CancelledError()
+        do_call = cls._do_call if call_context.timer is None else call_context.timer.wrap("do_call", cls._do_call)
+        resp = None
+        try:
+            resp = do_call(**{**kwargs, "model": attempt.model})
+        finally:
+            call_context.end_attempt(attempt, resp)
+        return resp
+
+    @classmethod
+    def _hedged_attempt(cls, call_context: CallContext, **kwargs: Any) -> GenerationResponse:
+        hedge_policy: HedgePolicy = call_context.hedge_policy  # type: ignore
+        delay = hedge_policy.delay(call_context.served_model)
+        if delay is None:
+            return cls._attempt(call_context, **kwargs)
+
+        race = _HedgeRace(call_context)
+        executor = hedge_policy.executor
+        primary = executor.submit(cls._attempt, call_context, False, race, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        # 第一个请求超过 delay 还没返回，发对冲请求
+        hedge = executor.submit(cls._attempt, call_context, True, race, **kwargs)
+        pending = {primary, hedge}
+        finished = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished.extend(done)
+            if any(_is_success(f) for f in done):
+                break
+        # 已经开始的同步请求无法中断，不再等待，结果直接丢弃
+        for f in pending:
+            f.cancel()
+        return cls._pick_hedge_result(call_context, race, primary, hedge, finished, delay).result()
+
+    @classmethod
+    def _pick_hedge_result(
+        cls, call_context: CallContext, race: _HedgeRace, primary: Any, hedge: Any, finished: list, delay: float
+    ):
+        """
+        取先成功的结果；都失败时取先返回的失败响应。较慢的请求归还限流许可，不记录统计。
+        对冲请求发出了（没有被重试预算等拒绝）才在 metadata 记录 hedged、hedge_winner。
+        """
+        winner = next((f for f in finished if _is_success(f)), None)
+        if winner is None:
+            winner = next((f for f in finished if f.exception() is None), primary)
+        race.settle(winner is hedge)
+        if race.hedge_sent:
+            call_context.metadata["hedged"] = True
+            call_context.metadata["hedge_delay_second"] = round(delay, 3)
+            call_context.metadata["hedge_winner"] = "hedge" if winner is hedge else "primary"
+        return winner
+
+    @classmethod
+    def _call_and_check(cls, call_context: CallContext, **kwargs: Any) -> GenerationResponse:
+        if call_context.hedge_policy is not None:
+            resp = cls._hedged_attempt(call_context, **kwargs)
+        else:
+            resp = cls._attempt(call_context, **kwargs)
+        return cls._checker(call_context)(resp)
+
+    @classmethod
+    def _stream_first_chunk(
+        cls, call_context: CallContext, **kwargs: Any
+    ) -> tuple[Any, Optional[GenerationResponse], Attempt]:
+        attempt = call_context.begin_attempt()
+        timer = call_context.timer
+        start = time.perf_counter() if timer is not None else 0.0
+        first = None
+        try:
+            responses = cls._do_call(**{**kwargs, "model": attempt.model})
+            first = next(responses, None)
+        except BaseException:
+            call_context.end_attempt(attempt, first)
+            raise
+        finally:
+            if timer is not None:
+                timer.add("do_call", time.perf_counter() - start)
+        # 流式请求按第一个 chunk 记录熔断统计，流结束后再释放限流
+        call_context.record(attempt, first)
+        if first is None:
+            return responses, None, attempt
+        try:
+            return responses, cls._checker(call_context)(first), attempt
+        except BaseException:
+            call_context.release(attempt, first)
+            raise
+
+    @classmethod
+    def _retry_first_chunk(
+        cls, policy: RetryPolicy, deadline: Optional[float], call_context: CallContext, **kwargs: Any
+    ) -> tuple[Any, Optional[GenerationResponse], Attempt]:
+        """重试到拿到第一个 chunk 为止。"""
+        retrying = policy.retrying(deadline)
+        try:
+            return retrying(cls._stream_first_chunk, call_context, **kwargs)
+        finally:
+            call_context.add_retry_stat(retrying.statistics)
+
+    @classmethod
+    def _get_retry_policy(cls, max_retries: Optional[int], retry_policy: Optional[RetryPolicy] = None) -> RetryPolicy:
+        """优先级：参数 retry_policy > 类属性 retry_policy > 按 max_retries 缓存的默认策略。"""
+        policy = retry_policy or cls.retry_policy
+        if policy is None:
+            policy = default_retry_policy(10 if max_retries is None else max_retries)
+        return policy
+
+    @classmethod
+    def _retry_meta(
+        cls, policy: RetryPolicy, retry_stat: dict, deadline: Optional[float], retryable_failure: bool
+    ) -> Optional[dict]:
+        deadline = policy.effective_deadline(deadline)
+        retry_meta = retry_stat_to_meta(policy.max_retries, retry_stat, deadline)
+        # 可重试的错误，但没用完重试次数就停止了，说明是总时长用完了
+        if retryable_failure and deadline is not None and retry_stat.get("attempt_number", 0) < policy.max_retries:
+            retry_meta = retry_meta or {
+                "run_cnt": retry_stat.get("attempt_number", 1),
+                "max_retries": policy.max_retries,
+            }
+            retry_meta["deadline_second"] = deadline
+            retry_meta["deadline_exceeded"] = True
+        return retry_meta
+
+    @classmethod
+    def generate_with_retry(
+        cls,
+        max_retries: int,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: Optional[float] = None,
+        call_context: Optional[CallContext] = None,
+        **kwargs: Any,
+    ) -> tuple[GenerationResponse, Optional[dict]]:
         """Use tenacity to retry the completion call."""
-        retry_decorator = _create_retry_decorator(max_retries)
+        policy = cls._get_retry_policy(max_retries, retry_policy)
+        call_context = call_context or CallContext([kwargs["model"]])
+        retrying = policy.retrying(deadline)
+
+        response = None
+        retryable_failure = False
+        try:
+            response = retrying(cls._call_and_check, call_context, **kwargs)
+        except FailedGenerationException as e:
+            response = e.response
+            retryable_failure = policy.should_retry(e)
+        finally:
+            call_context.add_retry_stat(retrying.statistics)
+            call_context.finish(response)
+
+        return response, cls._retry_meta(policy, retrying.statistics, deadline, retryable_failure)
+
+    @classmethod
+    def stream_generate_with_retry(
+        cls,
+        max_retries: int,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: Optional[float] = None,
+        call_context: Optional[CallContext] = None,
+        stream_resumes: int = 0,
+        **kwargs: Any,
+    ) -> Generator[GenerationResponse, None, None]:
+        """
+        Use tenacity to retry the completion call. 在收到第一个 chunk 之前失败可以重试（对调用方透明）。
+
+        收到第一个 chunk 之后失败：stream_resumes 为 0 时快速失败，否则带上已输出的内容续写，重复的 chunk 不会交给调用方，
+        见 StreamResume。请求次数、浪费的 token 记录在 call_context.metadata。
+        """
+        policy = cls._get_retry_policy(max_retries, retry_policy)
+        call_context = call_context or CallContext([kwargs["model"]])
+        run = _StreamRun(call_context, cls._checker(call_context), StreamResume(kwargs, stream_resumes))
+        try:
+            responses, chunk = run.started(cls._retry_first_chunk(policy, deadline, call_context, **kwargs))
+            while chunk is not None:
+                try:
+                    out = run.resume.feed(chunk)
+                    if out is not None:
+                        yield out
+                    for resp in responses:
+                        out = run.feed(resp)
+                        if out is not None:
+                            yield out
+                    chunk = None
+                except Exception as err:
+                    resume_kwargs = run.resume_kwargs(err)
+                    if resume_kwargs is None:
+                        raise
+                    try:
+                        responses, chunk = run.resumed(
+                            cls._retry_first_chunk(policy, deadline, call_context, **resume_kwargs)
+                        )
+                    except Exception as resume_err:
+                        run.resume_failed(resume_err)
+                        raise
+            out = run.resume.finish()
+            if out is not None:
+                yield out
+        except Exception as e:
+            run.err = e
+            raise
+        finally:
+            run.close()
+
+    @classmethod
+    async def _aattempt(
+        cls, call_context: CallContext, is_hedge: bool = False, race: Optional[_HedgeRace] = None, **kwargs: Any
+    ) -> GenerationResponse:
+        attempt = await call_context.abegin_attempt(is_hedge)
+        if race is not None and not race.join(is_hedge, attempt):
+            raise asyncio.CancelledError()
+        do_acall = cls._do_acall if call_context.timer is None else call_context.timer.awrap("do_call", cls._do_acall)
+        resp = None
+        try:
+            resp = await do_acall(**{**kwargs, "model": attempt.model})
+        except asyncio.CancelledError:
+            # 对冲中较慢的请求被取消，不算失败
+            call_context.cancel_attempt(attempt)
+            raise
+        except BaseException:
+            call_context.end_attempt(attempt, resp)
+            raise
+        call_context.end_attempt(attempt, resp)
+        return resp
+
+    @classmethod
+    async def _ahedged_attempt(cls, call_context: CallContext, **kwargs: Any) -> GenerationResponse:
+        hedge_policy: HedgePolicy = call_context.hedge_policy  # type: ignore
+        delay = hedge_policy.delay(call_context.served_model)
+        if delay is None:
+            return await cls._aattempt(call_context, **kwargs)
+
+        race = _HedgeRace(call_context)
+        primary = asyncio.ensure_future(cls._aattempt(call_context, False, race, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(cls._aattempt(call_context, True, race, **kwargs))
+        pending = {primary, hedge}
+        finished = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished.extend(done)
+                if any(_is_success(f) for f in done):
+                    break
+        finally:
+            # 取消较慢的请求，只归还限流许可，不记录统计
+            for f in pending:
+                f.cancel()
+        return cls._pick_hedge_result(call_context, race, primary, hedge, finished, delay).result()
+
+    @classmethod
+    async def _acall_and_check(cls, call_context: CallContext, **kwargs: Any) -> GenerationResponse:
+        if call_context.hedge_policy is not None:
+            resp = await cls._ahedged_attempt(call_context, **kwargs)
+        else:
+            resp = await cls._aattempt(call_context, **kwargs)
+        return cls._checker(call_context)(resp)
+
+    @classmethod
+    async def _astream_first_chunk(
+        cls, call_context: CallContext, **kwargs: Any
+    ) -> tuple[Any, Optional[GenerationResponse], Attempt]:
+        attempt = await call_context.abegin_attempt()
+        timer = call_context.timer
+        start = time.perf_counter() if timer is not None else 0.0
+        first = None
+        try:
+            responses = await cls._do_acall(**{**kwargs, "model": attempt.model})
+            try:
+                first = await responses.__anext__()
+            except StopAsyncIteration:
+                pass
+        except BaseException:
+            call_context.end_attempt(attempt, first)
+            raise
+        finally:
+            if timer is not None:
+                timer.add("do_call", time.perf_counter() - start)
+        call_context.record(attempt, first)
+        if first is None:
+            return responses, None, attempt
+        try:
+            return responses, cls._checker(call_context)(first), attempt
+        except BaseException:
+            call_context.release(attempt, first)
+            raise
 
-        @retry_decorator
-        def _generate_with_retry(**_kwargs: Any) -> GenerationResponse:
-            resp = cls._do_call(**_kwargs)
-            return cls.check_response(resp)
+    @classmethod
+    async def _aretry_first_chunk(
+        cls, policy: RetryPolicy, deadline: Optional[float], call_context: CallContext, **kwargs: Any
+    ) -> tuple[Any, Optional[GenerationResponse], Attempt]:
+        retrying = policy.async_retrying(deadline)
+        try:
+            return await retrying(cls._astream_first_chunk, call_context, **kwargs)
+        finally:
+            call_context.add_retry_stat(retrying.statistics)
+
+    @classmethod
+    async def agenerate_with_retry(
+        cls,
+        max_retries: int,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: Optional[float] = None,
+        call_context: Optional[CallContext] = None,
+        **kwargs: Any,
+    ) -> tuple[GenerationResponse, Optional[dict]]:
+        """Async version of generate_with_retry."""
+        policy = cls._get_retry_policy(max_retries, retry_policy)
+        call_context = call_context or CallContext([kwargs["model"]])
+        retrying = policy.async_retrying(deadline)
 
+        response = None
+        retryable_failure = False
         try:
-            response = _generate_with_retry(**kwargs)
+            response = await retrying(cls._acall_and_check, call_context, **kwargs)
         except FailedGenerationException as e:
             response = e.response
+            retryable_failure = policy.should_retry(e)
+        finally:
+            call_context.add_retry_stat(retrying.statistics)
+            call_context.finish(response)
 
-        # 记录重试信息
-        retry_stat = _generate_with_retry.statistics
-        return response, retry_stat_to_meta(max_retries, retry_stat)
+        return response, cls._retry_meta(policy, retrying.statistics, deadline, retryable_failure)
 
     @classmethod
-    def stream_generate_with_retry(cls, max_retries: int, **kwargs: Any) -> Generator[GenerationResponse, None, None]:
-        """Use tenacity to retry the completion call."""
-        retry_decorator = _create_retry_decorator(max_retries)
+    async def astream_generate_with_retry(
+        cls,
+        max_retries: int,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: Optional[float] = None,
+        call_context: Optional[CallContext] = None,
+        stream_resumes: int = 0,
+        **kwargs: Any,
+    ) -> AsyncGenerator[GenerationResponse, None]:
+        """Async version of stream_generate_with_retry. 在收到第一个 chunk 之前失败可以重试，之后快速失败或续写。"""
+        policy = cls._get_retry_policy(max_retries, retry_policy)
+        call_context = call_context or CallContext([kwargs["model"]])
+        run = _StreamRun(call_context, cls._checker(call_context), StreamResume(kwargs, stream_resumes))
+        try:
+            responses, chunk = run.started(await cls._aretry_first_chunk(policy, deadline, call_context, **kwargs))
+            while chunk is not None:
+                try:
+                    out = run.resume.feed(chunk)
+                    if out is not None:
+                        yield out
+                    async for resp in responses:
+                        out = run.feed(resp)
+                        if out is not None:
+                            yield out
+                    chunk = None
+                except Exception as err:
+                    resume_kwargs = run.resume_kwargs(err)
+                    if resume_kwargs is None:
+                        raise
+                    try:
+                        responses, chunk = run.resumed(
+                            await cls._aretry_first_chunk(policy, deadline, call_context, **resume_kwargs)
+                        )
+                    except Exception as resume_err:
+                        run.resume_failed(resume_err)
+                        raise
+            out = run.resume.finish()
+            if out is not None:
+                yield out
+        except Exception as e:
+            run.err = e
+            raise
+        finally:
+            run.close()
+
+    @classmethod
+    def _flight_key(
+        cls,
+        model: str,
+        prompt: Any,
+        history: Optional[list],
+        api_key: Optional[str],
+        messages: Optional[List[Message]],
+        plugins: Any,
+        workspace: Optional[str],
+        kwargs: dict,
+    ) -> tuple:
+        """相同 api_key、workspace 下的相同请求才合并。"""
+        key = cache_key(model, prompt=prompt, history=history, messages=messages, plugins=plugins, **kwargs)
+        return api_key, workspace, key
 
-        @retry_decorator
-        def _stream_generate_with_retry(**_kwargs: Any) -> Generator[GenerationResponse, None, None]:
-            responses = cls._do_call(**_kwargs)
-            for resp in responses:
-                yield cls.check_response(resp)
+    @classmethod
+    def _create_call_context(
+        cls,
+        model: str,
+        prompt: Any,
+        api_key: Optional[str],
+        messages: Optional[List[Message]],
+        workspace: Optional[str],
+        kwargs: dict,
+    ) -> CallContext:
+        """取出 langfarm 自己的参数（不传给 dashscope），创建本次调用的 CallContext。"""
+        rate_limiter = kwargs.pop("rate_limiter", cls.rate_limiter)
+        estimated_tokens = 0
+        if rate_limiter is not None:
+            estimated_tokens = rate_limiter.estimate_tokens(prompt, messages, kwargs.get("max_tokens"))
+        retry_budget = kwargs.pop("retry_budget", cls.retry_budget)
+        circuit_breaker = kwargs.pop("circuit_breaker", cls.circuit_breaker)
+        fallback_models = kwargs.pop("fallback_models", None)
+        if fallback_models is None:
+            fallback_models = cls.fallback_models.get(model, [])
+        hedge_policy = kwargs.pop("hedge_policy", cls.hedge_policy)
+        timer = PhaseTimer.sample(kwargs.pop("phase_timing", cls.phase_timing))
+        if kwargs.get("stream", False):
+            # 流式调用不对冲
+            hedge_policy = None
+        return CallContext(
+            [model, *fallback_models],
+            api_key,
+            workspace,
+            rate_limiter,
+            estimated_tokens,
+            retry_budget,
+            circuit_breaker,
+            hedge_policy,
+            get_metrics(),
+            timer,
+        )
+
+    @classmethod
+    def _plan_call(
+        cls,
+        model: str,
+        prompt: Any,
+        history: Optional[list],
+        api_key: Optional[str],
+        messages: Optional[List[Message]],
+        plugins: Optional[Union[str, Dict[str, Any]]],
+        workspace: Optional[str],
+        kwargs: dict,
+    ) -> _CallPlan:
+        return _CallPlan(cls, model, prompt, history, api_key, messages, plugins, workspace, kwargs)
 
-        return _stream_generate_with_retry(**kwargs)
+    @classmethod
+    def _finish_call(cls, plan: _CallPlan, result: tuple, shared: bool) -> GenerationResponse:
+        """非流式调用结束：上报 observation，写入缓存。result 为 (response, retry_stat, 实际发请求的 CallContext)。"""
+        response, retry_stat, call_context = result
+        metadata = call_context.metadata
+        if shared:
+            # 与其他调用共享了同一个请求，不计费，重试统计属于 leader
+            retry_stat = None
+            metadata = {**metadata, "coalesced": True}
+        cls._up_general_generation_observation(
+            plan.input_query,
+            call_context.served_model,
+            plan.result_format,
+            response,
+            retry_stat,
+            metadata,
+            plan.call_context.timer,
+            plan.payload_policy,
+        )
+        # fallback 模型返回的响应不缓存，避免请求的模型恢复后仍返回 fallback 的结果
+        if plan.key is not None and response.status_code == 200 and call_context.served_model == plan.model:
+            plan.response_cache.set(plan.key, response)  # type: ignore
+        return response
 
     @classmethod
     def call(
@@ -225,46 +1145,95 @@ class Generation(TongyiGeneration):
         workspace: Optional[str] = None,
         **kwargs,
     ) -> Union[GenerationResponse, Generator[GenerationResponse, None, None]]:
-        # input
-        input_query = None
-        if prompt:
-            input_query = prompt
-        if messages:
-            input_query = messages
-
-        # output
-        result_format = kwargs.get("result_format")
-        incremental_output = kwargs.get("incremental_output", False)
+        plan = cls._plan_call(model, prompt, history, api_key, messages, plugins, workspace, kwargs)
+        if plan.stream:
+            if plan.cached is not None:
+                # 以一个 chunk 回放
+                response = iter([plan.cached])
+            else:
+                response = cls.stream_generate_with_retry(
+                    plan.retry_policy.max_retries,
+                    plan.retry_policy,
+                    plan.deadline,
+                    plan.call_context,
+                    plan.stream_resumes,
+                    **plan.call_kwargs,
+                )
+            return cls._up_stream_generation_observation(cls._stream_observation(plan), response)
+        if plan.cached is not None:
+            cls._up_cached_generation_observation(plan)
+            return plan.cached
 
-        # is stream
-        stream = kwargs.get("stream", False)
-        max_retries = kwargs.pop("max_retries", 10)
-        if stream:
-            response = cls.stream_generate_with_retry(
-                max_retries,
-                model=model,
-                prompt=prompt,
-                history=history,
-                api_key=api_key,
-                messages=messages,
-                plugins=plugins,
-                workspace=workspace,
-                **kwargs,
-            )
-            return cls._up_stream_generation_observation(
-                input_query, model, result_format, response, incremental_output
-            )
-        else:
+        def _generate() -> tuple:
             response, retry_stat = cls.generate_with_retry(
-                max_retries,
-                model=model,
-                prompt=prompt,
-                history=history,
-                api_key=api_key,
-                messages=messages,
-                plugins=plugins,
-                workspace=workspace,
-                **kwargs,
+                plan.retry_policy.max_retries, plan.retry_policy, plan.deadline, plan.call_context, **plan.call_kwargs
+            )
+            return response, retry_stat, plan.call_context
+
+        if plan.single_flight is None:
+            return cls._finish_call(plan, _generate(), False)
+        result, shared = plan.single_flight.do(plan.flight_key, _generate)
+        return cls._finish_call(plan, result, shared)
+
+    @classmethod
+    async def acall(
+        cls,
+        model: str,
+        prompt: Any = None,
+        history: Optional[list] = None,
+        api_key: Optional[str] = None,
+        messages: Optional[List[Message]] = None,
+        plugins: Optional[Union[str, Dict[str, Any]]] = None,
+        workspace: Optional[str] = None,
+        **kwargs,
+    ) -> Union[GenerationResponse, AsyncGenerator[GenerationResponse, None]]:
+        """Async version of call, 基于 dashscope 的 AioGeneration。stream=True 时返回 AsyncGenerator。"""
+        plan = cls._plan_call(model, prompt, history, api_key, messages, plugins, workspace, kwargs)
+        if plan.stream:
+            if plan.cached is not None:
+                # 以一个 chunk 回放
+                response = _aiter_responses([plan.cached])
+            else:
+                response = cls.astream_generate_with_retry(
+                    plan.retry_policy.max_retries,
+                    plan.retry_policy,
+                    plan.deadline,
+                    plan.call_context,
+                    plan.stream_resumes,
+                    **plan.call_kwargs,
+                )
+            return cls._aup_stream_generation_observation(cls._stream_observation(plan), response)
+        if plan.cached is not None:
+            cls._up_cached_generation_observation(plan)
+            return plan.cached
+
+        async def _generate() -> tuple:
+            response, retry_stat = await cls.agenerate_with_retry(
+                plan.retry_policy.max_retries, plan.retry_policy, plan.deadline, plan.call_context, **plan.call_kwargs
             )
-            cls._up_general_generation_observation(input_query, model, result_format, response, retry_stat)
-            return response
+            return response, retry_stat, plan.call_context
+
+        if plan.single_flight is None:
+            return cls._finish_call(plan, await _generate(), False)
+        result, shared = await plan.single_flight.ado(plan.flight_key, _generate)
+        return cls._finish_call(plan, result, shared)
+
+    @classmethod
+    def batch_iter(cls, model: str, inputs: Iterable[Any], max_workers: int = 8, **kwargs) -> Iterator[BatchResult]:
+        """
+        并发调用多个输入，按完成顺序返回 BatchResult。
+
+        inputs 的每一项：str 为 prompt，list 为 messages，dict 为 call 的参数。kwargs 是所有项共用的 call 参数，
+        每一项与 call 一样重试、限流，并有自己的 generation observation，嵌套在一个汇总的 span 下。
+        单项的异常放在 BatchResult.error 中返回，不会中断整个批量。
+        """
+        if kwargs.get("stream", False):
+            raise ValueError("batch call does not support stream")
+        return observe_batch(cls.call, model, inputs, max_workers, kwargs)
+
+    @classmethod
+    def batch_call(cls, model: str, inputs: Iterable[Any], max_workers: int = 8, **kwargs) -> List[BatchResult]:
+        """同 batch_iter，全部完成后按输入顺序返回。"""
+        results = list(cls.batch_iter(model, inputs, max_workers, **kwargs))
+        results.sort(key=lambda result: result.index)
+        return results
@@ -0,0 +1,81 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional
+
+
+class HedgePolicy:
+    """
+    对冲请求（只用于非流式调用）：第一个请求在 delay 秒内没有返回时，再发一个相同的请求，取先成功返回的结果。
+
+    delay 为 None 时按最近成功请求耗时的 percentile 分位数（如 p95）自适应，
+    样本数不足 min_samples 时使用 fallback_delay（为 None 则不对冲）。
+    对冲请求与重试一样经过限流器，并消耗重试预算。
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 0.95,
+        min_delay: float = 0.05,
+        max_delay: Optional[float] = None,
+        fallback_delay: Optional[float] = None,
+        min_samples: int = 20,
+        window_size: int = 200,
+        max_workers: int = 32,
+    ):
+        """
+        :param delay: 固定的对冲等待秒数，None 表示按耗时分位数自适应
+        :param percentile: 自适应时使用的分位数
+        :param min_delay: 自适应等待的下限
+        :param max_delay: 自适应等待的上限
+        :param fallback_delay: 样本不足时的等待秒数，None 表示样本不足时不对冲
+        :param min_samples: 自适应需要的最少样本数
+        :param window_size: 每个模型保留最近多少个耗时样本
+        :param max_workers: 同步调用时执行请求的线程数
+        """
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.fallback_delay = fallback_delay
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.max_workers = max_workers
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def record(self, model: str, latency: float):
+        """记录一次成功请求的耗时。"""
+        latencies = self._latencies.get(model)
+        if latencies is None:
+            latencies = self._latencies.setdefault(model, deque(maxlen=self.window_size))
+        latencies.append(latency)
+
+    def delay(self, model: str) -> Optional[float]:
+        """对冲前等待的秒数，None 表示不对冲。"""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        latencies = self._latencies.get(model)
+        if latencies is None or len(latencies) < self.min_samples:
+            return self.fallback_delay
+        samples = sorted(latencies)
+        value = samples[min(len(samples) - 1, int(len(samples) * self.percentile))]
+        value = max(self.min_delay, value)
+        if self.max_delay is not None:
+            value = min(self.max_delay, value)
+        return value
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="langfarm-hedge")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
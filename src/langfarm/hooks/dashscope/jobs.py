@@ -0,0 +1,249 @@
+"""
+JSONL 批量任务：逐行读取请求，并发调用，逐行写出结果，可断点续跑。
+
+    python -m langfarm.hooks.dashscope.jobs requests.jsonl results.jsonl --model qwen-plus --max-workers 16 --rpm 600
+
+输入每行是一个 JSON 对象：可选的 "id"，其余为 Generation.call 的参数（如 "prompt"、"messages"、"seed"）。
+输出每行包含 id、line（输入行号，从 0 开始）、status_code、output、usage，失败时包含 code、message 或 error。
+空行跳过，不是 JSON 对象的行输出 error，不会中断任务。
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Set, Type
+
+from langfarm.hooks.dashscope.batch import BatchResult, BatchStat, run_batch
+from langfarm.hooks.dashscope.generation import Generation
+from langfarm.hooks.dashscope.ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    已完成的输入行号：watermark 之前（含）的行全部完成，done 为 watermark 之后乱序完成的行。
+
+    并发执行时乱序完成的行数不超过并发数，所以检查点的大小与输入文件大小无关。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = -1
+        self.done: Set[int] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.watermark = data.get("watermark", -1)
+            self.done = set(data.get("done", []))
+
+    def is_done(self, line: int) -> bool:
+        return line <= self.watermark or line in self.done
+
+    def mark(self, line: int):
+        self.done.add(line)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.remove(self.watermark)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+
+class _JobItem:
+    def __init__(self, line: int, text: str):
+        self.line = line
+        self.id: Any = line
+        self.kwargs: Dict[str, Any] = {}
+        # 解析失败时作为这一行的错误输出
+        self.error: Optional[ValueError] = None
+        try:
+            request = json.loads(text)
+            if not isinstance(request, dict):
+                raise ValueError(f"expected a JSON object, got {type(request).__name__}")
+        except ValueError as e:
+            self.error = e
+            return
+        self.id = request.pop("id", line)
+        self.kwargs = request
+
+    def to_call_kwargs(self) -> Dict[str, Any]:
+        if self.error is not None:
+            raise self.error
+        return self.kwargs
+
+
+class JobRunner:
+    """
+    JSONL 批量任务的 Python API。
+
+    输入按需逐行读取，同时最多 max_workers 个请求，结果按完成顺序追加写入输出文件，内存占用与文件大小无关。
+    检查点每 checkpoint_interval 秒保存一次，重新运行时跳过已完成的行；崩溃前最后一个检查点之后完成的行会重新执行，
+    输出中可能有重复的 id（保留最后一条即可）。失败的行也算完成，按 status_code / error 过滤后可单独重跑。
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_workers: int = 8,
+        rate_limiter: Optional[RateLimiter] = None,
+        generation_cls: Type[Generation] = Generation,
+        checkpoint_interval: float = 1.0,
+        report_interval: float = 30.0,
+        **call_kwargs: Any,
+    ):
+        """
+        :param model: 默认模型，输入行中的 "model" 优先
+        :param max_workers: 并发数
+        :param rate_limiter: 客户端限流器
+        :param generation_cls: 调用的 Generation 类
+        :param checkpoint_interval: 保存检查点的间隔秒数
+        :param report_interval: 日志输出进度的间隔秒数
+        :param call_kwargs: 所有行共用的 call 参数
+        """
+        self.model = model
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.generation_cls = generation_cls
+        self.checkpoint_interval = checkpoint_interval
+        self.report_interval = report_interval
+        self.call_kwargs = call_kwargs
+
+    def _read(self, input_path: str, checkpoint: Checkpoint, limit: Optional[int]) -> Iterator[_JobItem]:
+        count = 0
+        with open(input_path, encoding="utf-8") as f:
+            for line, text in enumerate(f):
+                if limit is not None and count >= limit:
+                    return
+                if checkpoint.is_done(line):
+                    continue
+                if not text.strip():
+                    # 空行也要标记完成，否则 watermark 停在这里
+                    checkpoint.mark(line)
+                    continue
+                count += 1
+                yield _JobItem(line, text)
+
+    def _to_record(self, item: _JobItem, result: BatchResult) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"id": item.id, "line": item.line}
+        response = result.response
+        if result.error is not None:
+            record["error"] = f"{type(result.error).__name__}: {result.error}"
+        elif response is not None:
+            record["status_code"] = response.status_code
+            if response.status_code == 200:
+                result_format = item.kwargs.get("result_format", self.call_kwargs.get("result_format"))
+                record["output"] = self.generation_cls.response_to_output(result_format, response)
+                record["usage"] = dict(response.usage or {})
+            else:
+                record["code"] = response.code
+                record["message"] = response.message
+        return record
+
+    def _report(self, stat: BatchStat):
+        wall = stat.wall_second
+        logger.info(
+            "job progress: done=%d failed=%d tokens=%d/%d rate=%.1f/s",
+            stat.total,
+            stat.failed,
+            stat.input_tokens,
+            stat.output_tokens,
+            stat.total / wall if wall > 0 else 0,
+        )
+
+    def run(
+        self,
+        input_path: str,
+        output_path: str,
+        checkpoint_path: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> BatchStat:
+        """
+        :param checkpoint_path: 检查点文件，默认为 output_path + ".checkpoint"
+        :param limit: 本次最多处理的行数（不含已完成的行）
+        """
+        checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+        kwargs = dict(self.call_kwargs)
+        if self.model is not None:
+            kwargs["model"] = self.model
+        if self.rate_limiter is not None:
+            kwargs["rate_limiter"] = self.rate_limiter
+
+        stat = BatchStat()
+        saved_at = reported_at = time.monotonic()
+        results = run_batch(
+            self.generation_cls.call,
+            self._read(input_path, checkpoint, limit),
+            self.max_workers,
+            kwargs,
+            _JobItem.to_call_kwargs,
+        )
+        with open(output_path, "a", encoding="utf-8") as out:
+            try:
+                for result in results:
+                    item: _JobItem = result.input
+                    out.write(json.dumps(self._to_record(item, result), ensure_ascii=False))
+                    out.write("\n")
+                    stat.add(result)
+                    checkpoint.mark(item.line)
+
+                    now = time.monotonic()
+                    if now - saved_at >= self.checkpoint_interval:
+                        # 先落盘结果，再保存检查点
+                        out.flush()
+                        checkpoint.save()
+                        saved_at = now
+                    if now - reported_at >= self.report_interval:
+                        self._report(stat)
+                        reported_at = now
+            finally:
+                out.flush()
+                checkpoint.save()
+        self._report(stat)
+        return stat
+
+
+def _parse_param(value: str) -> tuple:
+    key, _, raw = value.partition("=")
+    try:
+        return key, json.loads(raw)
+    except ValueError:
+        return key, raw
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of dashscope generation requests.")
+    parser.add_argument("input", help="输入 JSONL 文件")
+    parser.add_argument("output", help="输出 JSONL 文件（追加写入）")
+    parser.add_argument("--model", help="默认模型")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--rpm", type=float, help="每分钟请求数上限")
+    parser.add_argument("--tpm", type=float, help="每分钟 token 数上限")
+    parser.add_argument("--checkpoint", help="检查点文件，默认为 <output>.checkpoint")
+    parser.add_argument("--limit", type=int, help="本次最多处理的行数")
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    parser.add_argument(
+        "--param", action="append", default=[], metavar="KEY=VALUE", help="共用的 call 参数，VALUE 按 JSON 解释"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    rate_limiter = RateLimiter(rpm=args.rpm, tpm=args.tpm) if args.rpm or args.tpm else None
+    runner = JobRunner(
+        model=args.model,
+        max_workers=args.max_workers,
+        rate_limiter=rate_limiter,
+        report_interval=args.report_interval,
+        **dict(_parse_param(p) for p in args.param),
+    )
+    stat = runner.run(args.input, args.output, args.checkpoint, args.limit)
+    print(json.dumps(stat.to_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
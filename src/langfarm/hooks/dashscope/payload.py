@@ -0,0 +1,85 @@
+import hashlib
+import random
+from typing import Any, Iterable, List, Optional, Tuple
+
+from langfarm.hooks.misc import truncate_middle
+
+# 不超过这个长度的文本不用 hash 代替（hash 标记本身约 90 个字符）
+_HASH_MIN_CHARS = 100
+
+
+class PayloadPolicy:
+    """
+    上报到 langfuse 的 input、output 的大小策略，usage、metadata 总是完整上报。
+
+    input（prompt 或 messages 中的每个文本）、output 超过 max_chars 时保留头尾、中间用标记代替，
+    hash_content 时用 sha256 和字符数代替内容。按 full_sample_rate 采样的调用、full_levels 级别（默认出错、重试）的调用上报完整内容。
+    内容被截断或 hash 时 metadata 的 payload 记录原始的字符数。
+    """
+
+    def __init__(
+        self,
+        max_chars: Optional[int] = None,
+        hash_content: bool = False,
+        full_sample_rate: float = 0.0,
+        full_levels: Iterable[str] = ("ERROR", "WARNING"),
+    ):
+        """
+        :param max_chars: 每个文本最多保留的字符数，None 不限制（hash_content 时超过 100 个字符的文本都用 hash 代替）
+        :param hash_content: 超过 max_chars 的文本用 sha256 代替，而不是截断
+        :param full_sample_rate: 上报完整内容的调用比例（0~1）
+        :param full_levels: 上报完整内容的 observation level
+        """
+        self.max_chars = max_chars
+        self.hash_content = hash_content
+        self.full_sample_rate = full_sample_rate
+        self.full_levels = frozenset(full_levels)
+        if hash_content:
+            self._limit = max(max_chars or 0, _HASH_MIN_CHARS)
+        else:
+            self._limit = max_chars
+
+    def keep_full(self, level: Optional[str] = None) -> bool:
+        if self._limit is None or level in self.full_levels:
+            return True
+        return self.full_sample_rate > 0 and random.random() < self.full_sample_rate
+
+    def apply(
+        self, input_query: Any, output: Any, level: Optional[str] = None, metadata: Optional[dict] = None
+    ) -> Tuple[Any, Any, Optional[dict]]:
+        """返回上报的 input、output、metadata。"""
+        if self.keep_full(level):
+            return input_query, output, metadata
+        input_stat = [0, False]
+        output_stat = [0, False]
+        input_query = self._shrink(input_query, input_stat)
+        output = self._shrink(output, output_stat)
+        if input_stat[1] or output_stat[1]:
+            payload = {
+                "mode": "hash" if self.hash_content else "truncate",
+                "input_chars": input_stat[0],
+                "output_chars": output_stat[0],
+            }
+            # 浅拷贝，metadata 中的 dict（如 timing）仍是同一个对象
+            metadata = {**(metadata or {}), "payload": payload}
+        return input_query, output, metadata
+
+    def _shrink(self, value: Any, stat: List[Any]) -> Any:
+        """stat 为 [字符数, 是否修改]。"""
+        if isinstance(value, str):
+            stat[0] += len(value)
+            if len(value) <= self._limit:  # type: ignore
+                return value
+            stat[1] = True
+            return self._shrink_text(value)
+        if isinstance(value, dict):
+            return {k: self._shrink(v, stat) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._shrink(v, stat) for v in value]
+        return value
+
+    def _shrink_text(self, text: str) -> str:
+        if self.hash_content:
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            return f"[sha256:{digest}, {len(text)} chars]"
+        return truncate_middle(text, self.max_chars)  # type: ignore
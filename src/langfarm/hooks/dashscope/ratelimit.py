@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional
+
+# 429 触发降低并发上限
+THROTTLED_STATUS_CODE = 429
+
+
+class TokenBucket:
+    """
+    令牌桶，按分钟速率补充。
+
+    reserve() 允许透支：先扣减再返回需要等待的秒数，调用方等待后即可发请求，
+    这样多个调用方会被均匀地排开，而不是同时醒来再争抢。
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """用实际用量修正预估（正数为多扣，负数为退还）。"""
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发上限：遇到 429 乘性降低，成功时加性增长（每个 limit 的成功次数约 +1）。"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, backoff: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.backoff = backoff
+        self.limit = float(max_limit)
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def release(self, throttled: bool):
+        self.in_flight = max(0, self.in_flight - 1)
+        if throttled:
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def cancel(self):
+        """请求被取消：只归还名额，不调整上限。"""
+        self.in_flight = max(0, self.in_flight - 1)
+
+
+class _LimiterState:
+    def __init__(self, limiter: "RateLimiter"):
+        self.lock = threading.Condition()
+        self.requests = TokenBucket(limiter.rpm) if limiter.rpm else None
+        self.tokens = TokenBucket(limiter.tpm) if limiter.tpm else None
+        self.concurrency = (
+            AdaptiveConcurrency(limiter.max_concurrency, limiter.min_concurrency) if limiter.max_concurrency else None
+        )
+
+
+class Permit:
+    """一次请求的许可，请求结束后必须 release()。"""
+
+    def __init__(self, state: _LimiterState, estimated_tokens: int, waited: float):
+        self._state = state
+        self._released = False
+        self.estimated_tokens = estimated_tokens
+        self.waited = waited
+
+    def release(self, status_code: Optional[int] = None, used_tokens: Optional[int] = None):
+        if self._released:
+            return
+        self._released = True
+        state = self._state
+        with state.lock:
+            if state.tokens is not None and used_tokens is not None:
+                state.tokens.adjust(used_tokens - self.estimated_tokens)
+            if state.concurrency is not None:
+                state.concurrency.release(status_code == THROTTLED_STATUS_CODE)
+                state.lock.notify()
+
+    def cancel(self):
+        """请求被取消（如对冲中较慢的请求）：只归还并发名额，不作为成功或限流反馈，预估 token 不退还。"""
+        if self._released:
+            return
+        self._released = True
+        state = self._state
+        if state.concurrency is not None:
+            with state.lock:
+                state.concurrency.cancel()
+                state.lock.notify()
+
+
+class RateLimiter:
+    """
+    进程内的客户端限流器，按 key（model, api_key, workspace）分别限流。
+
+    - rpm / tpm: 每分钟请求数、token 数的令牌桶（tpm 按预估 token 扣减，请求结束后用实际用量修正）
+    - max_concurrency: AIMD 自适应并发上限，429 时减半，成功时缓慢增长，最低 min_concurrency
+
+    同一个 RateLimiter 实例可在多线程和多个 event loop 间共享。
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+        estimated_output_tokens: int = 256,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.estimated_output_tokens = estimated_output_tokens
+        self._states: Dict[Hashable, _LimiterState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, key: Hashable) -> _LimiterState:
+        state = self._states.get(key)
+        if state is None:
+            with self._lock:
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = _LimiterState(self)
+        return state
+
+    def estimate_tokens(self, prompt: Any = None, messages: Any = None, max_tokens: Optional[int] = None) -> int:
+        """粗略预估 token：输入按字符数（中文约 1 字 1 token，偏保守），输出按 max_tokens。"""
+        chars = len(prompt) if isinstance(prompt, str) else 0
+        for message in messages or []:
+            content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+            if isinstance(content, str):
+                chars += len(content)
+        return chars + (max_tokens or self.estimated_output_tokens)
+
+    def _reserve(self, state: _LimiterState, tokens: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        with state.lock:
+            if state.requests is not None:
+                wait = max(wait, state.requests.reserve(1, now))
+            if state.tokens is not None:
+                wait = max(wait, state.tokens.reserve(tokens, now))
+        return wait
+
+    def acquire(self, key: Hashable, tokens: int = 0) -> Permit:
+        """阻塞直到允许发请求。"""
+        state = self._state(key)
+        start = time.monotonic()
+        wait = self._reserve(state, tokens)
+        if wait > 0:
+            time.sleep(wait)
+        if state.concurrency is not None:
+            with state.lock:
+                while not state.concurrency.try_acquire():
+                    state.lock.wait(0.05)
+        return Permit(state, tokens, time.monotonic() - start)
+
+    async def aacquire(self, key: Hashable, tokens: int = 0) -> Permit:
+        """acquire 的异步版本，等待时不阻塞 event loop。"""
+        state = self._state(key)
+        start = time.monotonic()
+        wait = self._reserve(state, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if state.concurrency is not None:
+            poll = 0.005
+            while True:
+                with state.lock:
+                    if state.concurrency.try_acquire():
+                        break
+                await asyncio.sleep(poll)
+                poll = min(poll * 2, 0.05)
+        return Permit(state, tokens, time.monotonic() - start)
+
+    def concurrency_limit(self, key: Hashable) -> Optional[float]:
+        state = self._states.get(key)
+        if state is None or state.concurrency is None:
+            return None
+        return state.concurrency.limit
@@ -0,0 +1,196 @@
+from typing import Any, Dict, Optional
+
+from dashscope.api_entities.dashscope_response import GenerationResponse
+
+from langfarm.hooks.dashscope.exceptions import FastFailGenerationException, RetryGenerationException
+from langfarm.hooks.misc import OutputAccumulator
+
+# 收到第一个 chunk 之后可以续写的异常：可重试的状态码、网络错误（requests 的异常是 OSError 的子类）
+RESUMABLE_EXCEPTIONS = (RetryGenerationException, OSError)
+
+
+def _get_text(result_format: Optional[str], resp: GenerationResponse) -> str:
+    if result_format == "message":
+        return resp.output.choices[0].message.content or ""
+    return resp.output.text or ""
+
+
+def _set_text(result_format: Optional[str], resp: GenerationResponse, text: str):
+    if result_format == "message":
+        resp.output.choices[0].message.content = text
+    else:
+        resp.output.text = text
+
+
+class _ResumeFilter:
+    """
+    续写请求的 chunk 转换为调用方看到的 chunk。
+
+    服务端可能只返回续写的内容，也可能从头重新输出（已输出的 delivered 是输出的前缀）。
+    输出仍是 delivered 的前缀时无法区分两种情况，先暂存；出现分歧后确定：以 delivered 开头则丢弃重复部分，否则都是续写的内容。
+    """
+
+    def __init__(self, delivered: str, result_format: Optional[str], incremental_output: bool, continued: bool):
+        self.delivered = delivered
+        self.result_format = result_format
+        self.incremental_output = incremental_output
+        # 请求带上了已输出的内容，流结束时仍无法区分则认为是续写
+        self.continued = continued
+        self.echo: Optional[bool] = None
+        # 续写请求的累计输出
+        self._text = ""
+        # 已转换输出的续写内容
+        self._emitted = ""
+        # 暂存部分（重新输出时即重复的部分）的输出 token 数
+        self._held_output_tokens = 0
+        self.echo_output_tokens = 0
+
+    def feed(self, resp: GenerationResponse) -> Optional[GenerationResponse]:
+        text = _get_text(self.result_format, resp)
+        self._text = self._text + text if self.incremental_output else text
+        if self.echo is None:
+            if self.delivered.startswith(self._text):
+                self._held_output_tokens = (resp.usage or {}).get("output_tokens") or 0
+                return None
+            self.echo = self._text.startswith(self.delivered)
+            if self.echo:
+                self.echo_output_tokens = self._held_output_tokens
+        return self._emit(resp)
+
+    def finish(self, last: Optional[GenerationResponse]) -> Optional[GenerationResponse]:
+        """流结束时仍在暂存，输出最后一个 chunk（带 usage、finish_reason）。"""
+        if self.echo is not None or last is None:
+            return None
+        self.echo = not self.continued
+        if self.echo:
+            self.echo_output_tokens = self._held_output_tokens
+        return self._emit(last)
+
+    def _emit(self, resp: GenerationResponse) -> GenerationResponse:
+        new_text = self._text[len(self.delivered) :] if self.echo else self._text
+        if self.incremental_output:
+            _set_text(self.result_format, resp, new_text[len(self._emitted) :])
+        else:
+            _set_text(self.result_format, resp, self.delivered + new_text)
+        self._emitted = new_text
+        return resp
+
+
+class StreamResume:
+    """
+    流式调用收到第一个 chunk 之后失败的处理。
+
+    max_resumes 为 0 时快速失败；否则发起续写请求：messages 最后追加已输出内容的 partial assistant 消息，
+    服务端从已输出的内容之后继续生成，重复输出的部分不会再交给调用方。
+    续写之后每个 chunk 的 usage 为所有请求的合计，wasted_tokens 为重复付费的 token（续写请求的输入、重复的输出、失败的请求）。
+    """
+
+    def __init__(self, kwargs: Dict[str, Any], max_resumes: int = 0):
+        self.kwargs = kwargs
+        self.max_resumes = max_resumes
+        self.result_format = kwargs.get("result_format")
+        self.incremental_output = kwargs.get("incremental_output", False)
+        self.attempts = 1
+        self.resumes = 0
+        self.wasted_tokens = 0
+        self.error: Optional[BaseException] = None
+        # 只有允许续写时才需要保存已输出的内容
+        self._delivered = OutputAccumulator(self.incremental_output) if max_resumes > 0 else None
+        # 已结束的请求的 usage 合计
+        self._done_usage: Optional[Dict[str, int]] = None
+        self._usage: Optional[dict] = None
+        self._filter: Optional[_ResumeFilter] = None
+        self._held: Optional[GenerationResponse] = None
+
+    def can_resume(self, err: BaseException) -> bool:
+        return (
+            self.resumes < self.max_resumes
+            and isinstance(err, RESUMABLE_EXCEPTIONS)
+            and not isinstance(err, FastFailGenerationException)
+        )
+
+    def feed(self, resp: GenerationResponse) -> Optional[GenerationResponse]:
+        """已检查的 chunk，返回交给调用方的 chunk，None 表示暂不输出。"""
+        self._usage = resp.usage
+        if self._filter is not None:
+            self._held = resp
+            resp = self._filter.feed(resp)  # type: ignore
+            if resp is None:
+                return None
+        if self._delivered is not None:
+            self._delivered.add(_get_text(self.result_format, resp))
+        return self._combine_usage(resp)
+
+    def finish(self) -> Optional[GenerationResponse]:
+        if self._filter is None:
+            return None
+        resp = self._filter.finish(self._held)
+        self.wasted_tokens += self._filter.echo_output_tokens
+        return self._combine_usage(resp) if resp is not None else None
+
+    def _combine_usage(self, resp: GenerationResponse) -> GenerationResponse:
+        if self._done_usage is not None and resp.usage is not None:
+            usage = dict(resp.usage)
+            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                if key in usage or key in self._done_usage:
+                    usage[key] = (usage.get(key) or 0) + self._done_usage.get(key, 0)
+            resp.usage = usage
+        return resp
+
+    def _end_attempt(self):
+        usage = dict(self._usage or {})
+        if self._done_usage is None:
+            self._done_usage = {}
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            self._done_usage[key] = self._done_usage.get(key, 0) + (usage.get(key) or 0)
+        if self._filter is not None:
+            self.wasted_tokens += self._filter.echo_output_tokens
+        self._usage = None
+
+    def fail(self, err: BaseException):
+        """不再续写：失败的请求付费的 token 都算浪费（续写请求的输入已在 on_resumed 中计算）。"""
+        self.error = err
+        usage = self._usage or {}
+        self.wasted_tokens += usage.get("output_tokens") or 0
+        if self.resumes == 0:
+            self.wasted_tokens += usage.get("input_tokens") or 0
+        if self._filter is not None:
+            self.wasted_tokens += self._filter.echo_output_tokens
+
+    def resume_kwargs(self) -> Dict[str, Any]:
+        """结束当前请求，返回续写请求的参数。"""
+        self._end_attempt()
+        self.attempts += 1
+        self.resumes += 1
+        delivered = self._delivered.getvalue() if self._delivered is not None else ""
+        kwargs = dict(self.kwargs)
+        messages = kwargs.get("messages")
+        prompt = kwargs.get("prompt")
+        continued = False
+        if messages or (prompt and not kwargs.get("history")):
+            if not messages:
+                messages = [{"role": "user", "content": prompt}]
+                kwargs["prompt"] = None
+            kwargs["messages"] = [*messages, {"role": "assistant", "content": delivered, "partial": True}]
+            continued = True
+        # 不能带上已输出内容（history 方式）时重新请求，丢弃重复输出的部分
+        self._filter = _ResumeFilter(delivered, self.result_format, self.incremental_output, continued)
+        self._held = None
+        return kwargs
+
+    def on_resumed(self, first: Optional[GenerationResponse]):
+        """续写请求的第一个 chunk 之前重复付费的输入。"""
+        if first is not None:
+            self.wasted_tokens += (first.usage or {}).get("input_tokens") or 0
+
+    def to_meta(self) -> Dict[str, Any]:
+        if self.attempts == 1 and self.error is None:
+            return {}
+        meta: Dict[str, Any] = {
+            "stream_attempts": self.attempts,
+            "stream_resumes": self.resumes,
+            "wasted_tokens": self.wasted_tokens,
+        }
+        if self.error is not None:
+            meta["stream_error"] = type(self.error).__name__
+        return meta
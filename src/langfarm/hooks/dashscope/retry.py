@@ -0,0 +1,256 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Collection, Deque, Dict, List, Optional
+
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    before_sleep_log,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_exponential,
+    wait_random,
+)
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+from langfarm.hooks.dashscope.exceptions import FailedGenerationException, FastFailGenerationException
+
+logger = logging.getLogger(__name__)
+
+# 这些状态码重试也不会成功
+NON_RETRYABLE_STATUS_CODES = (400, 401)
+
+
+def retry_after_seconds(response: Any) -> Optional[float]:
+    """从响应的 Retry-After 头解释服务端建议的等待秒数，支持秒数和 HTTP 日期两种格式。"""
+    headers = response.get("headers") if response is not None else None
+    if not headers:
+        return None
+    value = None
+    for key, val in headers.items():
+        if str(key).lower() == "retry-after":
+            value = val
+            break
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class wait_retry_after(wait_base):
+    """有 Retry-After 提示时按提示等待（不超过 max_wait），否则用 fallback 的退避时间。"""
+
+    def __init__(self, fallback: wait_base, max_wait: Optional[float] = None):
+        self.fallback = fallback
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        if retry_state.outcome is not None and retry_state.outcome.failed:
+            e = retry_state.outcome.exception()
+            # 只有 dashscope 的响应带 headers，其他异常的 response（如 requests.Response）不解释
+            hint = retry_after_seconds(e.response) if isinstance(e, FailedGenerationException) else None
+            if hint is not None:
+                return hint if self.max_wait is None else min(hint, self.max_wait)
+        return self.fallback(retry_state)
+
+
+class RetryPolicy:
+    """
+    可复用的重试策略，创建一次后在多次调用间共享。
+
+    tenacity 的 Retrying 对象在构造时创建好，每次调用只做一次轻量的 copy()，
+    重试统计（statistics）保存在 copy 上，互不干扰。
+
+    FailedGenerationException（如 RetryGenerationException）由响应的 status_code 决定是否可重试：
+    retryable_status_codes 为 None 时，除 400/401 以外的都重试。
+    其他异常中，带 HTTP 状态码的（如 requests.HTTPError）同样按状态码判断，网络错误（OSError）重试。
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 10,
+        min_seconds: float = 1,
+        max_seconds: float = 4,
+        multiplier: float = 1,
+        jitter: float = 0,
+        deadline: Optional[float] = None,
+        retryable_status_codes: Optional[Collection[int]] = None,
+        honor_retry_after: bool = True,
+        max_retry_after: Optional[float] = 60,
+    ):
+        """
+        :param max_retries: 最多执行次数（包含第一次）
+        :param min_seconds: 指数退避的最小等待秒数
+        :param max_seconds: 指数退避的最大等待秒数
+        :param multiplier: 指数退避的乘数
+        :param jitter: 每次等待额外增加 [0, jitter] 秒的随机时间
+        :param deadline: 总时长（秒），下一次等待会超出时不再重试
+        :param retryable_status_codes: 可重试的状态码，None 表示除 400/401 以外的都可重试
+        :param honor_retry_after: 响应有 Retry-After 头时按服务端提示等待
+        :param max_retry_after: Retry-After 等待的上限（秒）
+        """
+        self.max_retries = max_retries
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retryable_status_codes = frozenset(retryable_status_codes) if retryable_status_codes else None
+        self.honor_retry_after = honor_retry_after
+        self.max_retry_after = max_retry_after
+
+        self._retrying = Retrying(**self._retrying_kwargs())
+        self._async_retrying = AsyncRetrying(**self._retrying_kwargs())
+
+    def _stop(self, deadline: Optional[float] = None) -> stop_base:
+        stop = stop_after_attempt(self.max_retries)
+        deadline = self.effective_deadline(deadline)
+        if deadline is not None:
+            # 下一次等待之后会超出总时长就不再重试
+            stop = stop | stop_before_delay(deadline)
+        return stop
+
+    def _retrying_kwargs(self) -> dict:
+        stop = self._stop()
+        wait = wait_exponential(multiplier=self.multiplier, min=self.min_seconds, max=self.max_seconds)
+        if self.honor_retry_after:
+            wait = wait_retry_after(wait, self.max_retry_after)
+        if self.jitter > 0:
+            wait = wait + wait_random(0, self.jitter)
+        return dict(
+            reraise=True,
+            stop=stop,
+            wait=wait,
+            retry=retry_if_exception(self.should_retry),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+        )
+
+    def is_retryable(self, status_code: int) -> bool:
+        if self.retryable_status_codes is None:
+            return status_code not in NON_RETRYABLE_STATUS_CODES
+        return status_code in self.retryable_status_codes
+
+    def should_retry(self, e: BaseException) -> bool:
+        if isinstance(e, FastFailGenerationException):
+            return False
+        if isinstance(e, FailedGenerationException):
+            if e.response is None:
+                return False
+            return self.is_retryable(e.response["status_code"])
+        # 其他异常的 response 不是 dashscope 的响应，只取 status_code 属性
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+        if isinstance(status_code, int):
+            return self.is_retryable(status_code)
+        # 网络错误（requests 的异常是 OSError 的子类）
+        return isinstance(e, OSError)
+
+    def effective_deadline(self, deadline: Optional[float] = None) -> Optional[float]:
+        """本次调用的总时长：取调用参数与策略 deadline 中较小的。"""
+        if deadline is None:
+            return self.deadline
+        if self.deadline is None:
+            return deadline
+        return min(deadline, self.deadline)
+
+    def retrying(self, deadline: Optional[float] = None) -> Retrying:
+        """每次调用取一个 copy，statistics 属于本次调用。deadline 为本次调用的总时长。"""
+        if deadline is None:
+            return self._retrying.copy()
+        return self._retrying.copy(stop=self._stop(deadline))
+
+    def async_retrying(self, deadline: Optional[float] = None) -> AsyncRetrying:
+        if deadline is None:
+            return self._async_retrying.copy()
+        return self._async_retrying.copy(stop=self._stop(deadline))
+
+    def __repr__(self) -> str:
+        return (
+            f"RetryPolicy(max_retries={self.max_retries}, min_seconds={self.min_seconds}, "
+            f"max_seconds={self.max_seconds}, jitter={self.jitter}, deadline={self.deadline})"
+        )
+
+
+class RetryBudget:
+    """
+    全局重试预算，防止服务端故障时重试把流量放大数倍。
+
+    最近 window 秒内的重试次数不能超过 成功请求数 * ratio + min_retries_per_second * window，
+    超出后不再重试（快速失败）。只按成功的请求补充预算，服务端完全不可用时只剩保底的重试。
+    一个实例可在所有调用（多线程、异步）间共享。
+    """
+
+    def __init__(self, ratio: float = 0.1, window: float = 10, min_retries_per_second: float = 1):
+        """
+        :param ratio: 重试数占成功请求数的最大比例
+        :param window: 统计窗口（秒），按秒分桶
+        :param min_retries_per_second: 请求很少时保底允许的每秒重试数
+        """
+        self.ratio = ratio
+        self.window = window
+        self.min_retries_per_second = min_retries_per_second
+        # [秒, 成功请求数, 重试数]
+        self._buckets: Deque[List[int]] = deque()
+        self._successes = 0
+        self._retries = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self) -> List[int]:
+        now = int(time.monotonic())
+        buckets = self._buckets
+        while buckets and buckets[0][0] <= now - self.window:
+            _, successes, retries = buckets.popleft()
+            self._successes -= successes
+            self._retries -= retries
+        if not buckets or buckets[-1][0] != now:
+            buckets.append([now, 0, 0])
+        return buckets[-1]
+
+    def record_success(self):
+        """每次成功的调用记录一次。"""
+        with self._lock:
+            self._bucket()[1] += 1
+            self._successes += 1
+
+    def try_retry(self) -> bool:
+        """预算内时记录一次重试并返回 True，否则返回 False。"""
+        with self._lock:
+            bucket = self._bucket()
+            allowed = self._successes * self.ratio + self.min_retries_per_second * self.window
+            if self._retries + 1 > allowed:
+                return False
+            bucket[2] += 1
+            self._retries += 1
+            return True
+
+    def stat(self) -> dict:
+        with self._lock:
+            self._bucket()
+            return {"successes": self._successes, "retries": self._retries}
+
+
+_default_policies: Dict[int, RetryPolicy] = {}
+
+
+def default_retry_policy(max_retries: int) -> RetryPolicy:
+    """按 max_retries 缓存的默认策略（与原来的 min 1 秒、max 4 秒的指数退避相同）。"""
+    policy = _default_policies.get(max_retries)
+    if policy is None:
+        policy = _default_policies.setdefault(max_retries, RetryPolicy(max_retries))
+    return policy
@@ -0,0 +1,100 @@
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langfarm.hooks.misc import percentile
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class PhaseTimer:
+    """
+    一次调用各阶段的累计耗时，附加到 observation metadata 的 timing 中（毫秒）：
+
+    - do_call：请求（包括重试、对冲），流式为拿到第一个 chunk 的时间
+    - check：check_response
+    - retry_sleep：重试等待
+    - output：response_to_output
+    - observe：更新 observation
+    - total：从调用开始到最后一次更新 observation
+
+    流式另外记录 ttft、每个 chunk 等待时间的分位数（不包含调用方处理 chunk 的时间）、consumer（调用方处理 chunk 的总时间）。
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        # 附加到 metadata 的 dict，to_meta 原地更新
+        self.meta: Dict[str, Any] = {}
+        self.first_at: Optional[float] = None
+        self.chunk_cnt = 0
+        self.consumer = 0.0
+        self._waits: List[float] = []
+        self._received_at = 0.0
+        self._resumed_at = 0.0
+
+    @classmethod
+    def sample(cls, rate: float) -> Optional["PhaseTimer"]:
+        """按 rate（0~1）采样，没有采中返回 None。"""
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return cls()
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def wrap(self, phase: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """返回计时的 fn，耗时累计到 phase。"""
+
+        def _timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+
+        return _timed
+
+    def awrap(self, phase: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """wrap 的异步版本，fn 为 async 函数。"""
+
+        async def _timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+
+        return _timed
+
+    def chunk_received(self):
+        now = time.perf_counter()
+        if self.first_at is None:
+            self.first_at = now
+        else:
+            self._waits.append(now - self._resumed_at)
+        self._received_at = now
+        self.chunk_cnt += 1
+
+    def chunk_consumed(self):
+        """调用方取下一个 chunk 时调用。"""
+        now = time.perf_counter()
+        self.consumer += now - self._received_at
+        self._resumed_at = now
+
+    def to_meta(self) -> Dict[str, Any]:
+        meta = self.meta
+        for phase, seconds in self.phases.items():
+            meta[f"{phase}_ms"] = _ms(seconds)
+        if self.first_at is not None:
+            waits = sorted(self._waits)
+            meta["ttft_ms"] = _ms(self.first_at - self.start)
+            meta["chunk_cnt"] = self.chunk_cnt
+            meta["chunk_wait_p50_ms"] = _ms(percentile(waits, 0.5))
+            meta["chunk_wait_p95_ms"] = _ms(percentile(waits, 0.95))
+            meta["chunk_wait_max_ms"] = _ms(waits[-1] if waits else 0.0)
+            meta["consumer_ms"] = _ms(self.consumer)
+        meta["total_ms"] = _ms(time.perf_counter() - self.start)
+        return meta
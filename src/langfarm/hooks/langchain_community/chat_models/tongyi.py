@@ -0,0 +1,94 @@
+import functools
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langfarm.hooks.registry import auto_install
+from langfarm.hooks.langchain_community.retry import (
+    acall_with_retry,
+    astream_in_executor,
+    call_with_retry,
+    stream_with_retry,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import langchain_community  # noqa: F401
+except ImportError:
+    raise ModuleNotFoundError(
+        "Please install langchain community to use this feature: 'pip install langchain-community'"
+    )
+
+try:
+    from langchain_community.chat_models import tongyi as chat_tongyi
+except ImportError:
+    chat_tongyi = None
+    raise ModuleNotFoundError(
+        "Please install langchain community to use this feature: 'pip install langchain-community'"
+    )
+
+
+def completion_with_retry(self: chat_tongyi.ChatTongyi, **kwargs: Any) -> Any:  # type: ignore
+    """Use tenacity to retry the completion call."""
+    return call_with_retry(
+        chat_tongyi._create_retry_decorator(self),  # type: ignore
+        self.max_retries,
+        lambda **_kwargs: chat_tongyi.check_response(self.client.call(**_kwargs)),  # type: ignore
+        **kwargs,
+    )
+
+
+def stream_completion_with_retry(self: chat_tongyi.ChatTongyi, **kwargs: Any) -> Iterator[Any]:  # type: ignore
+    """
+    重试到拿到第一个 chunk 为止，记录重试信息、completion_start_time，流结束时记录 chunk 间隔分位数和输出速度。
+    chunk 的处理（非增量输出时计算增量、检查 status_code）沿用原来的实现。
+    """
+    return stream_with_retry(
+        chat_tongyi._create_retry_decorator(self),  # type: ignore
+        self.max_retries,
+        functools.partial(tongyi_stream_completion_with_retry, self),
+        **kwargs,
+    )
+
+
+async def astream_completion_with_retry(self: chat_tongyi.ChatTongyi, **kwargs: Any) -> AsyncIterator[Any]:  # type: ignore
+    """stream_completion_with_retry 的异步版本，在线程池中读取 chunk（保留 langfuse 上下文）。"""
+    async for chunk in astream_in_executor(functools.partial(self.stream_completion_with_retry, **kwargs)):
+        yield chunk
+
+
+async def _agenerate(
+    self: chat_tongyi.ChatTongyi,  # type: ignore
+    messages: List[Any],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[Any] = None,
+    **kwargs: Any,
+) -> Any:
+    """非流式时使用 acall_with_retry，代替在默认线程池中执行 completion_with_retry（会丢失 langfuse 上下文）。"""
+    if self.streaming:
+        return await chat_tongyi_agenerate(self, messages, stop, run_manager, **kwargs)
+
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    params: Dict[str, Any] = self._invocation_params(messages=messages, stop=stop, **kwargs)
+    resp = await acall_with_retry(
+        chat_tongyi._create_retry_decorator(self),  # type: ignore
+        self.max_retries,
+        lambda **_kwargs: chat_tongyi.check_response(self.client.call(**_kwargs)),  # type: ignore
+        **params,
+    )
+    generations = [ChatGeneration(**self._chat_generation_from_qwen_resp(resp))]
+    return ChatResult(generations=generations, llm_output={"model_name": self.model_name})
+
+
+# 原来的实现，由 hook 调用
+tongyi_completion_with_retry = chat_tongyi.ChatTongyi.completion_with_retry
+tongyi_stream_completion_with_retry = chat_tongyi.ChatTongyi.stream_completion_with_retry
+tongyi_astream_completion_with_retry = chat_tongyi.ChatTongyi.astream_completion_with_retry
+chat_tongyi_agenerate = chat_tongyi.ChatTongyi._agenerate
+
+auto_install("chat_tongyi")
+
+
+class ChatTongyi(chat_tongyi.ChatTongyi):
+    pass
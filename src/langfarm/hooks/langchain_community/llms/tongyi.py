@@ -1,9 +1,14 @@
+import functools
 import logging
-from typing import Any
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-from langfuse.decorators import langfuse_context
-
-from langfarm.hooks.misc import retry_stat_to_meta
+from langfarm.hooks.registry import auto_install
+from langfarm.hooks.langchain_community.retry import (
+    acall_with_retry,
+    astream_in_executor,
+    call_with_retry,
+    stream_with_retry,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,46 +30,71 @@ except ImportError:
 
 def generate_with_retry(llm: tongyi.Tongyi, **kwargs: Any) -> Any:  # type: ignore
     """Use tenacity to retry the completion call."""
-    retry_decorator = tongyi._create_retry_decorator(llm)  # type: ignore
+    return call_with_retry(
+        tongyi._create_retry_decorator(llm),  # type: ignore
+        llm.max_retries,
+        lambda **_kwargs: tongyi.check_response(llm.client.call(**_kwargs)),  # type: ignore
+        **kwargs,
+    )
 
-    @retry_decorator
-    def _generate_with_retry(**_kwargs: Any) -> Any:
-        resp = llm.client.call(**_kwargs)
-        return tongyi.check_response(resp)  # type: ignore
 
-    _err = None
-    response = None
-    try:
-        response = _generate_with_retry(**kwargs)
-        level = "WARNING"
-    except Exception as err:
-        _err = err
-        level = "ERROR"
+def stream_generate_with_retry(llm: tongyi.Tongyi, **kwargs: Any) -> Iterator[Any]:  # type: ignore
+    """
+    重试到拿到第一个 chunk 为止（原来的实现对生成器加 retry，实际不会重试），
+    记录重试信息、第一个 chunk 的时间（completion_start_time），流结束时记录 chunk 间隔分位数和输出速度。
+    """
 
-    # 记录重试信息
-    retry_stat = _generate_with_retry.statistics
-    retry_meta = retry_stat_to_meta(llm.max_retries, retry_stat)
-    if retry_meta:
-        langfuse_context.update_current_observation(level=level, metadata=retry_meta)
+    def _open_stream(**_kwargs: Any) -> Iterator[Any]:
+        for resp in llm.client.call(**_kwargs):
+            yield tongyi.check_response(resp)  # type: ignore
 
-    if _err:
-        raise _err
-    else:
-        return response
+    return stream_with_retry(tongyi._create_retry_decorator(llm), llm.max_retries, _open_stream, **kwargs)  # type: ignore
 
 
-def _hook_generate_with_retry():
-    return generate_with_retry
+async def agenerate_with_retry(llm: tongyi.Tongyi, **kwargs: Any) -> Any:  # type: ignore
+    """generate_with_retry 的异步版本：请求在线程池中执行（保留 langfuse 上下文），重试等待不阻塞 event loop。"""
+    return await acall_with_retry(
+        tongyi._create_retry_decorator(llm),  # type: ignore
+        llm.max_retries,
+        lambda **_kwargs: tongyi.check_response(llm.client.call(**_kwargs)),  # type: ignore
+        **kwargs,
+    )
 
 
-hook_func_name = "langchain_community.llms.tongyi.generate_with_retry"
+async def astream_generate_with_retry(llm: tongyi.Tongyi, **kwargs: Any) -> AsyncIterator[Any]:  # type: ignore
+    """stream_generate_with_retry 的异步版本，在线程池中读取 chunk（保留 langfuse 上下文）。"""
+    async for chunk in astream_in_executor(functools.partial(stream_generate_with_retry, llm, **kwargs)):
+        yield chunk
 
-try:
-    tongyi_generate_with_retry = tongyi.generate_with_retry
-    tongyi.generate_with_retry = _hook_generate_with_retry()
-    logger.info("hook %s success! can report retry stat message", hook_func_name)
-except Exception as e:
-    logger.warning("hook %s fail! %s", hook_func_name, e, exc_info=True)
+
+async def _agenerate(
+    self: tongyi.Tongyi,  # type: ignore
+    prompts: List[str],
+    stop: Optional[List[str]] = None,
+    run_manager: Optional[Any] = None,
+    **kwargs: Any,
+) -> Any:
+    """非流式时使用 agenerate_with_retry，代替在默认线程池中执行 generate_with_retry（会丢失 langfuse 上下文）。"""
+    if self.streaming:
+        return await tongyi_agenerate(self, prompts, stop, run_manager, **kwargs)
+
+    from langchain_core.outputs import Generation, LLMResult
+
+    params: Dict[str, Any] = self._invocation_params(stop=stop, **kwargs)
+    generations = []
+    for prompt in prompts:
+        completion = await agenerate_with_retry(self, prompt=prompt, **params)
+        generations.append([Generation(**self._generation_from_qwen_resp(completion))])
+    return LLMResult(generations=generations, llm_output={"model_name": self.model_name})
+
+
+# 原来的实现，由 hook 调用
+tongyi_generate_with_retry = tongyi.generate_with_retry
+tongyi_stream_generate_with_retry = tongyi.stream_generate_with_retry
+tongyi_astream_generate_with_retry = tongyi.astream_generate_with_retry
+tongyi_agenerate = tongyi.Tongyi._agenerate
+
+auto_install("tongyi")
 
 
 class Tongyi(tongyi.Tongyi):
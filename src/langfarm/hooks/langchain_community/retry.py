@@ -0,0 +1,242 @@
+"""
+通义模型（llms.Tongyi、chat_models.ChatTongyi）hook 共用的重试、流式统计。
+
+- 重试信息（run_cnt、idle_second 等）写入当前 observation 的 metadata，有重试时 level 为 WARNING，最终失败为 ERROR。
+- 流式请求重试到拿到第一个 chunk 为止，记录 completion_start_time，流结束时记录 chunk 间隔分位数和输出速度。
+- 异步版本在线程池中执行请求（保留 langfuse 上下文），重试等待不阻塞 event loop。
+- 启用指标（langfarm.hooks.metrics.enable_metrics）时记录每次请求、整个调用的延迟和状态码、重试等待时间、流式统计。
+"""
+
+import asyncio
+import functools
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from langfuse.decorators import langfuse_context
+
+from langfarm.hooks.langfuse.context import wrap_context
+from langfarm.hooks.metrics import GenerationMetrics, get_metrics, status_label
+from langfarm.hooks.misc import StreamStats, retry_stat_to_meta
+
+
+def up_retry_observation(max_retries: int, retry_stat: dict, err: Optional[BaseException]) -> Optional[dict]:
+    retry_meta = retry_stat_to_meta(max_retries, retry_stat)
+    if retry_meta:
+        level = "ERROR" if err else "WARNING"
+        langfuse_context.update_current_observation(level=level, metadata=retry_meta)
+    return retry_meta
+
+
+def _timed(metrics: Optional[GenerationMetrics], model: str, call: Callable[..., Any]) -> Callable[..., Any]:
+    """记录每次请求（包括重试）的状态码和耗时。"""
+    if metrics is None:
+        return call
+
+    def _call(**kwargs: Any) -> Any:
+        start = time.monotonic()
+        try:
+            response = call(**kwargs)
+        except Exception as err:
+            metrics.record_attempt(model, status_label(err=err), time.monotonic() - start)
+            raise
+        # 流式为 (responses, 第一个 chunk)
+        first = response[1] if isinstance(response, tuple) else response
+        metrics.record_attempt(model, status_label(first), time.monotonic() - start)
+        return response
+
+    return _call
+
+
+def _record_request(
+    metrics: Optional[GenerationMetrics],
+    model: str,
+    start: float,
+    retry_stat: dict,
+    response: Any = None,
+    err: Optional[BaseException] = None,
+):
+    if metrics is None:
+        return
+    usage = response.get("usage") if err is None and isinstance(response, dict) else None
+    metrics.record_request(
+        model, status_label(response, err), time.monotonic() - start, usage, retry_stat.get("idle_for", 0)
+    )
+
+
+def call_with_retry(retry_decorator: Callable, max_retries: int, call: Callable[..., Any], **kwargs: Any) -> Any:
+    metrics = get_metrics()
+    model = str(kwargs.get("model") or "")
+    start = time.monotonic()
+    call = _timed(metrics, model, call)
+
+    @retry_decorator
+    def _call_with_retry(**_kwargs: Any) -> Any:
+        return call(**_kwargs)
+
+    _err = None
+    response = None
+    try:
+        response = _call_with_retry(**kwargs)
+    except Exception as err:
+        _err = err
+
+    # 记录重试信息
+    up_retry_observation(max_retries, _call_with_retry.statistics, _err)
+    _record_request(metrics, model, start, _call_with_retry.statistics, response, _err)
+
+    if _err:
+        raise _err
+    else:
+        return response
+
+
+async def acall_with_retry(retry_decorator: Callable, max_retries: int, call: Callable[..., Any], **kwargs: Any) -> Any:
+    """call_with_retry 的异步版本，call 为同步函数，在线程池中执行。"""
+    metrics = get_metrics()
+    model = str(kwargs.get("model") or "")
+    start = time.monotonic()
+    call = _timed(metrics, model, call)
+
+    @retry_decorator
+    async def _acall_with_retry(**_kwargs: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, wrap_context(functools.partial(call, **_kwargs)))
+
+    _err = None
+    response = None
+    try:
+        response = await _acall_with_retry(**kwargs)
+    except Exception as err:
+        _err = err
+
+    up_retry_observation(max_retries, _acall_with_retry.statistics, _err)
+    _record_request(metrics, model, start, _acall_with_retry.statistics, response, _err)
+
+    if _err:
+        raise _err
+    else:
+        return response
+
+
+def stream_with_retry(
+    retry_decorator: Callable, max_retries: int, open_stream: Callable[..., Iterator[Any]], **kwargs: Any
+) -> Iterator[Any]:
+    """
+    open_stream 返回（已检查 status_code 的）响应迭代器。
+    重试到拿到第一个 chunk 为止（对生成器加 retry 实际不会重试）。
+    """
+
+    metrics = get_metrics()
+    model = str(kwargs.get("model") or "")
+
+    def _open(**_kwargs: Any) -> tuple:
+        responses = iter(open_stream(**_kwargs))
+        return responses, next(responses, None)
+
+    _timed_open = _timed(metrics, model, _open)
+
+    @retry_decorator
+    def _first_chunk(**_kwargs: Any) -> tuple:
+        return _timed_open(**_kwargs)
+
+    stats = StreamStats()
+    _err = None
+    responses: Iterator[Any] = iter(())
+    first = None
+    try:
+        responses, first = _first_chunk(**kwargs)
+        if first is not None:
+            stats.add_chunk()
+            langfuse_context.update_current_observation(completion_start_time=datetime.now())
+    except Exception as err:
+        _err = err
+
+    retry_meta = up_retry_observation(max_retries, _first_chunk.statistics, _err)
+
+    if _err:
+        _record_request(metrics, model, stats.start, _first_chunk.statistics, err=_err)
+        raise _err
+    recorder = None
+    if metrics is not None:
+        recorder = functools.partial(_record_stream, metrics, model, stats, _first_chunk.statistics)
+    return _chain_chunks(first, responses, stats, retry_meta, recorder)
+
+
+def _carry_usage(resp: Any, usage: Dict[str, int]):
+    """
+    usage 是累计值，但不一定每个 chunk 都有（如 stream_options 只在最后返回，或中间的 chunk 为 0），
+    取到目前为止每个字段的最大值写回 chunk，最后一个 chunk 的 usage 就是整个请求的 usage。
+    """
+    chunk_usage = resp.get("usage") or {}
+    for key, value in chunk_usage.items():
+        if isinstance(value, int) and value >= usage.get(key, 0):
+            usage[key] = value
+    if usage:
+        resp["usage"] = {**chunk_usage, **usage}
+
+
+def _record_stream(
+    metrics: GenerationMetrics,
+    model: str,
+    stats: StreamStats,
+    retry_stat: dict,
+    usage: Dict[str, int],
+    err: Optional[BaseException] = None,
+):
+    """流结束（或中途失败）时记录流式统计和整个调用。"""
+    if stats.first_at is not None:
+        for gap in stats.gaps:
+            metrics.inter_chunk.observe(gap, model)
+        duration = stats.last_at - stats.first_at  # type: ignore
+        metrics.record_stream(model, stats.ttft, stats.chunk_cnt, duration, usage.get("output_tokens"))  # type: ignore
+    metrics.record_request(
+        model,
+        status_label({"status_code": 200}, err),
+        time.monotonic() - stats.start,
+        usage,
+        retry_stat.get("idle_for", 0),
+    )
+
+
+def _chain_chunks(
+    first: Any,
+    responses: Iterator[Any],
+    stats: StreamStats,
+    retry_meta: Optional[dict],
+    recorder: Optional[Callable[..., None]] = None,
+) -> Iterator[Any]:
+    usage: Dict[str, int] = {}
+    if first is None:
+        if recorder is not None:
+            recorder(usage)
+        return
+    _carry_usage(first, usage)
+    yield first
+    try:
+        for resp in responses:
+            stats.add_chunk()
+            _carry_usage(resp, usage)
+            yield resp
+    except Exception as err:
+        if recorder is not None:
+            recorder(usage, err)
+        raise
+    if recorder is not None:
+        recorder(usage)
+
+    # 流结束，追加延迟统计（metadata 会整体覆盖，带上重试信息）
+    langfuse_context.update_current_observation(
+        metadata={**(retry_meta or {}), **stats.to_meta(usage.get("output_tokens"))}
+    )
+
+
+async def astream_in_executor(stream: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+    """在线程池中执行 stream()、读取 chunk（保留 langfuse 上下文）。"""
+    loop = asyncio.get_running_loop()
+    responses = await loop.run_in_executor(None, wrap_context(stream))
+    _next = wrap_context(functools.partial(next, responses, None))
+    while True:
+        chunk = await loop.run_in_executor(None, _next)
+        if chunk is None:
+            break
+        yield chunk
@@ -1,10 +1,14 @@
 import logging
-from typing import Optional, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
 from uuid import UUID
 
 from langfuse.callback import langchain as langfuse_callback
 from langfuse.callback.langchain import LangchainCallbackHandler
 
+from langfarm.hooks.registry import auto_install
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -18,21 +22,48 @@ except ImportError:
     raise ModuleNotFoundError("Please install langchain core to use this feature: 'pip install langchain-core'")
 
 
-def _parse_usage(response: LLMResult):  # type: ignore
+def _add_usage(total: Dict[str, int], usage: Optional[dict]):
+    if not usage:
+        return
+    for key in ("input", "output", "total"):
+        total[key] = total.get(key, 0) + (usage.get(key) or 0)
+
+
+def _parse_usages(response: LLMResult) -> Tuple[Optional[dict], List[Optional[dict]]]:  # type: ignore
+    """一次遍历取得所有 prompt 的 usage 合计，以及每个 prompt 的 usage（没有时为 None）。"""
     from langfuse.callback.langchain import _parse_usage_model
 
     llm_usage = None
+    prompt_usages: List[Optional[dict]] = []
     # tongyi usage
-    # generations[0][0].generation_info[token_usage]
-    if hasattr(response, "generations"):
-        for generation in response.generations:
-            for generation_chunk in generation:
-                if generation_chunk.generation_info and ("token_usage" in generation_chunk.generation_info):
-                    _usage = _parse_usage_model(generation_chunk.generation_info["token_usage"])
-                    # 只上报3个字段
-                    llm_usage = {"input": _usage["input"], "output": _usage["output"], "total": _usage["total"]}  # type: ignore
-                    break
-    return llm_usage
+    # generations[i][0].generation_info[token_usage]，批量调用时每个 prompt 一个 generations[i]
+    # ChatTongyi 流式调用时 generation_info 取自最后一个 chunk；没有 token_usage 时取 message.usage_metadata
+    for generation in getattr(response, "generations", None) or []:
+        prompt_usage = None
+        for generation_chunk in generation:
+            if generation_chunk.generation_info and ("token_usage" in generation_chunk.generation_info):
+                _usage = _parse_usage_model(generation_chunk.generation_info["token_usage"])
+                # 只上报3个字段
+                prompt_usage = {"input": _usage["input"], "output": _usage["output"], "total": _usage["total"]}  # type: ignore
+                break
+            usage_metadata = getattr(getattr(generation_chunk, "message", None), "usage_metadata", None)
+            if usage_metadata:
+                prompt_usage = {
+                    "input": usage_metadata.get("input_tokens", 0),
+                    "output": usage_metadata.get("output_tokens", 0),
+                    "total": usage_metadata.get("total_tokens", 0),
+                }
+                break
+        prompt_usages.append(prompt_usage)
+        if prompt_usage is not None:
+            if llm_usage is None:
+                llm_usage = {"input": 0, "output": 0, "total": 0}
+            _add_usage(llm_usage, prompt_usage)
+    return llm_usage, prompt_usages
+
+
+def _parse_usage(response: LLMResult):  # type: ignore
+    return _parse_usages(response)[0]
 
 
 def _hook_parse_usage(func):
@@ -46,30 +77,81 @@ def _hook_parse_usage(func):
     return wrapper
 
 
-hook_func_name = "langfuse.callback.langchain._parse_usage"
+# 原来的实现，hook 找不到 token_usage 时调用
+langfuse_parse_usage = langfuse_callback._parse_usage
+hook_parse_usage = _hook_parse_usage(langfuse_parse_usage)
 
-try:
-    langfuse_parse_usage = langfuse_callback._parse_usage
-    langfuse_callback._parse_usage = _hook_parse_usage(langfuse_parse_usage)
-    logger.info("hook %s success! can parse 'token_usage'", hook_func_name)
-except Exception as e:
-    logger.warning("hook %s fail! %s", hook_func_name, e, exc_info=True)
+auto_install("langfuse_callback")
 
 
 class CompatibleTongyiCallbackHandler(LangchainCallbackHandler):
+    """
+    可在并发的 run（如 llm.batch()、abatch()）间共享的 CallbackHandler。
+
+    usage 按 run_id 保存（记录 parent_run_id），最多保留 max_tracked_runs 个（LRU 淘汰），
+    同时累计整个 handler 的总用量。
+    """
+
+    # 按 run_id 保存的 usage 最多保留多少个
+    max_tracked_runs: int = 1024
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # 最后一次的 usage，兼容原来的 get_usage()
         self.usage = None
-
-    def get_usage(self):
-        return self.usage
-
-    def parse_usage(self, response: LLMResult):
-        usage = _parse_usage(response)
+        # run_id -> (parent_run_id, usage, 每个 prompt 的 usage)
+        self._run_usages: "OrderedDict[UUID, tuple[Optional[UUID], Optional[dict], List[Optional[dict]]]]" = (
+            OrderedDict()
+        )
+        self._total_usage: Dict[str, int] = {"input": 0, "output": 0, "total": 0}
+        self._run_cnt = 0
+        self._usage_lock = threading.Lock()
+
+    def get_usage(self, run_id: Optional[UUID] = None):
+        """不传 run_id 时返回最后一次的 usage。"""
+        if run_id is None:
+            return self.usage
+        with self._usage_lock:
+            record = self._run_usages.get(run_id)
+        return record[1] if record else None
+
+    def get_prompt_usages(self, run_id: UUID) -> Optional[List[Optional[dict]]]:
+        """批量调用时每个 prompt 的 usage。"""
+        with self._usage_lock:
+            record = self._run_usages.get(run_id)
+        return record[2] if record else None
+
+    def get_usage_by_parent(self, parent_run_id: UUID) -> Optional[Dict[str, int]]:
+        """parent_run_id 下所有 LLM run 的 usage 合计（如一次 batch 的所有 prompt）。"""
+        total: Dict[str, int] = {}
+        found = False
+        with self._usage_lock:
+            for parent, usage, _ in self._run_usages.values():
+                if parent == parent_run_id:
+                    found = True
+                    _add_usage(total, usage)
+        return total if found else None
+
+    def get_total_usage(self) -> Dict[str, int]:
+        """这个 handler 所有 run 的 usage 合计，runs 为 run 数。"""
+        with self._usage_lock:
+            return {**self._total_usage, "runs": self._run_cnt}
+
+    def parse_usage(self, response: LLMResult, run_id: Optional[UUID] = None, parent_run_id: Optional[UUID] = None):
+        usage, prompt_usages = _parse_usages(response)
         if usage is None:
             usage = langfuse_parse_usage(response)
-        logger.debug("hook.usage=%s", usage)
-        self.usage = usage
+        logger.debug("hook.usage=%s, run_id=%s", usage, run_id)
+        with self._usage_lock:
+            self.usage = usage
+            self._run_cnt += 1
+            _add_usage(self._total_usage, usage)
+            if run_id is not None:
+                self._run_usages[run_id] = (parent_run_id, usage, prompt_usages)
+                self._run_usages.move_to_end(run_id)
+                while len(self._run_usages) > self.max_tracked_runs:
+                    self._run_usages.popitem(last=False)
+        return usage
 
     def on_llm_end(
         self,
@@ -79,5 +161,5 @@ class CompatibleTongyiCallbackHandler(LangchainCallbackHandler):
         parent_run_id: Optional[UUID] = None,
         **kwargs: Any,
     ) -> Any:
-        self.parse_usage(response)
+        self.parse_usage(response, run_id, parent_run_id)
         return super().on_llm_end(response, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
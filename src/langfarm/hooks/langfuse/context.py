@@ -0,0 +1,55 @@
+"""
+在线程池 / 进程池里保持 langfuse 的 trace、observation 上下文。
+
+langfuse 的 observe 把当前 observation 栈放在 contextvars 里，线程池的工作线程不会继承调用方的 contextvars，
+所以工作线程里的 Generation.call、update_current_observation 找不到父 observation。
+
+- 线程：使用 ContextThreadPoolExecutor 代替 ThreadPoolExecutor，或用 wrap_context() 包装要在其他线程执行的函数。
+- 进程：contextvars 无法跨进程传递，在父进程取 parent_observation_kwargs()，作为参数传给子进程里最外层的
+  @observe 函数（langfuse 支持 langfuse_parent_trace_id、langfuse_parent_observation_id 参数），
+  子进程结束前调用 langfuse_context.flush()。
+"""
+
+import contextvars
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from langfuse.decorators import langfuse_context
+
+T = TypeVar("T")
+
+
+def wrap_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """捕获当前的 contextvars，返回的函数在（捕获时上下文的副本中）执行 fn，可在任意线程多次、并发调用。"""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """submit / map 的任务在提交时的 contextvars 中执行，observation 嵌套在提交方当前的 observation 下。"""
+
+    def submit(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> "Future[T]":
+        ctx = contextvars.copy_context()
+        return super().submit(ctx.run, fn, *args, **kwargs)
+
+
+def parent_observation_kwargs() -> Dict[str, str]:
+    """
+    当前 trace、observation 的 id，传给子进程中最外层的 @observe 函数，让子进程的 observation 挂在当前 observation 下。
+
+    不在 observe 上下文中时返回空 dict。
+    """
+    trace_id = langfuse_context.get_current_trace_id()
+    if trace_id is None:
+        return {}
+    kwargs = {"langfuse_parent_trace_id": trace_id}
+    observation_id = langfuse_context.get_current_observation_id()
+    if observation_id is not None and observation_id != trace_id:
+        kwargs["langfuse_parent_observation_id"] = observation_id
+    return kwargs
@@ -0,0 +1,433 @@
+"""
+进程内的延迟、吞吐量指标：客户端延迟、首 token 延迟（TTFT）、chunk 间隔、输出速度、重试等待时间、按状态码的请求数（如 429 比例）。
+
+    from langfarm.hooks.metrics import enable_metrics, start_http_server
+
+    metrics = enable_metrics()
+    start_http_server(9464)  # Prometheus 抓取 http://127.0.0.1:9464/metrics
+    print(metrics.registry.exposition())
+
+默认关闭，enable_metrics() 之后 dashscope 的 Generation、通义的 langchain hook 才会记录。
+只依赖标准库。记录时写入当前线程自己的分片（不加锁），采集时才合并所有线程的分片，所以每个 chunk 的记录开销可以忽略。
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 请求、首 token 延迟（秒）
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# chunk 间隔（秒）
+CHUNK_INTERVAL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# 输出速度（token/秒）
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricFamily:
+    """采集结果：一个指标的所有样本，samples 为 (样本名, 标签, 值)。"""
+
+    __slots__ = ("name", "type", "help", "samples")
+
+    def __init__(self, name: str, type: str, help: str, samples: List[Tuple[str, Dict[str, str], float]]):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.samples = samples
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (线程, 该线程的分片)，分片只由所属线程写入
+        self._shards: List[Tuple[threading.Thread, Dict[tuple, Any]]] = []
+        # 已结束的线程的分片合并到这里
+        self._retired: Dict[tuple, Any] = {}
+
+    def _shard(self) -> Dict[tuple, Any]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values: Dict[tuple, Any] = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _copy(self, cell: Any) -> Any:
+        return cell
+
+    def _merge(self, into: Dict[tuple, Any], values: Dict[tuple, Any]):
+        raise NotImplementedError
+
+    def values(self) -> Dict[tuple, Any]:
+        """合并所有线程的分片。"""
+        with self._lock:
+            merged: Dict[tuple, Any] = {}
+            self._merge(merged, self._retired)
+            alive = []
+            for thread, values in self._shards:
+                # dict() 在 GIL 下一次完成，拷贝时分片所属的线程可能在写入，最多读到稍旧的值
+                snapshot = {labels: self._copy(cell) for labels, cell in dict(values).items()}
+                self._merge(merged, snapshot)
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._merge(self._retired, snapshot)
+            self._shards = alive
+        return merged
+
+    def reset(self):
+        with self._lock:
+            for _, values in self._shards:
+                values.clear()
+            self._retired = {}
+
+    def _labels(self, labels: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, labels))
+
+    def collect(self) -> MetricFamily:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, value: float = 1):
+        """labels 按 labelnames 的顺序。"""
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + value
+
+    def _merge(self, into: Dict[tuple, Any], values: Dict[tuple, Any]):
+        for labels, value in values.items():
+            into[labels] = into.get(labels, 0) + value
+
+    def collect(self) -> MetricFamily:
+        samples = [(self.name, self._labels(labels), value) for labels, value in sorted(self.values().items())]
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        values = self._shard()
+        cell = values.get(labels)
+        if cell is None:
+            # 每个桶（不累计，最后一个为 +Inf）的计数，最后一项为 sum
+            cell = values[labels] = [0] * (len(self.buckets) + 2)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _copy(self, cell: Any) -> Any:
+        return list(cell)
+
+    def _merge(self, into: Dict[tuple, Any], values: Dict[tuple, Any]):
+        for labels, cell in values.items():
+            current = into.get(labels)
+            if current is None:
+                into[labels] = list(cell)
+            else:
+                for i, value in enumerate(cell):
+                    current[i] += value
+
+    def collect(self) -> MetricFamily:
+        samples = []
+        for labels, cell in sorted(self.values().items()):
+            label_dict = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), cell):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**label_dict, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", label_dict, cell[-1]))
+            samples.append((f"{self.name}_count", label_dict, cumulative))
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered with different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """同名的指标只创建一次。"""
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.collect() for metric in metrics]
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def exposition(self) -> str:
+        """Prometheus 文本格式（0.0.4）。"""
+        return exposition(self.collect())
+
+
+def exposition(families: List[MetricFamily]) -> str:
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for name, labels, value in family.samples:
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def status_label(response: Any = None, err: Optional[BaseException] = None) -> str:
+    """状态码标签：有响应时为状态码，异常带响应时为响应的状态码，否则为 error。"""
+    if err is not None:
+        response = getattr(err, "response", None)
+    if response is not None:
+        try:
+            return str(int(response["status_code"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return "error"
+
+
+class StreamRecorder:
+    """一次流式响应的记录：每个 chunk 调用 chunk()，结束时调用 finish()。"""
+
+    __slots__ = ("metrics", "model", "start", "first_at", "last_at", "chunk_cnt")
+
+    def __init__(self, metrics: "GenerationMetrics", model: str):
+        self.metrics = metrics
+        self.model = model
+        self.start = time.monotonic()
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.chunk_cnt = 0
+
+    def chunk(self):
+        now = time.monotonic()
+        if self.last_at is None:
+            self.first_at = now
+        else:
+            self.metrics.inter_chunk.observe(now - self.last_at, self.model)
+        self.last_at = now
+        self.chunk_cnt += 1
+
+    def finish(self, usage: Optional[dict]):
+        if self.first_at is None:
+            return
+        output_tokens = (usage or {}).get("output_tokens")
+        self.metrics.record_stream(
+            self.model,
+            self.first_at - self.start,
+            self.chunk_cnt,
+            self.last_at - self.first_at,
+            output_tokens,  # type: ignore
+        )
+
+
+class GenerationMetrics:
+    """langfarm 记录的指标，标签为 model、status（状态码或 error）。"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter(
+            "langfarm_requests_total", "Generation calls, including all retries", ("model", "status")
+        )
+        self.request_duration = r.histogram(
+            "langfarm_request_duration_seconds",
+            "Client-side latency of generation calls, including retries and stream consumption",
+            ("model", "status"),
+        )
+        self.attempts = r.counter("langfarm_attempts_total", "HTTP requests sent, one per retry", ("model", "status"))
+        self.attempt_duration = r.histogram(
+            "langfarm_attempt_duration_seconds",
+            "Latency of each HTTP request (first chunk for streams)",
+            ("model", "status"),
+        )
+        self.retry_sleep = r.counter(
+            "langfarm_retry_sleep_seconds_total", "Time spent waiting between retries", ("model",)
+        )
+        self.tokens = r.counter("langfarm_tokens_total", "Billed tokens", ("model", "type"))
+        self.ttft = r.histogram(
+            "langfarm_ttft_seconds", "Time to first chunk of streams, including retries", ("model",)
+        )
+        self.inter_chunk = r.histogram(
+            "langfarm_inter_chunk_seconds", "Interval between stream chunks", ("model",), CHUNK_INTERVAL_BUCKETS
+        )
+        self.tokens_per_second = r.histogram(
+            "langfarm_output_tokens_per_second",
+            "Output tokens per second of streams after the first chunk",
+            ("model",),
+            TOKENS_PER_SECOND_BUCKETS,
+        )
+        self.chunks = r.counter("langfarm_stream_chunks_total", "Stream chunks received", ("model",))
+
+    def record_attempt(self, model: str, status: str, seconds: float):
+        self.attempts.inc(model, status)
+        self.attempt_duration.observe(seconds, model, status)
+
+    def record_request(
+        self, model: str, status: str, seconds: float, usage: Optional[dict] = None, retry_sleep: float = 0
+    ):
+        self.requests.inc(model, status)
+        self.request_duration.observe(seconds, model, status)
+        if retry_sleep > 0:
+            self.retry_sleep.inc(model, value=retry_sleep)
+        if usage:
+            for key, token_type in (("input_tokens", "input"), ("output_tokens", "output")):
+                value = usage.get(key)
+                if value:
+                    self.tokens.inc(model, token_type, value=value)
+
+    def record_stream(
+        self, model: str, ttft: float, chunk_cnt: int, duration: float, output_tokens: Optional[int] = None
+    ):
+        """duration 为第一个到最后一个 chunk 的时间。"""
+        self.ttft.observe(ttft, model)
+        self.chunks.inc(model, value=chunk_cnt)
+        if output_tokens and duration > 0:
+            self.tokens_per_second.observe(output_tokens / duration, model)
+
+    def stream_recorder(self, model: str) -> StreamRecorder:
+        return StreamRecorder(self, model)
+
+
+_metrics: Optional[GenerationMetrics] = None
+
+
+def enable_metrics(metrics: Optional[GenerationMetrics] = None) -> GenerationMetrics:
+    """开始记录指标，返回使用的 GenerationMetrics（不传时创建新的）。"""
+    global _metrics
+    _metrics = metrics or _metrics or GenerationMetrics()
+    return _metrics
+
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> Optional[GenerationMetrics]:
+    """未启用时为 None。"""
+    return _metrics
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_GET(self):
+        payload = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_http_server(
+    port: int, addr: str = "127.0.0.1", registry: Optional[MetricsRegistry] = None
+) -> ThreadingHTTPServer:
+    """
+    在后台线程中提供 Prometheus 文本格式的指标（任意路径，如 /metrics）。
+    registry 为 None 时使用 enable_metrics() 的 registry。返回的 server 调用 shutdown() 停止。
+    """
+    if registry is None:
+        registry = enable_metrics().registry
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="langfarm-metrics", daemon=True).start()
+    return server
+
+
+class PeriodicExporter:
+    """每 interval 秒采集一次，交给 sink（如推送到 StatsD、写日志），stop() 时再导出一次。"""
+
+    def __init__(
+        self,
+        sink: Callable[[List[MetricFamily]], None],
+        interval: float = 60,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        self.sink = sink
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _registry(self) -> MetricsRegistry:
+        return self.registry if self.registry is not None else enable_metrics().registry
+
+    def export(self):
+        self.sink(self._registry().collect())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception:
+                # sink 的错误不影响之后的导出
+                logger.warning("export metrics fail!", exc_info=True)
+
+    def start(self) -> "PeriodicExporter":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="langfarm-metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
@@ -1,10 +1,150 @@
-from typing import Union
+import time
+from collections import deque
+from typing import Deque, List, Optional, Union
 
 
-def retry_stat_to_meta(max_retries: int, retry_stat: dict) -> Union[dict, None]:
+def retry_stat_to_meta(max_retries: int, retry_stat: dict, deadline: Optional[float] = None) -> Union[dict, None]:
     retry_meta = None
     if "attempt_number" in retry_stat:
         retry_cnt = retry_stat["attempt_number"]
         if retry_cnt > 1:
             retry_meta = {"run_cnt": retry_cnt, "idle_second": retry_stat["idle_for"], "max_retries": max_retries}
+            if deadline is not None:
+                # 总时长预算及已用时长
+                retry_meta["deadline_second"] = deadline
+                retry_meta["elapsed_second"] = round(retry_stat.get("delay_since_first_attempt", 0), 3)
     return retry_meta
+
+
+class OutputAccumulator:
+    """
+    流式输出累加器：增量输出时保存 chunk 列表，最后只 join 一次（线性时间）。
+
+    设置 max_chars 后只保留头部和尾部（各约一半），中间用标记代替，内存不会随输出长度无限增长。
+    非增量输出（每个 chunk 都是完整输出）时只保留最后一个 chunk。
+    """
+
+    def __init__(self, incremental: bool = True, max_chars: Optional[int] = None):
+        self.incremental = incremental
+        self.max_chars = max_chars
+        self.total_chars = 0
+        self._head: List[str] = []
+        self._head_len = 0
+        self._tail: Deque[str] = deque()
+        self._tail_len = 0
+        self._last = ""
+
+    def add(self, chunk: str):
+        if not chunk:
+            return
+        if not self.incremental:
+            self._last = chunk
+            self.total_chars = len(chunk)
+            return
+
+        self.total_chars += len(chunk)
+        if self.max_chars is None:
+            self._head.append(chunk)
+            return
+
+        head_budget = self.max_chars - self.max_chars // 2
+        if self._head_len < head_budget:
+            part = chunk[: head_budget - self._head_len]
+            self._head.append(part)
+            self._head_len += len(part)
+            chunk = chunk[len(part) :]
+            if not chunk:
+                return
+
+        # 尾部按整个 chunk 淘汰，最多多保留一个 chunk
+        tail_budget = self.max_chars // 2
+        self._tail.append(chunk)
+        self._tail_len += len(chunk)
+        while self._tail and self._tail_len - len(self._tail[0]) >= tail_budget:
+            self._tail_len -= len(self._tail.popleft())
+
+    @property
+    def truncated(self) -> bool:
+        return self.max_chars is not None and self.total_chars > self.max_chars
+
+    def getvalue(self) -> str:
+        if not self.incremental:
+            return self._truncate(self._last)
+        if not self.truncated:
+            return "".join(self._head) + "".join(self._tail)
+
+        tail_budget = self.max_chars // 2  # type: ignore
+        head = "".join(self._head)
+        tail = "".join(self._tail)[-tail_budget:] if tail_budget > 0 else ""
+        return self._join(head, tail)
+
+    def _truncate(self, text: str) -> str:
+        if self.max_chars is None:
+            return text
+        return truncate_middle(text, self.max_chars)
+
+    def _join(self, head: str, tail: str) -> str:
+        return _join_truncated(head, tail, self.total_chars - len(head) - len(tail))
+
+
+def _join_truncated(head: str, tail: str, omitted: int) -> str:
+    return f"{head}...[truncated {omitted} chars]...{tail}"
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """超过 max_chars 时保留头部和尾部（各约一半），中间用标记代替。"""
+    if len(text) <= max_chars:
+        return text
+    tail_budget = max_chars // 2
+    head = text[: max_chars - tail_budget]
+    tail = text[-tail_budget:] if tail_budget > 0 else ""
+    return _join_truncated(head, tail, len(text) - len(head) - len(tail))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """已排序数据的分位数（最近秩），q 取 0~1。"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class StreamStats:
+    """
+    流式响应的延迟统计：首个 chunk 时间（从请求开始计算，包含重试）、chunk 间隔的分位数、输出速度。
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.monotonic() if start is None else start
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.chunk_cnt = 0
+        self.gaps: List[float] = []
+
+    def add_chunk(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if self.first_at is None:
+            self.first_at = now
+        else:
+            self.gaps.append(now - self.last_at)  # type: ignore
+        self.last_at = now
+        self.chunk_cnt += 1
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return None if self.first_at is None else self.first_at - self.start
+
+    def to_meta(self, output_tokens: Optional[int] = None) -> dict:
+        if self.first_at is None:
+            return {"chunk_cnt": 0}
+        gaps = sorted(self.gaps)
+        meta = {
+            "ttft_second": round(self.ttft, 3),  # type: ignore
+            "chunk_cnt": self.chunk_cnt,
+            "inter_chunk_p50_second": round(percentile(gaps, 0.5), 4),
+            "inter_chunk_p95_second": round(percentile(gaps, 0.95), 4),
+            "inter_chunk_max_second": round(gaps[-1] if gaps else 0.0, 4),
+        }
+        duration = self.last_at - self.first_at  # type: ignore
+        if output_tokens and duration > 0:
+            meta["tokens_per_second"] = round(output_tokens / duration, 2)
+        return meta
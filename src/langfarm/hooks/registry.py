@@ -0,0 +1,331 @@
+"""
+hook 注册表：显式 install() / uninstall() 第三方模块的补丁。
+
+这个模块只依赖标准库，补丁的目标和替换函数都用字符串描述，install 时才导入（dashscope、langchain、langfuse 都很重），
+所以 ``from langfarm.hooks import install`` 不会增加冷启动时间，只有启用的 hook 才付出导入的代价。
+
+    from langfarm.hooks import install, uninstall
+
+    install("tongyi", "langfuse_callback")  # 不传参数时安装全部
+    uninstall("tongyi")
+
+为了兼容，导入 hook 所在的模块（如 ``langfarm.hooks.langchain_community.llms.tongyi``）仍会自动 install，
+设置环境变量 LANGFARM_AUTO_HOOK=0 关闭。
+"""
+
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    """'0.3.31' -> (0, 3, 31)，忽略预发布等后缀。"""
+    parts = []
+    for part in version.split("."):
+        match = re.match(r"\d+", part)
+        if match is None:
+            break
+        parts.append(int(match.group()))
+    return tuple(parts)
+
+
+def _resolve(spec: str) -> Tuple[Any, str]:
+    """'pkg.module:Class.attr' -> (Class, 'attr')，导入 pkg.module。"""
+    module_name, _, path = spec.partition(":")
+    owner: Any = importlib.import_module(module_name)
+    *parents, attr = path.split(".")
+    for name in parents:
+        owner = getattr(owner, name)
+    return owner, attr
+
+
+class Patch:
+    """把 target（'模块:属性路径'）替换为 replacement（同样的格式）。"""
+
+    def __init__(self, target: str, replacement: str):
+        self.target = target
+        self.replacement = replacement
+        # 安装前目标自己的属性（类属性可能是继承来的，卸载时删除即可）
+        self._original: Any = _MISSING
+        self._value: Any = None
+
+    def apply(self):
+        owner, attr = _resolve(self.target)
+        value = getattr(*_resolve(self.replacement))
+        current = getattr(owner, attr, None)
+        if current is value:
+            return
+        self._original = owner.__dict__.get(attr, _MISSING) if isinstance(owner, type) else getattr(owner, attr)
+        self._value = value
+        setattr(owner, attr, value)
+
+    def revert(self):
+        if self._original is _MISSING and self._value is None:
+            return
+        owner, attr = _resolve(self.target)
+        current = owner.__dict__.get(attr) if isinstance(owner, type) else getattr(owner, attr, None)
+        if current is not self._value:
+            # 安装后又被其他代码替换了，不覆盖
+            logger.warning("skip uninstall %s, it was replaced by %r", self.target, current)
+        elif self._original is _MISSING:
+            delattr(owner, attr)
+        else:
+            setattr(owner, attr, self._original)
+        self._original = _MISSING
+        self._value = None
+
+
+class Hook:
+    def __init__(
+        self,
+        name: str,
+        patches: List[Patch],
+        requires: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+        description: str = "",
+    ):
+        """
+        :param name: hook 名称
+        :param patches: 补丁
+        :param requires: 分发包名 -> (最低版本（含）, 最高版本（不含）或 None)，不满足时不安装
+        :param description: 说明
+        """
+        self.name = name
+        self.patches = patches
+        self.requires = requires or {}
+        self.description = description
+        self.installed = False
+        # install 耗时（主要是导入依赖的时间）
+        self.install_second: Optional[float] = None
+
+    def check_requires(self) -> Optional[str]:
+        """满足版本要求时返回 None，否则返回原因。"""
+        for dist, (min_version, max_version) in self.requires.items():
+            try:
+                version = metadata.version(dist)
+            except metadata.PackageNotFoundError:
+                return f"{dist} is not installed"
+            current = _version_tuple(version)
+            if current < _version_tuple(min_version) or (
+                max_version is not None and current >= _version_tuple(max_version)
+            ):
+                return f"{dist}=={version} not in [{min_version}, {max_version or ''})"
+        return None
+
+    def modules(self) -> List[str]:
+        names = []
+        for patch in self.patches:
+            for spec in (patch.target, patch.replacement):
+                module_name = spec.partition(":")[0]
+                if module_name not in names:
+                    names.append(module_name)
+        return names
+
+
+_hooks: Dict[str, Hook] = {}
+_lock = threading.RLock()
+
+
+def register(hook: Hook):
+    with _lock:
+        if hook.name in _hooks and _hooks[hook.name].installed:
+            raise ValueError(f"hook {hook.name} is installed, uninstall it before register again")
+        _hooks[hook.name] = hook
+
+
+def get_hook(name: str) -> Hook:
+    try:
+        return _hooks[name]
+    except KeyError:
+        raise ValueError(f"unknown hook: {name}, available: {sorted(_hooks)}") from None
+
+
+def _install(hook: Hook, force: bool) -> bool:
+    if hook.installed:
+        return True
+    reason = hook.check_requires()
+    if reason is not None and not force:
+        logger.warning("skip hook %s: %s", hook.name, reason)
+        return False
+
+    start = time.perf_counter()
+    # 先导入所有模块：导入 hook 模块时可能已经自动 install 了
+    for module_name in hook.modules():
+        importlib.import_module(module_name)
+    if hook.installed:
+        hook.install_second = time.perf_counter() - start
+        return True
+    applied = []
+    try:
+        for patch in hook.patches:
+            patch.apply()
+            applied.append(patch)
+    except Exception:
+        for patch in reversed(applied):
+            patch.revert()
+        raise
+    hook.installed = True
+    hook.install_second = time.perf_counter() - start
+    logger.info("hook %s installed in %.3fs", hook.name, hook.install_second)
+    return True
+
+
+def install(*names: str, force: bool = False) -> List[str]:
+    """
+    安装 hook，不传 names 时安装全部。已安装的 hook 不重复安装。
+
+    版本不满足要求、依赖未安装时跳过（记录 warning），force=True 时忽略版本检查。
+    指定 names 时安装失败抛出异常；安装全部时跳过失败的 hook。返回已安装的 hook 名称。
+    """
+    with _lock:
+        hooks = [get_hook(name) for name in names] if names else list(_hooks.values())
+        result = []
+        for hook in hooks:
+            try:
+                if _install(hook, force):
+                    result.append(hook.name)
+            except ImportError as e:
+                if names:
+                    raise
+                logger.info("skip hook %s: %s", hook.name, e)
+        return result
+
+
+def uninstall(*names: str) -> List[str]:
+    """卸载 hook（恢复原来的函数），不传 names 时卸载全部已安装的 hook。返回卸载的 hook 名称。"""
+    with _lock:
+        hooks = [get_hook(name) for name in names] if names else list(_hooks.values())
+        result = []
+        for hook in hooks:
+            if not hook.installed:
+                continue
+            for patch in reversed(hook.patches):
+                patch.revert()
+            hook.installed = False
+            result.append(hook.name)
+            logger.info("hook %s uninstalled", hook.name)
+        return result
+
+
+def installed_hooks() -> Dict[str, Optional[float]]:
+    """已安装的 hook 名称 -> install 耗时（秒）。"""
+    with _lock:
+        return {name: hook.install_second for name, hook in _hooks.items() if hook.installed}
+
+
+def auto_install(name: str):
+    """hook 模块被导入时调用，兼容原来导入即 hook 的用法。"""
+    if os.environ.get("LANGFARM_AUTO_HOOK", "1").lower() in ("0", "false", "no"):
+        return
+    try:
+        install(name)
+    except Exception as e:
+        logger.warning("hook %s fail! %s", name, e, exc_info=True)
+
+
+_MEASURE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from langfarm.hooks import registry
+base = time.perf_counter() - start
+installed = registry.install(*sys.argv[1:])
+print(json.dumps({"registry": base, "total": time.perf_counter() - start, "installed": installed}))
+"""
+
+
+def measure_import_time(*names: str) -> Dict[str, Dict[str, Any]]:
+    """
+    在新的 Python 进程中分别安装每个 hook，测量冷启动的导入耗时（秒），不影响当前进程。
+    不传 names 时测量全部 hook。返回 hook 名称 -> {"registry", "total", "installed"}。
+    """
+    result = {}
+    env = {**os.environ, "LANGFARM_AUTO_HOOK": "1"}
+    for name in names or sorted(_hooks):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE_SCRIPT, name], capture_output=True, text=True, check=True, env=env
+        ).stdout
+        result[name] = json.loads(output.strip().splitlines()[-1])
+    return result
+
+
+_LANGCHAIN_COMMUNITY = {"langchain-community": ("0.3.0", "0.4")}
+
+register(
+    Hook(
+        "tongyi",
+        [
+            Patch(
+                f"langchain_community.llms.tongyi:{name}",
+                f"langfarm.hooks.langchain_community.llms.tongyi:{name}",
+            )
+            for name in ("generate_with_retry", "stream_generate_with_retry", "astream_generate_with_retry")
+        ]
+        + [
+            Patch(
+                "langchain_community.llms.tongyi:Tongyi._agenerate",
+                "langfarm.hooks.langchain_community.llms.tongyi:_agenerate",
+            )
+        ],
+        _LANGCHAIN_COMMUNITY,
+        "langchain_community.llms.Tongyi 记录重试信息、流式延迟统计，异步调用保留 langfuse 上下文",
+    )
+)
+
+register(
+    Hook(
+        "chat_tongyi",
+        [
+            Patch(
+                f"langchain_community.chat_models.tongyi:ChatTongyi.{name}",
+                f"langfarm.hooks.langchain_community.chat_models.tongyi:{name}",
+            )
+            for name in (
+                "completion_with_retry",
+                "stream_completion_with_retry",
+                "astream_completion_with_retry",
+                "_agenerate",
+            )
+        ],
+        _LANGCHAIN_COMMUNITY,
+        "langchain_community.chat_models.ChatTongyi 记录重试信息、流式延迟统计，异步调用保留 langfuse 上下文",
+    )
+)
+
+register(
+    Hook(
+        "langfuse_callback",
+        [
+            Patch(
+                "langfuse.callback.langchain:_parse_usage",
+                "langfarm.hooks.langfuse.callback.langchain:hook_parse_usage",
+            )
+        ],
+        {"langfuse": ("2.33.0", "3"), "langchain-core": ("0.3.0", None)},
+        "langfuse 的 langchain CallbackHandler 解析通义的 token_usage",
+    )
+)
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure the import time of langfarm hooks.")
+    parser.add_argument("hooks", nargs="*", help=f"hook 名称，默认全部：{', '.join(sorted(_hooks))}")
+    args = parser.parse_args(argv)
+    for name, cost in measure_import_time(*args.hooks).items():
+        print(f"{name:<20} total={cost['total']:.3f}s registry={cost['registry']:.3f}s installed={cost['installed']}")
+
+
+if __name__ == "__main__":
+    main()
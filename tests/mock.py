@@ -1,6 +1,8 @@
+import asyncio
 import os
+import threading
 import time
-from typing import Any, Dict, Generator, List, Union, Type, Optional
+from typing import Any, AsyncGenerator, Dict, Generator, List, Union, Type, Optional
 
 from dashscope.api_entities.dashscope_response import (
     GenerationOutput,
@@ -22,6 +24,8 @@ logger = get_test_logger(__name__)
 class MockGeneration(Generation):
     max_fail_cnt = 3
     fail_cnt = 0
+    # 失败响应的 headers，如 Retry-After
+    fail_headers: Optional[dict] = None
 
     @classmethod
     def _reset_fail_cnt(cls):
@@ -53,6 +57,7 @@ class MockGeneration(Generation):
                 message="mock test rate-limit",
                 usage=GenerationUsage(input_tokens=20, output_tokens=5),
                 output=GenerationOutput(text="mock for rate-limit", finish_reason="done"),
+                headers=cls.fail_headers,
             )
 
         return response
@@ -110,6 +115,228 @@ class MockErrorGeneration(Generation):
         return response
 
 
+class MockModelGeneration(Generation):
+    """failing_models 里的模型总是返回 500，其他模型成功。"""
+
+    failing_models: List[str] = []
+    called_models: List[str] = []
+
+    @classmethod
+    def _do_call(
+        cls,
+        model: str,
+        prompt: Any = None,
+        history: Optional[list] = None,
+        api_key: Optional[str] = None,
+        messages: Optional[List[Message]] = None,
+        plugins: Optional[Union[str, Dict[str, Any]]] = None,
+        workspace: Optional[str] = None,
+        **kwargs,
+    ) -> Union[GenerationResponse, Generator[GenerationResponse, None, None]]:
+        cls.called_models.append(model)
+        if model in cls.failing_models:
+            return GenerationResponse(status_code=500, code="InternalError", message=f"mock {model} error")
+        return GenerationResponse(
+            status_code=200,
+            usage=GenerationUsage(input_tokens=20, output_tokens=5),
+            output=GenerationOutput(text=f"mock from {model}", finish_reason="done"),
+        )
+
+
+class MockStreamGeneration(Generation):
+    """按 chunks 返回，支持 stream 和 incremental_output，call_cnt 记录调用次数。"""
+
+    chunks: List[str] = ["mock ", "for ", "stream"]
+    call_cnt = 0
+
+    @classmethod
+    def _do_call(cls, model: str, **kwargs) -> Union[GenerationResponse, Generator[GenerationResponse, None, None]]:
+        cls.call_cnt += 1
+        responses = []
+        for i in range(len(cls.chunks)):
+            text = cls.chunks[i] if kwargs.get("incremental_output") else "".join(cls.chunks[: i + 1])
+            responses.append(
+                GenerationResponse(
+                    status_code=200,
+                    usage=GenerationUsage(input_tokens=20, output_tokens=i + 1),
+                    output=GenerationOutput(text=text, finish_reason="null"),
+                )
+            )
+        if kwargs.get("stream"):
+            return (resp for resp in responses)
+        response = responses[-1]
+        response.output.text = "".join(cls.chunks)
+        return response
+
+
+class MockBatchGeneration(Generation):
+    """prompt 为 "error" 时抛异常，为 "bad" 时返回 400，否则原样返回 prompt。trace_ids 记录请求时的 trace id。"""
+
+    trace_ids: List[Optional[str]] = []
+
+    @classmethod
+    def _do_call(cls, model: str, prompt: Any = None, **kwargs) -> GenerationResponse:
+        cls.trace_ids.append(langfuse_context.get_current_trace_id())
+        if prompt == "error":
+            raise ValueError("mock error")
+        if prompt == "bad":
+            return GenerationResponse(status_code=400, code="InvalidParameter", message="mock bad request")
+        return GenerationResponse(
+            status_code=200,
+            usage=GenerationUsage(input_tokens=10, output_tokens=len(prompt)),
+            output=GenerationOutput(text=prompt, finish_reason="stop"),
+        )
+
+
+class MockSlowGeneration(Generation):
+    """第 i 次调用耗时 delays[i] 秒（超出时不等待），状态码 status_codes[i]（超出时 200），用于测试对冲请求。"""
+
+    delays: List[float] = []
+    status_codes: List[int] = []
+    call_cnt = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def _next_delay(cls) -> tuple[int, float]:
+        with cls._lock:
+            i = cls.call_cnt
+            cls.call_cnt += 1
+        return i, cls.delays[i] if i < len(cls.delays) else 0
+
+    @classmethod
+    def _response(cls, i: int) -> GenerationResponse:
+        status_code = cls.status_codes[i] if i < len(cls.status_codes) else 200
+        if status_code != 200:
+            return GenerationResponse(status_code=status_code, code="InternalError", message=f"mock call {i} failed")
+        return GenerationResponse(
+            status_code=200,
+            usage=GenerationUsage(input_tokens=20, output_tokens=5),
+            output=GenerationOutput(text=f"mock call {i}", finish_reason="done"),
+        )
+
+    @classmethod
+    def _do_call(cls, model: str, **kwargs) -> GenerationResponse:
+        i, delay = cls._next_delay()
+        time.sleep(delay)
+        return cls._response(i)
+
+    @classmethod
+    async def _do_acall(cls, model: str, **kwargs) -> GenerationResponse:
+        i, delay = cls._next_delay()
+        await asyncio.sleep(delay)
+        return cls._response(i)
+
+
+class MockAsyncGeneration(Generation):
+    max_fail_cnt = 1
+    fail_cnt = 0
+    chunks: List[str] = ["mock ", "for ", "async"]
+
+    @classmethod
+    def _reset_fail_cnt(cls):
+        cls.fail_cnt = 0
+
+    @classmethod
+    async def _do_acall(
+        cls,
+        model: str,
+        prompt: Any = None,
+        history: Optional[list] = None,
+        api_key: Optional[str] = None,
+        messages: Optional[List[Message]] = None,
+        plugins: Optional[Union[str, Dict[str, Any]]] = None,
+        workspace: Optional[str] = None,
+        **kwargs,
+    ) -> Union[GenerationResponse, AsyncGenerator[GenerationResponse, None]]:
+        cls.fail_cnt += 1
+        if cls.fail_cnt >= cls.max_fail_cnt:
+            responses = []
+            for i in range(len(cls.chunks)):
+                if kwargs.get("incremental_output"):
+                    text = cls.chunks[i]
+                else:
+                    text = "".join(cls.chunks[: i + 1])
+                responses.append(
+                    GenerationResponse(
+                        status_code=200,
+                        usage=GenerationUsage(input_tokens=20, output_tokens=i + 1),
+                        output=GenerationOutput(text=text, finish_reason="null"),
+                    )
+                )
+        else:
+            responses = [
+                GenerationResponse(
+                    status_code=429,
+                    code="RateLimit",
+                    message="mock test rate-limit",
+                    usage=GenerationUsage(input_tokens=20, output_tokens=0),
+                    output=GenerationOutput(text="", finish_reason="null"),
+                )
+            ]
+
+        if not kwargs.get("stream"):
+            response = responses[-1]
+            if response.status_code == 200:
+                response.output.text = "".join(cls.chunks)
+            return response
+
+        async def _stream() -> AsyncGenerator[GenerationResponse, None]:
+            for resp in responses:
+                yield resp
+
+        return _stream()
+
+
+class MockResumeGeneration(Generation):
+    """
+    流式逐字输出 text。前 fail_times 次请求输出 fail_after 个 chunk 后返回 500；
+    echo 为 False 时按 messages 最后的 partial assistant 消息续写，否则从头输出。requests 记录每次请求的参数。
+    """
+
+    text = "春眠不觉晓"
+    fail_after = 2
+    fail_times = 1
+    echo = False
+    requests: List[dict] = []
+
+    @classmethod
+    def reset(cls, fail_times: int = 1, echo: bool = False):
+        cls.fail_times = fail_times
+        cls.echo = echo
+        cls.requests = []
+
+    @classmethod
+    def _stream(cls, **kwargs) -> Generator[GenerationResponse, None, None]:
+        cls.requests.append(kwargs)
+        fail = len(cls.requests) <= cls.fail_times
+        start = 0
+        messages = kwargs.get("messages")
+        if not cls.echo and messages and messages[-1].get("partial"):
+            start = len(messages[-1]["content"])
+        for i in range(start, len(cls.text)):
+            if fail and i - start >= cls.fail_after:
+                yield GenerationResponse(status_code=500, code="InternalError", message="mock mid-stream error")
+                return
+            text = cls.text[i] if kwargs.get("incremental_output") else cls.text[start : i + 1]
+            yield GenerationResponse(
+                status_code=200,
+                usage=GenerationUsage(input_tokens=10 + start, output_tokens=i - start + 1),
+                output=GenerationOutput(text=text, finish_reason="stop" if i == len(cls.text) - 1 else "null"),
+            )
+
+    @classmethod
+    def _do_call(cls, model: str, **kwargs) -> Generator[GenerationResponse, None, None]:
+        return cls._stream(**kwargs)
+
+    @classmethod
+    async def _do_acall(cls, model: str, **kwargs) -> AsyncGenerator[GenerationResponse, None]:
+        async def _aiter():
+            for resp in cls._stream(**kwargs):
+                yield resp
+
+        return _aiter()
+
+
 @observe(as_type="generation")
 def tongyi_generation(model_name: str, query: str) -> str:
     response: GenerationResponse = MockOutputGeneration.call(  # type: ignore
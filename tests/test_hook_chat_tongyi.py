@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from typing import Any, List, Optional
+
+from base import BaseTestCase, get_test_logger
+from langchain_community.chat_models import tongyi as chat_tongyi
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langfuse.decorators import langfuse_context
+from requests.exceptions import HTTPError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+from unittest import mock
+
+from langfarm.hooks.langchain_community.chat_models.tongyi import ChatTongyi
+from langfarm.hooks.langfuse.callback.langchain import _parse_usages
+
+logger = get_test_logger(__name__)
+
+
+def _no_wait_retry_decorator(llm: Any):
+    return retry(reraise=True, stop=stop_after_attempt(llm.max_retries), retry=retry_if_exception_type(HTTPError))
+
+
+def _response(status_code: int, content: str = "", usage: Optional[dict] = None, finish_reason: str = "stop") -> dict:
+    return {
+        "status_code": status_code,
+        "request_id": "mock",
+        "code": "" if status_code == 200 else "Throttling",
+        "message": "",
+        "output": {"choices": [{"finish_reason": finish_reason, "message": {"role": "assistant", "content": content}}]},
+        "usage": usage,
+    }
+
+
+def _usage(output_tokens: int) -> dict:
+    return {"input_tokens": 10, "output_tokens": output_tokens, "total_tokens": 10 + output_tokens}
+
+
+class MockChatClient:
+    """
+    前 fail_cnt 次返回 429，之后成功。stream 时按 chunks 增量返回，
+    usage_in_last_only 时只有最后一个 chunk 带 usage（类似 stream_options），否则每个 chunk 带累计的 usage，
+    drop_last_usage 时最后一个 chunk 不带 usage。
+    """
+
+    fail_cnt = 1
+    call_cnt = 0
+    chunks: List[str] = ["春", "天"]
+    usage_in_last_only = False
+    drop_last_usage = False
+
+    @classmethod
+    def call(cls, **kwargs: Any) -> Any:
+        cls.call_cnt += 1
+        if cls.call_cnt <= cls.fail_cnt:
+            response = _response(429)
+            return iter([response]) if kwargs.get("stream") else response
+        if kwargs.get("stream"):
+            return iter(cls._stream())
+        return _response(200, "".join(cls.chunks), _usage(len(cls.chunks)))
+
+    @classmethod
+    def _stream(cls) -> List[dict]:
+        responses = []
+        for i, content in enumerate(cls.chunks):
+            is_last = i == len(cls.chunks) - 1
+            usage = _usage(i + 1) if is_last or not cls.usage_in_last_only else None
+            if is_last and cls.drop_last_usage:
+                usage = None
+            responses.append(_response(200, content, usage, "stop" if is_last else "null"))
+        return responses
+
+
+class _EndCollector(BaseCallbackHandler):
+    def __init__(self):
+        self.results: List[LLMResult] = []
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> Any:
+        self.results.append(response)
+
+
+class HookChatTongyiTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockChatClient.call_cnt = 0
+        MockChatClient.fail_cnt = 1
+        MockChatClient.usage_in_last_only = False
+        MockChatClient.drop_last_usage = False
+        patcher = mock.patch.object(chat_tongyi, "_create_retry_decorator", _no_wait_retry_decorator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.llm = ChatTongyi(model="qwen-plus", api_key="mock", max_retries=3)
+        self.llm.client = MockChatClient
+
+    def test_invoke(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = self.llm.invoke("春天")
+        assert output.content == "春天"
+        obs = up.call_args.kwargs
+        assert obs["level"] == "WARNING"
+        assert obs["metadata"]["run_cnt"] == 2
+
+    def test_ainvoke_error(self):
+        MockChatClient.fail_cnt = 5
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            with self.assertRaises(HTTPError):
+                asyncio.run(self.llm.ainvoke("春天"))
+        obs = up.call_args.kwargs
+        assert obs["level"] == "ERROR"
+        assert obs["metadata"]["run_cnt"] == 3
+
+    def _check_stream(self, up: mock.MagicMock, collector: _EndCollector):
+        assert MockChatClient.call_cnt == 2
+        assert any("completion_start_time" in c.kwargs for c in up.call_args_list)
+        metadata = up.call_args.kwargs["metadata"]
+        logger.info("metadata=%s", metadata)
+        assert metadata["run_cnt"] == 2
+        assert metadata["chunk_cnt"] == 2
+        assert metadata["ttft_second"] >= 0
+
+        usage, _ = _parse_usages(collector.results[0])
+        assert usage == {"input": 10, "output": 2, "total": 12}
+
+    def test_stream(self):
+        collector = _EndCollector()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = "".join(c.content for c in self.llm.stream("春天", config={"callbacks": [collector]}))
+        assert output == "春天"
+        self._check_stream(up, collector)
+
+    def test_astream_usage_in_last_chunk(self):
+        MockChatClient.usage_in_last_only = True
+        collector = _EndCollector()
+
+        async def _astream() -> str:
+            chunks = [c async for c in self.llm.astream("春天", config={"callbacks": [collector]})]
+            return "".join(c.content for c in chunks)
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = asyncio.run(_astream())
+        assert output == "春天"
+        self._check_stream(up, collector)
+
+    def test_stream_carry_usage(self):
+        # 最后一个 chunk 没有 usage 时沿用之前的累计值
+        MockChatClient.drop_last_usage = True
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            responses = list(self.llm.stream_completion_with_retry(model="qwen-plus", stream=True))
+        assert responses[-1]["usage"] == _usage(1)
+
+    def test_parse_usage_metadata(self):
+        message = AIMessage(content="春天", usage_metadata={"input_tokens": 3, "output_tokens": 2, "total_tokens": 5})
+        usage, _ = _parse_usages(LLMResult(generations=[[ChatGeneration(message=message)]]))
+        assert usage == {"input": 3, "output": 2, "total": 5}
+
+
+if __name__ == "__main__":
+    unittest.main()
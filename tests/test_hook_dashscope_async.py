@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+from typing import AsyncGenerator
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from dashscope.api_entities.dashscope_response import GenerationResponse
+from langfuse.decorators import langfuse_context
+from mock import MockAsyncGeneration  # type: ignore
+
+logger = get_test_logger(__name__)
+
+
+class HookDashscopeAsyncTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockAsyncGeneration._reset_fail_cnt()
+        MockAsyncGeneration.max_fail_cnt = 1
+
+    def test_acall(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response: GenerationResponse = asyncio.run(
+                MockAsyncGeneration.acall(model="qwen-plus", prompt="async query")  # type: ignore
+            )
+        assert response.status_code == 200
+        assert response.output.text == "mock for async"
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["input"] == "async query"
+        assert obs["output"] == "mock for async"
+        assert obs["metadata"] is None
+
+    def test_acall_retry(self):
+        MockAsyncGeneration.max_fail_cnt = 2
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response: GenerationResponse = asyncio.run(
+                MockAsyncGeneration.acall(model="qwen-plus", prompt="async query")  # type: ignore
+            )
+        assert response.status_code == 200
+        obs = up.call_args.kwargs
+        assert obs["level"] == "WARNING"
+        assert obs["metadata"]["run_cnt"] == 2
+        assert obs["metadata"]["idle_second"] >= 1
+
+    def test_acall_stream(self):
+        MockAsyncGeneration.max_fail_cnt = 2
+
+        async def consume(is_inc: bool) -> str:
+            chunks: AsyncGenerator[GenerationResponse, None] = await MockAsyncGeneration.acall(  # type: ignore
+                model="qwen-plus", prompt="async stream", stream=True, incremental_output=is_inc
+            )
+            output = ""
+            async for chunk in chunks:
+                output = output + chunk.output.text if is_inc else chunk.output.text
+            return output
+
+        for is_inc in (True, False):
+            MockAsyncGeneration._reset_fail_cnt()
+            with mock.patch.object(langfuse_context, "update_current_observation") as up:
+                output = asyncio.run(consume(is_inc))
+            assert output == "mock for async"
+            obs = up.call_args.kwargs
+            assert obs["output"] == output
+            assert obs["usage"]["output"] == 3
+            assert "completion_start_time" in up.call_args_list[0].kwargs
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context, observe
+from mock import MockBatchGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RetryPolicy
+
+logger = get_test_logger(__name__)
+
+no_wait_policy = RetryPolicy(max_retries=2, min_seconds=0, max_seconds=0)
+
+
+class BatchCallTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockBatchGeneration.trace_ids = []
+
+    def test_batch_call(self):
+        inputs = [f"prompt {i}" for i in range(20)] + ["error", "bad", {"prompt": "from dict", "seed": 1}]
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            results = MockBatchGeneration.batch_call("qwen-plus", inputs, max_workers=4, retry_policy=no_wait_policy)
+        assert [r.index for r in results] == list(range(len(inputs)))
+        assert [r.response.output.text for r in results[:20]] == inputs[:20]
+        assert isinstance(results[20].error, ValueError)
+        assert results[21].response.status_code == 400
+        assert not results[21].ok
+        assert results[22].response.output.text == "from dict"
+
+        summary = up.call_args_list[-1].kwargs
+        logger.info("summary=%s", summary)
+        assert summary["level"] == "WARNING"
+        output = summary["output"]
+        assert output["total"] == 23
+        assert output["failed"] == 2
+        assert output["succeeded"] == 21
+        assert output["output_tokens"] == sum(len(r.response.output.text) for r in results if r.ok)
+
+    def test_batch_iter_lazy(self):
+        consumed = []
+
+        def _inputs():
+            for i in range(100):
+                consumed.append(i)
+                yield f"prompt {i}"
+
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            iterator = MockBatchGeneration.batch_iter("qwen-plus", _inputs(), max_workers=2)
+            first = next(iterator)
+            assert first.ok
+            # 输入按需读取
+            assert len(consumed) <= 4
+            iterator.close()
+
+    def test_nested_trace(self):
+        @observe()
+        def _pipeline():
+            trace_id = langfuse_context.get_current_trace_id()
+            MockBatchGeneration.batch_call("qwen-plus", ["a", "b", "c"], max_workers=3)
+            return trace_id
+
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            trace_id = _pipeline()
+        assert trace_id is not None
+        assert MockBatchGeneration.trace_ids == [trace_id] * 3
+
+    def test_stream_not_supported(self):
+        with self.assertRaises(ValueError):
+            MockBatchGeneration.batch_call("qwen-plus", ["a"], stream=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
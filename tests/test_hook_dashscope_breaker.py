@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockModelGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import CircuitBreaker, RetryPolicy
+from langfarm.hooks.dashscope.breaker import CLOSED, HALF_OPEN, OPEN
+from langfarm.hooks.dashscope.call_context import CallContext
+
+logger = get_test_logger(__name__)
+
+no_wait_policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0)
+
+
+class CircuitBreakerTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockModelGeneration.failing_models = ["qwen-max"]
+        MockModelGeneration.called_models = []
+
+    def test_state(self):
+        breaker = CircuitBreaker(min_calls=4, failure_rate_threshold=0.5, open_seconds=0.1)
+        for status_code in (200, 400, 500):
+            breaker.record("qwen-max", status_code, 0.1)
+        assert breaker.state("qwen-max") == CLOSED
+        breaker.record("qwen-max", 429, 0.1)
+        assert breaker.state("qwen-max") == OPEN
+        assert not breaker.allow("qwen-max")
+
+        with mock.patch("time.monotonic", return_value=breaker._circuits["qwen-max"].opened_at + 0.2):
+            assert breaker.state("qwen-max") == HALF_OPEN
+            # 半开只放行一个探测请求
+            assert breaker.allow("qwen-max")
+            assert not breaker.allow("qwen-max")
+        breaker.record("qwen-max", 200, 0.1)
+        assert breaker.state("qwen-max") == CLOSED
+
+    def test_slow_call(self):
+        breaker = CircuitBreaker(min_calls=2, slow_call_seconds=1)
+        breaker.record("qwen-max", 200, 2)
+        breaker.record("qwen-max", 200, 2)
+        assert breaker.state("qwen-max") == OPEN
+
+    def test_fallback(self):
+        breaker = CircuitBreaker(min_calls=2, open_seconds=60)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockModelGeneration.call(
+                model="qwen-max",
+                prompt="fallback",
+                retry_policy=no_wait_policy,
+                circuit_breaker=breaker,
+                fallback_models=["qwen-plus", "qwen-turbo"],
+            )
+        assert response.status_code == 200
+        assert MockModelGeneration.called_models == ["qwen-max", "qwen-max", "qwen-plus"]
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["model"] == "qwen-plus"
+        assert obs["metadata"]["served_model"] == "qwen-plus"
+        assert obs["metadata"]["fallback_reason"] == "circuit open: qwen-max"
+
+        # 熔断期间直接使用 fallback 模型
+        MockModelGeneration.called_models = []
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockModelGeneration.call(
+                model="qwen-max",
+                prompt="fallback",
+                retry_policy=no_wait_policy,
+                circuit_breaker=breaker,
+                fallback_models=["qwen-plus", "qwen-turbo"],
+            )
+        assert MockModelGeneration.called_models == ["qwen-plus"]
+        assert up.call_args.kwargs["level"] is None
+
+    def test_back_to_primary(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        breaker.record("qwen-max", 500, 0.1)
+        call_context = CallContext(["qwen-max", "qwen-plus"], circuit_breaker=breaker)
+        assert call_context.begin_attempt().model == "qwen-plus"
+        assert call_context.metadata["served_model"] == "qwen-plus"
+
+        # 重试时 qwen-max 已经恢复，不再上报 fallback 模型
+        with mock.patch("time.monotonic", return_value=breaker._circuits["qwen-max"].opened_at + 61):
+            assert call_context.begin_attempt().model == "qwen-max"
+        assert call_context.served_model == "qwen-max"
+        assert "served_model" not in call_context.metadata
+        assert "fallback_reason" not in call_context.metadata
+
+    def test_fast_fail(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        breaker.record("qwen-max", 500, 0.1)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockModelGeneration.call(
+                model="qwen-max", prompt="fast fail", retry_policy=no_wait_policy, circuit_breaker=breaker
+            )
+        assert response.status_code == 503
+        assert response.code == "CircuitOpen"
+        assert MockModelGeneration.called_models == []
+        obs = up.call_args.kwargs
+        assert obs["level"] == "ERROR"
+        assert obs["metadata"]["circuit_open"] is True
+
+
+if __name__ == "__main__":
+    unittest.main()
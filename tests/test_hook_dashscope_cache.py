@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from dashscope.api_entities.dashscope_response import GenerationOutput, GenerationResponse, GenerationUsage
+from langfuse.decorators import langfuse_context
+from mock import MockAsyncGeneration, MockStreamGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import CircuitBreaker, ResponseCache
+from langfarm.hooks.dashscope.cache import cache_key
+
+logger = get_test_logger(__name__)
+
+
+def _response(text: str) -> GenerationResponse:
+    return GenerationResponse(
+        status_code=200,
+        usage=GenerationUsage(input_tokens=20, output_tokens=5),
+        output=GenerationOutput(text=text, finish_reason="stop"),
+    )
+
+
+class ResponseCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockStreamGeneration.call_cnt = 0
+
+    def test_key(self):
+        key = cache_key("qwen-plus", prompt="hi", temperature=0, top_p=0.8)
+        assert key == cache_key("qwen-plus", prompt="hi", top_p=0.8, temperature=0, stream=True)
+        assert key != cache_key("qwen-plus", prompt="hi", temperature=0, top_p=0.9)
+        assert key != cache_key("qwen-max", prompt="hi", temperature=0, top_p=0.8)
+
+        cache = ResponseCache()
+        assert cache.key("qwen-plus", prompt="hi") is None
+        assert cache.key("qwen-plus", prompt="hi", temperature=0.7) is None
+        assert cache.key("qwen-plus", prompt="hi", seed=42) is not None
+
+    def test_lru_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl=10)
+        cache.set("a", _response("a"))
+        cache.set("b", _response("b"))
+        assert cache.get("a").output.text == "a"
+        cache.set("c", _response("c"))
+        # b 最久未使用，被淘汰
+        assert cache.get("b") is None
+        assert len(cache) == 2
+
+        with mock.patch("time.time", return_value=time.time() + 11):
+            assert cache.get("a") is None
+
+        cache = ResponseCache(max_bytes=1)
+        cache.set("a", _response("a"))
+        assert len(cache) == 0
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            ResponseCache(path=path).set("a", _response("from disk"))
+            # 另一个实例（如另一个进程）可以读到
+            response = ResponseCache(path=path).get("a")
+            assert response.status_code == 200
+            assert response.output.text == "from disk"
+            assert response.usage.output_tokens == 5
+
+    def test_call_cached(self):
+        cache = ResponseCache()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            first = MockStreamGeneration.call(model="qwen-plus", prompt="cache", temperature=0, response_cache=cache)
+        assert "cached" not in (up.call_args.kwargs["metadata"] or {})
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            second = MockStreamGeneration.call(model="qwen-plus", prompt="cache", temperature=0, response_cache=cache)
+        assert MockStreamGeneration.call_cnt == 1
+        assert second.output.text == first.output.text == "mock for stream"
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["usage"] == {"input": 0, "output": 0, "unit": "TOKENS"}
+        assert obs["metadata"]["cached"] is True
+        assert obs["metadata"]["cached_usage"]["output_tokens"] == 3
+
+        # 非确定性参数不缓存
+        MockStreamGeneration.call(model="qwen-plus", prompt="cache", response_cache=cache)
+        assert MockStreamGeneration.call_cnt == 2
+
+    def test_stream_replay(self):
+        cache = ResponseCache()
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            chunks = list(
+                MockStreamGeneration.call(
+                    model="qwen-plus",
+                    prompt="stream",
+                    seed=1,
+                    stream=True,
+                    incremental_output=True,
+                    response_cache=cache,
+                )
+            )
+        assert len(chunks) == 3
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            replay = list(
+                MockStreamGeneration.call(
+                    model="qwen-plus",
+                    prompt="stream",
+                    seed=1,
+                    stream=True,
+                    incremental_output=True,
+                    response_cache=cache,
+                )
+            )
+        assert MockStreamGeneration.call_cnt == 1
+        assert len(replay) == 1
+        assert replay[0].output.text == "mock for stream"
+        obs = up.call_args.kwargs
+        assert obs["output"] == "mock for stream"
+        assert obs["usage"]["output"] == 0
+        assert obs["metadata"]["cached"] is True
+
+        # 流式写入的缓存，非流式也能命中
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            response = MockStreamGeneration.call(model="qwen-plus", prompt="stream", seed=1, response_cache=cache)
+        assert response.output.text == "mock for stream"
+        assert MockStreamGeneration.call_cnt == 1
+
+    def test_fallback_not_cached(self):
+        cache = ResponseCache()
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        breaker.record("qwen-max", 500, 0.1)
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            response = MockStreamGeneration.call(
+                model="qwen-max",
+                prompt="fallback",
+                temperature=0,
+                response_cache=cache,
+                circuit_breaker=breaker,
+                fallback_models=["qwen-plus"],
+            )
+            chunks = list(
+                MockStreamGeneration.call(
+                    model="qwen-max",
+                    prompt="fallback",
+                    seed=1,
+                    stream=True,
+                    response_cache=cache,
+                    circuit_breaker=breaker,
+                    fallback_models=["qwen-plus"],
+                )
+            )
+        assert response.status_code == 200
+        assert len(chunks) == 3
+        assert MockStreamGeneration.call_cnt == 2
+        # fallback 模型的响应不缓存，qwen-max 恢复后不会拿到 qwen-plus 的结果
+        assert len(cache) == 0
+
+    def test_acall_cached(self):
+        MockAsyncGeneration._reset_fail_cnt()
+        MockAsyncGeneration.max_fail_cnt = 1
+        cache = ResponseCache()
+
+        async def _call():
+            for _ in range(2):
+                await MockAsyncGeneration.acall(model="qwen-plus", prompt="async", temperature=0, response_cache=cache)
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            asyncio.run(_call())
+        assert MockAsyncGeneration.fail_cnt == 1
+        assert up.call_args.kwargs["metadata"]["cached"] is True
+
+
+if __name__ == "__main__":
+    unittest.main()
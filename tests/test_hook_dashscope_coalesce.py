@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockSlowGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import SingleFlight
+
+logger = get_test_logger(__name__)
+
+
+class SingleFlightTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockSlowGeneration.call_cnt = 0
+        MockSlowGeneration.delays = [0.2]
+
+    def test_do(self):
+        flight = SingleFlight()
+        results = []
+
+        def _run():
+            results.append(flight.do("key", lambda: MockSlowGeneration._do_call("qwen-plus")))
+
+        threads = [threading.Thread(target=_run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert MockSlowGeneration.call_cnt == 1
+        assert sorted(shared for _, shared in results) == [False, True, True, True]
+        assert len({id(response) for response, _ in results}) == 1
+        assert flight.in_flight() == 0
+
+    def test_do_error(self):
+        flight = SingleFlight()
+
+        def _fail():
+            raise ValueError("mock error")
+
+        with self.assertRaises(ValueError):
+            flight.do("key", _fail)
+        assert flight.in_flight() == 0
+
+    def test_call_coalesced(self):
+        flight = SingleFlight()
+        responses = []
+
+        # mock.patch 不是线程安全的，这里只 patch 一次
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+
+            def _run_patched():
+                responses.append(MockSlowGeneration.call(model="qwen-plus", prompt="faq", single_flight=flight))
+
+            threads = [threading.Thread(target=_run_patched) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert MockSlowGeneration.call_cnt == 1
+        assert len({id(response) for response in responses}) == 1
+        observations = [c.kwargs for c in up.call_args_list]
+        logger.info("observations=%s", observations)
+        assert len(observations) == 3
+        coalesced = [obs for obs in observations if (obs["metadata"] or {}).get("coalesced")]
+        assert len(coalesced) == 2
+        assert all(obs["usage"]["output"] == 0 for obs in coalesced)
+
+        # 不同的请求不合并
+        MockSlowGeneration.delays = []
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            MockSlowGeneration.call(model="qwen-plus", prompt="other", single_flight=flight)
+        assert MockSlowGeneration.call_cnt == 2
+
+    def test_acall_coalesced(self):
+        flight = SingleFlight()
+
+        async def _call():
+            return await asyncio.gather(
+                *[MockSlowGeneration.acall(model="qwen-plus", prompt="faq", single_flight=flight) for _ in range(3)]
+            )
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            responses = asyncio.run(_call())
+        assert MockSlowGeneration.call_cnt == 1
+        assert responses[0] is responses[1] is responses[2]
+        coalesced = [c for c in up.call_args_list if (c.kwargs["metadata"] or {}).get("coalesced")]
+        assert len(coalesced) == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockSlowGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import CircuitBreaker, HedgePolicy, RateLimiter, RetryBudget
+from langfarm.hooks.dashscope.breaker import CLOSED
+
+logger = get_test_logger(__name__)
+
+
+class HedgePolicyTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockSlowGeneration.call_cnt = 0
+        MockSlowGeneration.delays = []
+        MockSlowGeneration.status_codes = []
+
+    def test_delay(self):
+        assert HedgePolicy(delay=0.5).delay("qwen-plus") == 0.5
+        policy = HedgePolicy(min_samples=10, percentile=0.9, min_delay=0.05, max_delay=5)
+        # 样本不足不对冲
+        assert policy.delay("qwen-plus") is None
+        for i in range(1, 11):
+            policy.record("qwen-plus", i * 0.1)
+        assert abs(policy.delay("qwen-plus") - 1.0) < 1e-9
+        for _ in range(10):
+            policy.record("qwen-plus", 100)
+        assert policy.delay("qwen-plus") == 5
+
+    def test_hedge_win(self):
+        MockSlowGeneration.delays = [0.5, 0]
+        breaker = CircuitBreaker()
+        limiter = RateLimiter(max_concurrency=4)
+        start = time.monotonic()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockSlowGeneration.call(
+                model="qwen-plus",
+                prompt="hedge",
+                hedge_policy=HedgePolicy(delay=0.05),
+                circuit_breaker=breaker,
+                rate_limiter=limiter,
+            )
+        # 不等较慢的第一个请求
+        assert time.monotonic() - start < 0.4
+        assert response.status_code == 200
+        assert response.output.text == "mock call 1"
+        metadata = up.call_args.kwargs["metadata"]
+        logger.info("metadata=%s", metadata)
+        assert metadata["hedged"] is True
+        assert metadata["hedge_winner"] == "hedge"
+        assert metadata["hedge_delay_second"] == 0.05
+        # 较慢的请求已经归还限流许可，结束后也不记录熔断统计
+        state = next(iter(limiter._states.values()))
+        assert state.concurrency.in_flight == 0
+        time.sleep(0.6)
+        assert len(breaker._circuit("qwen-plus").calls) == 1
+
+    def test_hedge_primary_failed(self):
+        MockSlowGeneration.delays = [0.2, 0.3]
+        MockSlowGeneration.status_codes = [500, 200]
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockSlowGeneration.call(
+                model="qwen-plus", prompt="hedge", hedge_policy=HedgePolicy(delay=0.05), max_retries=0
+            )
+        # 第一个请求先失败，使用已经发出的对冲请求的结果，不用重试
+        assert response.output.text == "mock call 1"
+        assert MockSlowGeneration.call_cnt == 2
+        metadata = up.call_args.kwargs["metadata"]
+        assert metadata["hedge_winner"] == "hedge"
+
+    def test_no_hedge_when_fast(self):
+        MockSlowGeneration.delays = [0, 0]
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockSlowGeneration.call(model="qwen-plus", prompt="hedge", hedge_policy=HedgePolicy(delay=0.5))
+        assert response.output.text == "mock call 0"
+        assert MockSlowGeneration.call_cnt == 1
+        assert "hedged" not in (up.call_args.kwargs["metadata"] or {})
+
+    def test_hedge_denied_by_budget(self):
+        MockSlowGeneration.delays = [0.2, 0]
+        budget = RetryBudget(ratio=0, min_retries_per_second=0)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockSlowGeneration.call(
+                model="qwen-plus", prompt="hedge", hedge_policy=HedgePolicy(delay=0.05), retry_budget=budget
+            )
+        assert response.output.text == "mock call 0"
+        assert MockSlowGeneration.call_cnt == 1
+        metadata = up.call_args.kwargs["metadata"]
+        assert metadata["hedge_denied"] == "retry_budget"
+        # 对冲请求没有发出
+        assert "hedged" not in metadata
+        assert "hedge_winner" not in metadata
+        assert "retry_budget_exhausted" not in metadata
+
+    def test_ahedge_win(self):
+        MockSlowGeneration.delays = [1, 0]
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = asyncio.run(
+                MockSlowGeneration.acall(model="qwen-plus", prompt="hedge", hedge_policy=HedgePolicy(delay=0.05))
+            )
+        assert response.output.text == "mock call 1"
+        metadata = up.call_args.kwargs["metadata"]
+        assert metadata["hedge_winner"] == "hedge"
+
+    def test_ahedge_cancel_not_recorded(self):
+        # 被取消的较慢请求不算熔断失败，只归还限流许可
+        MockSlowGeneration.delays = [1, 0] * 3
+        breaker = CircuitBreaker(min_calls=4)
+        limiter = RateLimiter(max_concurrency=4)
+        policy = HedgePolicy(delay=0.05)
+
+        async def _run():
+            for _ in range(3):
+                response = await MockSlowGeneration.acall(
+                    model="qwen-plus",
+                    prompt="hedge",
+                    hedge_policy=policy,
+                    circuit_breaker=breaker,
+                    rate_limiter=limiter,
+                )
+                assert response.status_code == 200
+            # 让被取消的任务执行完
+            await asyncio.sleep(0.01)
+
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            asyncio.run(_run())
+        assert breaker.state("qwen-plus") == CLOSED
+        assert breaker._circuit("qwen-plus").bad_calls == 0
+        state = next(iter(limiter._states.values()))
+        assert state.concurrency.in_flight == 0
+        assert state.concurrency.limit == 4
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockBatchGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import Generation
+from langfarm.hooks.dashscope.jobs import Checkpoint, JobRunner, main
+
+logger = get_test_logger(__name__)
+
+
+def _write_requests(path: str, prompts: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, prompt in enumerate(prompts):
+            f.write(json.dumps({"id": f"req-{i}", "prompt": prompt}, ensure_ascii=False) + "\n")
+
+
+def _read_results(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class JobRunnerTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, "requests.jsonl")
+        self.output = os.path.join(self.tmp.name, "results.jsonl")
+        patcher = mock.patch.object(langfuse_context, "update_current_observation")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_checkpoint(self):
+        path = os.path.join(self.tmp.name, "checkpoint")
+        checkpoint = Checkpoint(path)
+        for line in (0, 2, 3, 5):
+            checkpoint.mark(line)
+        assert checkpoint.watermark == 0
+        checkpoint.mark(1)
+        assert checkpoint.watermark == 3
+        assert checkpoint.done == {5}
+        checkpoint.save()
+
+        loaded = Checkpoint(path)
+        assert loaded.is_done(3) and loaded.is_done(5)
+        assert not loaded.is_done(4)
+
+    def test_run_and_resume(self):
+        prompts = [f"prompt {i}" for i in range(30)] + ["bad", "error"]
+        _write_requests(self.input, prompts)
+        runner = JobRunner(model="qwen-plus", max_workers=4, generation_cls=MockBatchGeneration)
+
+        # 模拟中途停止
+        stat = runner.run(self.input, self.output, limit=10)
+        assert stat.total == 10
+        assert len(_read_results(self.output)) == 10
+
+        stat = runner.run(self.input, self.output)
+        assert stat.total == len(prompts) - 10
+        assert stat.failed == 2
+        results = _read_results(self.output)
+        assert sorted(r["line"] for r in results) == list(range(len(prompts)))
+        by_id = {r["id"]: r for r in results}
+        assert by_id["req-3"]["output"] == "prompt 3"
+        assert by_id["req-3"]["usage"]["output_tokens"] == len("prompt 3")
+        assert by_id["req-30"]["status_code"] == 400
+        assert by_id["req-31"]["error"] == "ValueError: mock error"
+
+        # 全部完成后再次运行不会重复调用
+        assert runner.run(self.input, self.output).total == 0
+
+    def test_blank_and_invalid_lines(self):
+        with open(self.input, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": "a"}) + "\n\n")
+            f.write("{not json\n")
+            f.write("[1, 2]\n")
+            for i in range(20):
+                f.write(json.dumps({"prompt": f"p{i}"}) + "\n")
+        runner = JobRunner(model="qwen-plus", max_workers=4, generation_cls=MockBatchGeneration)
+        stat = runner.run(self.input, self.output)
+        assert stat.total == 23
+        assert stat.failed == 2
+        by_line = {r["line"]: r for r in _read_results(self.output)}
+        assert by_line[2]["error"].startswith("JSONDecodeError")
+        assert by_line[3]["error"] == "ValueError: expected a JSON object, got list"
+        assert by_line[4]["output"] == "p0"
+
+        # 空行、解析失败的行都标记完成，检查点只有 watermark
+        with open(f"{self.output}.checkpoint", encoding="utf-8") as f:
+            assert json.load(f) == {"watermark": 23, "done": []}
+        assert runner.run(self.input, self.output).total == 0
+
+    def test_cli(self):
+        _write_requests(self.input, ["a", "b", "c"])
+        with mock.patch.object(Generation, "_do_call", MockBatchGeneration._do_call):
+            main([self.input, self.output, "--model", "qwen-plus", "--rpm", "600", "--param", "seed=1"])
+        results = _read_results(self.output)
+        assert sorted(r["output"] for r in results) == ["a", "b", "c"]
+
+
+if __name__ == "__main__":
+    unittest.main()
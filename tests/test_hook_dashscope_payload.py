@@ -0,0 +1,132 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockErrorGeneration, MockGeneration, MockOutputGeneration, MockStreamGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import PayloadPolicy, RetryPolicy
+from langfarm.hooks.misc import truncate_middle
+
+logger = get_test_logger(__name__)
+
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+LONG_PROMPT = "参考资料：" + "春眠不觉晓，处处闻啼鸟。" * 100
+
+
+class PayloadPolicyTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        output = MockOutputGeneration.output
+        self.addCleanup(MockOutputGeneration.with_output, output)
+
+    def test_truncate_middle(self):
+        assert truncate_middle("abcdef", 10) == "abcdef"
+        assert truncate_middle("abcdefghij", 4) == "ab...[truncated 6 chars]...ij"
+
+    def test_truncate(self):
+        output = "夜来风雨声，花落知多少。" * 50
+        MockOutputGeneration.with_output(output)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockOutputGeneration.call(
+                model="qwen-plus", prompt=LONG_PROMPT, payload_policy=PayloadPolicy(max_chars=100)
+            )
+        # 调用方拿到的响应不受影响
+        assert response.output.text == output
+        kwargs = up.call_args.kwargs
+        logger.info("input=%s, metadata=%s", kwargs["input"], kwargs["metadata"])
+        assert kwargs["input"].startswith(LONG_PROMPT[:50])
+        assert kwargs["input"].endswith(LONG_PROMPT[-50:])
+        assert f"[truncated {len(LONG_PROMPT) - 100} chars]" in kwargs["input"]
+        assert len(kwargs["output"]) < 200
+        # usage 按完整内容上报
+        assert kwargs["usage"]["output"] == len(output)
+        assert kwargs["metadata"]["payload"] == {
+            "mode": "truncate",
+            "input_chars": len(LONG_PROMPT),
+            "output_chars": len(output),
+        }
+
+    def test_hash_messages(self):
+        messages = [
+            {"role": "system", "content": "你是一个诗人"},
+            {"role": "user", "content": LONG_PROMPT},
+        ]
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockOutputGeneration.call(
+                model="qwen-plus", messages=messages, payload_policy=PayloadPolicy(hash_content=True)
+            )
+        kwargs = up.call_args.kwargs
+        logger.info("input=%s", kwargs["input"])
+        digest = hashlib.sha256(LONG_PROMPT.encode("utf-8")).hexdigest()
+        assert kwargs["input"] == [
+            {"role": "system", "content": "你是一个诗人"},
+            {"role": "user", "content": f"[sha256:{digest}, {len(LONG_PROMPT)} chars]"},
+        ]
+        # 调用方的 messages 不被修改
+        assert messages[1]["content"] == LONG_PROMPT
+        # 短的输出保留
+        assert kwargs["output"] == MockOutputGeneration.output
+        assert kwargs["metadata"]["payload"]["mode"] == "hash"
+
+    def test_full_on_warning_and_error(self):
+        policy = PayloadPolicy(max_chars=100)
+        # 有重试的调用为 WARNING
+        MockGeneration._reset_fail_cnt()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockGeneration.call(
+                model="qwen-plus", prompt=LONG_PROMPT, retry_policy=NO_WAIT_RETRY, payload_policy=policy
+            )
+        kwargs = up.call_args.kwargs
+        assert kwargs["level"] == "WARNING"
+        assert kwargs["input"] == LONG_PROMPT
+        assert "payload" not in kwargs["metadata"]
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockErrorGeneration.call(model="qwen-plus", prompt=LONG_PROMPT, payload_policy=policy)
+        kwargs = up.call_args.kwargs
+        assert kwargs["level"] == "ERROR"
+        assert kwargs["input"] == LONG_PROMPT
+
+        # 出错也只保留截断的内容
+        policy = PayloadPolicy(max_chars=100, full_levels=())
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockErrorGeneration.call(model="qwen-plus", prompt=LONG_PROMPT, payload_policy=policy)
+        kwargs = up.call_args.kwargs
+        assert len(kwargs["input"]) < 200
+        assert kwargs["metadata"]["err_code"] == "BadRequest"
+        assert kwargs["metadata"]["payload"]["input_chars"] == len(LONG_PROMPT)
+
+    def test_full_sample(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockOutputGeneration.call(
+                model="qwen-plus", prompt=LONG_PROMPT, payload_policy=PayloadPolicy(max_chars=100, full_sample_rate=1)
+            )
+        assert up.call_args.kwargs["input"] == LONG_PROMPT
+
+    def test_stream(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            chunks = list(
+                MockStreamGeneration.call(
+                    model="qwen-plus",
+                    prompt=LONG_PROMPT,
+                    stream=True,
+                    incremental_output=True,
+                    payload_policy=PayloadPolicy(max_chars=10),
+                    phase_timing=1,
+                )
+            )
+        assert len(chunks) == len(MockStreamGeneration.chunks)
+        kwargs = up.call_args.kwargs
+        logger.info("output=%s, metadata=%s", kwargs["output"], kwargs["metadata"])
+        assert kwargs["output"] == truncate_middle("".join(MockStreamGeneration.chunks), 10)
+        assert kwargs["usage"]["output"] == len(MockStreamGeneration.chunks)
+        assert kwargs["metadata"]["payload"]["output_chars"] == len("".join(MockStreamGeneration.chunks))
+        # timing 仍在更新之后补上 observe 的耗时
+        assert "observe_ms" in kwargs["metadata"]["timing"]
+
+
+if __name__ == "__main__":
+    unittest.main()
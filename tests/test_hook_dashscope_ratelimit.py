@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockAsyncGeneration, MockGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RateLimiter, RetryPolicy
+from langfarm.hooks.dashscope.ratelimit import AdaptiveConcurrency, TokenBucket
+
+logger = get_test_logger(__name__)
+
+no_wait_policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0)
+
+
+class RateLimiterTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockGeneration._reset_fail_cnt()
+        MockAsyncGeneration._reset_fail_cnt()
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(60, capacity=1)
+        now = bucket.updated_at
+        assert bucket.reserve(1, now) == 0
+        # 透支后按速率排队：每秒 1 个
+        assert bucket.reserve(1, now) == 1.0
+        assert bucket.reserve(1, now) == 2.0
+        # 退还多扣的
+        bucket.adjust(-2)
+        assert bucket.reserve(1, now) == 1.0
+
+    def test_adaptive_concurrency(self):
+        concurrency = AdaptiveConcurrency(4)
+        assert all(concurrency.try_acquire() for _ in range(4))
+        assert not concurrency.try_acquire()
+        concurrency.release(throttled=True)
+        assert concurrency.limit == 2
+        assert concurrency.in_flight == 3
+        assert not concurrency.try_acquire()
+        for _ in range(3):
+            concurrency.release(throttled=False)
+        assert 2 < concurrency.limit < 4
+
+    def test_estimate_tokens(self):
+        limiter = RateLimiter(tpm=1000, estimated_output_tokens=100)
+        assert limiter.estimate_tokens("abc") == 103
+        assert limiter.estimate_tokens(messages=[{"role": "user", "content": "abcd"}], max_tokens=10) == 14
+
+    def test_throttle_metadata(self):
+        MockGeneration.max_fail_cnt = 1
+        # 每秒 20 个 token，第二次调用要等约 0.5 秒
+        limiter = RateLimiter(tpm=1200, estimated_output_tokens=0)
+        query = "x" * 1210
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockGeneration.call(model="qwen-plus", prompt=query, rate_limiter=limiter)
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["metadata"]["throttle_second"] >= 0.4
+        assert obs["level"] is None
+
+    def test_backoff_on_rate_limit(self):
+        MockGeneration.max_fail_cnt = 3
+        limiter = RateLimiter(max_concurrency=8)
+        response = MockGeneration.call(
+            model="qwen-plus", prompt="aimd", api_key="k", rate_limiter=limiter, retry_policy=no_wait_policy
+        )
+        assert response.status_code == 200
+        limit = limiter.concurrency_limit(("qwen-plus", "k", None))
+        logger.info("concurrency limit=%s", limit)
+        # 两次 429 之后 8 -> 4 -> 2，再加一次成功
+        assert limit == 2.5
+
+    def test_async_stream_release(self):
+        limiter = RateLimiter(rpm=60, max_concurrency=1)
+
+        async def consume() -> str:
+            chunks = await MockAsyncGeneration.acall(
+                model="qwen-plus", prompt="stream", stream=True, incremental_output=True, rate_limiter=limiter
+            )
+            return "".join([chunk.output.text async for chunk in chunks])
+
+        async def run():
+            return await asyncio.gather(consume(), consume())
+
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            outputs = asyncio.run(asyncio.wait_for(run(), 5))
+        assert outputs == ["mock for async", "mock for async"]
+        # 流结束后释放了并发
+        assert limiter._states[("qwen-plus", None, None)].concurrency.in_flight == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
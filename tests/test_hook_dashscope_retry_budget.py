@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockAsyncGeneration, MockGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RetryBudget, RetryPolicy
+from langfarm.hooks.dashscope.exceptions import RetryBudgetExhaustedException
+
+logger = get_test_logger(__name__)
+
+no_wait_policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0)
+
+
+class RetryBudgetTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockGeneration._reset_fail_cnt()
+        MockAsyncGeneration._reset_fail_cnt()
+
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, window=10, min_retries_per_second=0)
+        assert not budget.try_retry()
+        for _ in range(4):
+            budget.record_success()
+        assert budget.try_retry()
+        assert budget.try_retry()
+        assert not budget.try_retry()
+        assert budget.stat() == {"successes": 4, "retries": 2}
+
+    def test_budget_min_retries(self):
+        budget = RetryBudget(ratio=0, window=2, min_retries_per_second=1)
+        assert budget.try_retry()
+        assert budget.try_retry()
+        assert not budget.try_retry()
+
+    def test_call_within_budget(self):
+        MockGeneration.max_fail_cnt = 3
+        budget = RetryBudget(ratio=0, window=10, min_retries_per_second=1)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(
+                model="qwen-plus", prompt="budget", retry_policy=no_wait_policy, retry_budget=budget
+            )
+        assert response.status_code == 200
+        obs = up.call_args.kwargs
+        assert "retry_budget_exhausted" not in obs["metadata"]
+        assert budget.stat() == {"successes": 1, "retries": 2}
+
+    def test_call_exhausted(self):
+        MockGeneration.max_fail_cnt = 3
+        budget = RetryBudget(ratio=0, min_retries_per_second=0)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(
+                model="qwen-plus", prompt="budget", retry_policy=no_wait_policy, retry_budget=budget
+            )
+        # 不重试，返回第一次失败的响应
+        assert response.status_code == 429
+        assert MockGeneration.fail_cnt == 1
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["level"] == "ERROR"
+        assert obs["metadata"]["retry_budget_exhausted"] is True
+        assert obs["metadata"]["status_code"] == 429
+        # 失败的调用不补充预算
+        assert budget.stat() == {"successes": 0, "retries": 0}
+
+    def test_stream_exhausted(self):
+        MockAsyncGeneration.max_fail_cnt = 2
+        budget = RetryBudget(ratio=0, min_retries_per_second=0)
+
+        async def consume():
+            chunks = await MockAsyncGeneration.acall(
+                model="qwen-plus", prompt="budget", stream=True, retry_policy=no_wait_policy, retry_budget=budget
+            )
+            return [chunk async for chunk in chunks]
+
+        with mock.patch.object(langfuse_context, "update_current_observation"):
+            with self.assertRaises(RetryBudgetExhaustedException) as ctx:
+                asyncio.run(consume())
+        assert ctx.exception.response.status_code == 429
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from email.utils import formatdate
+from time import time
+from unittest import mock
+
+import requests
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockGeneration, MockErrorGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RetryPolicy
+from langfarm.hooks.dashscope.retry import default_retry_policy, retry_after_seconds
+
+logger = get_test_logger(__name__)
+
+
+class RetryPolicyTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockGeneration._reset_fail_cnt()
+        MockGeneration.fail_headers = None
+
+    def test_retryable_status_codes(self):
+        policy = RetryPolicy()
+        assert policy.is_retryable(429)
+        assert policy.is_retryable(500)
+        assert not policy.is_retryable(400)
+        assert not policy.is_retryable(401)
+
+        policy = RetryPolicy(retryable_status_codes=[429])
+        assert policy.is_retryable(429)
+        assert not policy.is_retryable(500)
+
+    def test_should_retry_other_exceptions(self):
+        policy = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+        def _http_error(status_code: int) -> requests.HTTPError:
+            response = requests.Response()
+            response.status_code = status_code
+            return requests.HTTPError(f"{status_code} error", response=response)
+
+        assert policy.should_retry(_http_error(503))
+        assert not policy.should_retry(_http_error(400))
+        assert policy.should_retry(requests.ConnectionError("connection reset"))
+        assert not policy.should_retry(ValueError("bad value"))
+
+        # response 不是 dashscope 的响应时，重试后抛出原来的异常
+        calls = []
+
+        def _fail():
+            calls.append(1)
+            raise _http_error(502)
+
+        with self.assertRaises(requests.HTTPError):
+            policy.retrying()(_fail)
+        assert len(calls) == 3
+
+    def test_default_policy_is_shared(self):
+        assert default_retry_policy(3) is default_retry_policy(3)
+        assert default_retry_policy(3) is not default_retry_policy(4)
+        assert default_retry_policy(3).max_retries == 3
+
+    def test_call_with_policy(self):
+        MockGeneration.max_fail_cnt = 3
+        policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(model="qwen-plus", prompt="retry policy", retry_policy=policy)
+        assert response.status_code == 200
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["level"] == "WARNING"
+        assert obs["metadata"]["run_cnt"] == 3
+        assert obs["metadata"]["max_retries"] == 5
+
+        # 同一个 policy 再次调用，统计信息是本次调用的
+        MockGeneration._reset_fail_cnt()
+        MockGeneration.max_fail_cnt = 1
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(model="qwen-plus", prompt="retry policy", retry_policy=policy)
+        assert response.status_code == 200
+        assert up.call_args.kwargs["metadata"] is None
+
+    def test_not_retryable_status_code(self):
+        MockGeneration.max_fail_cnt = 3
+        policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0, retryable_status_codes=[500])
+        response, retry_meta = MockGeneration.generate_with_retry(policy.max_retries, policy, model="qwen-plus")
+        assert response.status_code == 429
+        assert retry_meta is None
+        assert MockGeneration.fail_cnt == 1
+
+    def test_bad_request_no_retry(self):
+        policy = RetryPolicy(max_retries=5, min_seconds=0, max_seconds=0)
+        response, retry_meta = MockErrorGeneration.generate_with_retry(policy.max_retries, policy, model="qwen-plus")
+        assert response.status_code == 400
+        assert retry_meta is None
+
+    def test_retry_after_seconds(self):
+        assert retry_after_seconds({"headers": {"Retry-After": "2"}}) == 2
+        assert retry_after_seconds({"headers": {"retry-after": "0.5"}}) == 0.5
+        assert retry_after_seconds({"headers": {"X-Request-Id": "1"}}) is None
+        assert retry_after_seconds({"headers": None}) is None
+        assert retry_after_seconds(None) is None
+        seconds = retry_after_seconds({"headers": {"Retry-After": formatdate(time() + 30, usegmt=True)}})
+        assert seconds and 25 < seconds <= 30
+
+    def test_honor_retry_after(self):
+        MockGeneration.max_fail_cnt = 3
+        MockGeneration.fail_headers = {"Retry-After": "0"}
+        policy = RetryPolicy(max_retries=5, min_seconds=1, max_seconds=4)
+        response, retry_meta = MockGeneration.generate_with_retry(policy.max_retries, policy, model="qwen-plus")
+        assert response.status_code == 200
+        assert retry_meta
+        assert retry_meta["run_cnt"] == 3
+        assert retry_meta["idle_second"] == 0
+
+    def test_deadline(self):
+        MockGeneration.max_fail_cnt = 10
+        policy = RetryPolicy(max_retries=10, min_seconds=1, max_seconds=1)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(model="qwen-plus", prompt="deadline", retry_policy=policy, deadline=1.5)
+        assert response.status_code == 429
+        obs = up.call_args.kwargs
+        logger.info("observation=%s", obs)
+        assert obs["level"] == "ERROR"
+        # 第 2 次失败后再等 1 秒会超出 1.5 秒的总时长
+        assert obs["metadata"]["run_cnt"] == 2
+        assert obs["metadata"]["deadline_second"] == 1.5
+        assert obs["metadata"]["deadline_exceeded"] is True
+        assert obs["metadata"]["elapsed_second"] < 1.5
+
+    def test_policy_deadline(self):
+        policy = RetryPolicy(deadline=10)
+        assert policy.effective_deadline() == 10
+        assert policy.effective_deadline(3) == 3
+        assert policy.effective_deadline(30) == 10
+        assert RetryPolicy().effective_deadline() is None
+
+
+if __name__ == "__main__":
+    unittest.main()
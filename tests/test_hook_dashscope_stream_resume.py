@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockResumeGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RetryPolicy
+from langfarm.hooks.dashscope.exceptions import RetryGenerationException
+
+logger = get_test_logger(__name__)
+
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+
+class StreamResumeTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockResumeGeneration.reset()
+
+    def _call(self, **kwargs):
+        return MockResumeGeneration.call(
+            model="qwen-plus", prompt="写一句诗", stream=True, retry_policy=NO_WAIT_RETRY, **kwargs
+        )
+
+    def test_fail_fast(self):
+        texts = []
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            with self.assertRaises(RetryGenerationException):
+                for chunk in self._call(incremental_output=True):
+                    texts.append(chunk.output.text)
+        assert texts == ["春", "眠"]
+        assert len(MockResumeGeneration.requests) == 1
+        kwargs = up.call_args.kwargs
+        logger.info("metadata=%s", kwargs["metadata"])
+        # 已输出的内容和 usage 仍然上报
+        assert kwargs["level"] == "ERROR"
+        assert kwargs["output"] == "春眠"
+        assert kwargs["metadata"]["stream_error"] == "RetryGenerationException"
+        assert kwargs["metadata"]["stream_attempts"] == 1
+        assert kwargs["metadata"]["wasted_tokens"] == 12
+
+    def test_resume_continue(self):
+        texts = []
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            for chunk in self._call(incremental_output=True, stream_resumes=1):
+                texts.append(chunk.output.text)
+        assert "".join(texts) == MockResumeGeneration.text
+        resume_message = MockResumeGeneration.requests[1]["messages"][-1]
+        assert resume_message == {"role": "assistant", "content": "春眠", "partial": True}
+        kwargs = up.call_args.kwargs
+        logger.info("usage=%s, metadata=%s", kwargs["usage"], kwargs["metadata"])
+        assert kwargs["output"] == MockResumeGeneration.text
+        # usage 为两次请求的合计
+        assert kwargs["usage"]["input"] == 22
+        assert kwargs["usage"]["output"] == 5
+        assert kwargs["metadata"]["stream_resumes"] == 1
+        assert kwargs["metadata"]["wasted_tokens"] == 12
+        assert "stream_error" not in kwargs["metadata"]
+
+    def test_resume_echo(self):
+        # 服务端从头重新输出，重复的部分不交给调用方
+        MockResumeGeneration.reset(echo=True)
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            texts = [chunk.output.text for chunk in self._call(stream_resumes=1)]
+        assert texts == ["春", "春眠", "春眠不", "春眠不觉", "春眠不觉晓"]
+        metadata = up.call_args.kwargs["metadata"]
+        logger.info("metadata=%s", metadata)
+        # 续写请求的输入 10 个 token、重复输出的 2 个 token
+        assert metadata["wasted_tokens"] == 12
+
+    def test_resume_exhausted(self):
+        MockResumeGeneration.reset(fail_times=2)
+        texts = []
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            with self.assertRaises(RetryGenerationException):
+                for chunk in self._call(incremental_output=True, stream_resumes=1):
+                    texts.append(chunk.output.text)
+        assert "".join(texts) == "春眠不觉"
+        metadata = up.call_args.kwargs["metadata"]
+        logger.info("metadata=%s", metadata)
+        assert metadata["stream_attempts"] == 2
+        assert metadata["stream_error"] == "RetryGenerationException"
+
+    def test_async_resume(self):
+        async def _run():
+            texts = []
+            responses = await MockResumeGeneration.acall(
+                model="qwen-plus",
+                prompt="写一句诗",
+                stream=True,
+                incremental_output=True,
+                retry_policy=NO_WAIT_RETRY,
+                stream_resumes=1,
+            )
+            async for chunk in responses:
+                texts.append(chunk.output.text)
+            return texts
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            texts = asyncio.run(_run())
+        assert "".join(texts) == MockResumeGeneration.text
+        assert up.call_args.kwargs["metadata"]["stream_resumes"] == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+import dashscope
+from base import BaseTestCase, get_test_logger
+
+from langfarm.hooks.dashscope import Generation, RetryPolicy
+
+# 替身服务和压测工具在 benchmarks 目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+from dashscope_stub import StubOptions, StubServer  # type: ignore  # noqa: E402
+from load_gen import LoadGenerator  # type: ignore  # noqa: E402
+
+logger = get_test_logger(__name__)
+
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+
+class DashscopeStubTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = StubServer(StubOptions(output_tokens=5, seed=1)).start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(setattr, dashscope, "base_http_api_url", dashscope.base_http_api_url)
+        dashscope.base_http_api_url = self.server.base_url
+
+    def test_call(self):
+        response = Generation.call(model="qwen-plus", prompt="你好", api_key="stub")
+        assert response.status_code == 200
+        assert response.output.text == "春眠不觉晓"
+        assert response.usage.input_tokens == 2
+        assert response.usage.output_tokens == 5
+
+    def test_stream(self):
+        texts = [
+            chunk.output.choices[0].message.content
+            for chunk in Generation.call(
+                model="qwen-plus",
+                messages=[{"role": "user", "content": "你好"}],
+                result_format="message",
+                api_key="stub",
+                stream=True,
+                incremental_output=True,
+            )
+        ]
+        assert texts == ["春", "眠", "不", "觉", "晓"]
+
+    def test_retry_429(self):
+        self.server.options.error_429 = 0.5
+        retry_policy = RetryPolicy(max_retries=10, min_seconds=0, max_seconds=0)
+        for _ in range(5):
+            response = Generation.call(model="qwen-plus", prompt="你好", api_key="stub", retry_policy=retry_policy)
+            assert response.status_code == 200
+        logger.info("status counts=%s", self.server.status_counts)
+        assert self.server.status_counts[429] > 0
+
+    def test_load_generator(self):
+        call_kwargs = {"model": "qwen-plus", "prompt": "你好", "api_key": "stub", "retry_policy": NO_WAIT_RETRY}
+        report = LoadGenerator(qps=50, concurrency=4, duration=0.5, stream=True, call_kwargs=call_kwargs).run()
+        logger.info("report=%s", report)
+        assert report["requests"] == report["ok"] == 25
+        assert report["latency"]["p50_ms"] <= report["latency"]["max_ms"]
+        assert "ttft" in report
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context
+from mock import MockAsyncGeneration, MockGeneration, MockStreamGeneration  # type: ignore
+
+from langfarm.hooks.dashscope import RetryPolicy
+
+logger = get_test_logger(__name__)
+
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+
+class PhaseTimingTestCase(BaseTestCase):
+    def test_call_timing(self):
+        MockGeneration._reset_fail_cnt()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            response = MockGeneration.call(
+                model="qwen-plus", prompt="写一句诗", retry_policy=NO_WAIT_RETRY, phase_timing=1
+            )
+        assert response.status_code == 200
+        timing = up.call_args.kwargs["metadata"]["timing"]
+        logger.info("timing=%s", timing)
+        for key in ("do_call_ms", "check_ms", "output_ms", "observe_ms", "total_ms"):
+            assert key in timing
+        # 更新之后补上的 observe 耗时
+        assert timing["total_ms"] >= timing["do_call_ms"] + timing["observe_ms"]
+        assert "ttft_ms" not in timing
+
+    def test_stream_timing(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            for _ in MockStreamGeneration.call(
+                model="qwen-plus", prompt="写一句诗", stream=True, incremental_output=True, phase_timing=1
+            ):
+                time.sleep(0.01)
+        timing = up.call_args.kwargs["metadata"]["timing"]
+        logger.info("timing=%s", timing)
+        assert timing["chunk_cnt"] == len(MockStreamGeneration.chunks)
+        for key in ("ttft_ms", "chunk_wait_p50_ms", "chunk_wait_p95_ms", "chunk_wait_max_ms", "output_ms"):
+            assert key in timing
+        # 调用方处理 chunk 的时间不算在 chunk 的等待时间里
+        assert timing["consumer_ms"] >= 30
+        assert timing["chunk_wait_max_ms"] < 10
+
+    def test_async_stream_timing(self):
+        MockAsyncGeneration._reset_fail_cnt()
+
+        async def _run():
+            texts = []
+            async for chunk in await MockAsyncGeneration.acall(
+                model="qwen-plus", prompt="写一句诗", stream=True, incremental_output=True, phase_timing=1
+            ):
+                texts.append(chunk.output.text)
+            return texts
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            texts = asyncio.run(_run())
+        assert "".join(texts) == "".join(MockAsyncGeneration.chunks)
+        timing = up.call_args.kwargs["metadata"]["timing"]
+        logger.info("timing=%s", timing)
+        assert timing["chunk_cnt"] == len(MockAsyncGeneration.chunks)
+        assert "do_call_ms" in timing and "observe_ms" in timing
+
+    def test_no_timing(self):
+        MockGeneration._reset_fail_cnt()
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            MockGeneration.call(model="qwen-plus", prompt="写一句诗", retry_policy=NO_WAIT_RETRY)
+        metadata = up.call_args.kwargs.get("metadata") or {}
+        assert "timing" not in metadata
+
+
+if __name__ == "__main__":
+    unittest.main()
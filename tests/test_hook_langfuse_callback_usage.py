@@ -0,0 +1,92 @@
+import threading
+import unittest
+import uuid
+
+from base import BaseTestCase, get_test_logger
+from langchain_core.outputs import Generation, LLMResult
+
+from langfarm.hooks.langfuse.callback import CallbackHandler
+from langfarm.hooks.langfuse.callback.langchain import _parse_usage, _parse_usages
+
+logger = get_test_logger(__name__)
+
+
+def _llm_result(input_tokens: int, output_tokens: int) -> LLMResult:
+    token_usage = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
+    return LLMResult(generations=[[Generation(text="mock", generation_info={"token_usage": token_usage})]])
+
+
+class CallbackUsageTestCase(BaseTestCase):
+    def test_concurrent_runs(self):
+        handler = CallbackHandler()
+        parent_run_id = uuid.uuid4()
+        run_ids = [uuid.uuid4() for _ in range(50)]
+
+        def _end(i: int):
+            handler.on_llm_end(_llm_result(10, i), run_id=run_ids[i], parent_run_id=parent_run_id)
+
+        threads = [threading.Thread(target=_end, args=(i,)) for i in range(len(run_ids))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i, run_id in enumerate(run_ids):
+            assert handler.get_usage(run_id) == {"input": 10, "output": i, "total": 10 + i}
+        output = sum(range(len(run_ids)))
+        expected = {"input": 500, "output": output, "total": 500 + output}
+        assert handler.get_usage_by_parent(parent_run_id) == expected
+        assert handler.get_total_usage() == {**expected, "runs": 50}
+        assert handler.get_usage_by_parent(uuid.uuid4()) is None
+
+    def test_bounded(self):
+        handler = CallbackHandler()
+        handler.max_tracked_runs = 3
+        run_ids = [uuid.uuid4() for _ in range(5)]
+        for run_id in run_ids:
+            handler.on_llm_end(_llm_result(1, 1), run_id=run_id)
+        assert handler.get_usage(run_ids[0]) is None
+        assert handler.get_usage(run_ids[-1]) == {"input": 1, "output": 1, "total": 2}
+        # 总用量不受淘汰影响
+        assert handler.get_total_usage()["runs"] == 5
+        # 兼容：不传 run_id 返回最后一次的 usage
+        assert handler.get_usage() == {"input": 1, "output": 1, "total": 2}
+
+    def test_failed_run(self):
+        # 共享的 handler 中失败的 run 不留下记录，不计 usage
+        handler = CallbackHandler()
+        parent_run_id = uuid.uuid4()
+        ok_run_id, failed_run_id = uuid.uuid4(), uuid.uuid4()
+        handler.on_llm_end(_llm_result(10, 5), run_id=ok_run_id, parent_run_id=parent_run_id)
+        handler.on_llm_error(ValueError("mock"), run_id=failed_run_id, parent_run_id=parent_run_id)
+        assert list(handler._run_usages) == [ok_run_id]
+        assert handler.get_usage(failed_run_id) is None
+        assert handler.get_usage_by_parent(parent_run_id) == {"input": 10, "output": 5, "total": 15}
+        assert handler.get_total_usage()["runs"] == 1
+
+    def test_batched_llm_result(self):
+        token_usages = [(10, 1), (20, 2), (30, 3)]
+        generations = [_llm_result(i, o).generations[0] for i, o in token_usages]
+        # 第二个 prompt 没有 usage
+        generations.insert(1, [Generation(text="no usage")])
+        response = LLMResult(generations=generations)
+
+        usage, prompt_usages = _parse_usages(response)
+        assert usage == {"input": 60, "output": 6, "total": 66}
+        assert prompt_usages[1] is None
+        assert prompt_usages[3] == {"input": 30, "output": 3, "total": 33}
+        assert _parse_usage(LLMResult(generations=[[Generation(text="no usage")]])) is None
+
+        handler = CallbackHandler()
+        run_id = uuid.uuid4()
+        handler.on_llm_end(response, run_id=run_id)
+        assert handler.get_usage(run_id) == usage
+        assert handler.get_prompt_usages(run_id) == prompt_usages
+
+
+if __name__ == "__main__":
+    unittest.main()
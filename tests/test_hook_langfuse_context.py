@@ -0,0 +1,77 @@
+import threading
+import unittest
+
+from base import BaseTestCase, get_test_logger
+from langfuse.decorators import langfuse_context, observe
+
+from langfarm.hooks.langfuse.context import ContextThreadPoolExecutor, parent_observation_kwargs, wrap_context
+
+logger = get_test_logger(__name__)
+
+
+def _current_ids() -> tuple:
+    return langfuse_context.get_current_trace_id(), langfuse_context.get_current_observation_id()
+
+
+class LangfuseContextTestCase(BaseTestCase):
+    def test_executor(self):
+        @observe()
+        def _pipeline():
+            with ContextThreadPoolExecutor(4) as executor:
+                ids = list(executor.map(lambda _: _current_ids(), range(8)))
+            return _current_ids(), ids
+
+        expected, ids = _pipeline()
+        assert expected[0] is not None
+        assert ids == [expected] * 8
+
+    def test_nested_observe_in_thread(self):
+        @observe()
+        def _child():
+            return _current_ids()
+
+        @observe()
+        def _pipeline():
+            with ContextThreadPoolExecutor(2) as executor:
+                child_trace_id, child_id = executor.submit(_child).result()
+            trace_id, observation_id = _current_ids()
+            return trace_id, observation_id, child_trace_id, child_id
+
+        trace_id, observation_id, child_trace_id, child_id = _pipeline()
+        # 子 observation 在同一个 trace 下，且是新的 observation
+        assert child_trace_id == trace_id
+        assert child_id not in (None, observation_id)
+
+    def test_wrap_context(self):
+        results = []
+
+        @observe()
+        def _pipeline():
+            fn = wrap_context(lambda: results.append(_current_ids()))
+            threads = [threading.Thread(target=fn) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            return _current_ids()
+
+        expected = _pipeline()
+        assert results == [expected] * 3
+
+    def test_parent_observation_kwargs(self):
+        assert parent_observation_kwargs() == {}
+
+        @observe()
+        def _inner():
+            return parent_observation_kwargs(), _current_ids()
+
+        @observe()
+        def _pipeline():
+            return _inner()
+
+        kwargs, (trace_id, observation_id) = _pipeline()
+        assert kwargs == {"langfuse_parent_trace_id": trace_id, "langfuse_parent_observation_id": observation_id}
+
+
+if __name__ == "__main__":
+    unittest.main()
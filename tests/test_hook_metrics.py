@@ -0,0 +1,166 @@
+import threading
+import unittest
+import urllib.request
+from typing import Any
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langchain_community.llms import tongyi
+from langfuse.decorators import langfuse_context
+from mock import MockGeneration, MockResumeGeneration, MockStreamGeneration  # type: ignore
+from requests.exceptions import HTTPError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+
+from langfarm.hooks.dashscope import RetryPolicy
+from langfarm.hooks.langchain_community.llms.tongyi import Tongyi
+from langfarm.hooks.metrics import (
+    GenerationMetrics,
+    MetricsRegistry,
+    PeriodicExporter,
+    disable_metrics,
+    enable_metrics,
+    start_http_server,
+)
+
+logger = get_test_logger(__name__)
+
+NO_WAIT_RETRY = RetryPolicy(max_retries=3, min_seconds=0, max_seconds=0)
+
+
+def _sample(metrics: GenerationMetrics, name: str, **labels: str) -> float:
+    for family in metrics.registry.collect():
+        for sample_name, sample_labels, value in family.samples:
+            if sample_name == name and sample_labels == labels:
+                return value
+    return 0
+
+
+class MetricsRegistryTestCase(BaseTestCase):
+    def test_thread_aggregation(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total", "test", ("model",))
+        histogram = registry.histogram("test_seconds", "test", ("model",), (0.1, 1))
+
+        def _record():
+            for _ in range(1000):
+                counter.inc("qwen-plus")
+                histogram.observe(0.5, "qwen-plus")
+
+        threads = [threading.Thread(target=_record) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        counter.inc("qwen-max", value=2)
+        # 线程结束后分片合并到 retired，多次采集结果不变
+        for _ in range(2):
+            assert counter.values() == {("qwen-plus",): 4000, ("qwen-max",): 2}
+        assert histogram.values()[("qwen-plus",)] == [0, 4000, 0, 2000.0]
+
+    def test_exposition(self):
+        registry = MetricsRegistry()
+        registry.counter("test_total", "test counter", ("status",)).inc('4"29')
+        registry.histogram("test_seconds", "test histogram", (), (0.1, 1)).observe(0.5)
+        text = registry.exposition()
+        logger.info("exposition:\n%s", text)
+        assert "# TYPE test_total counter" in text
+        assert 'test_total{status="4\\"29"} 1' in text
+        assert 'test_seconds_bucket{le="0.1"} 0' in text
+        assert 'test_seconds_bucket{le="1"} 1' in text
+        assert 'test_seconds_bucket{le="+Inf"} 1' in text
+        assert "test_seconds_count 1" in text
+
+        with self.assertRaises(ValueError):
+            registry.histogram("test_total", "conflict")
+
+    def test_http_server_and_exporter(self):
+        registry = MetricsRegistry()
+        registry.counter("test_total", "test").inc()
+        server = start_http_server(0, registry=registry)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as resp:
+            assert "test_total 1" in resp.read().decode("utf-8")
+
+        exported = []
+        exporter = PeriodicExporter(exported.append, interval=60, registry=registry).start()
+        exporter.stop()
+        assert exported[0][0].samples == [("test_total", {}, 1)]
+
+
+def _no_wait_retry_decorator(llm: Any):
+    return retry(reraise=True, stop=stop_after_attempt(llm.max_retries), retry=retry_if_exception_type(HTTPError))
+
+
+class MockClient:
+    """第一次返回 429，之后成功。"""
+
+    call_cnt = 0
+
+    @classmethod
+    def call(cls, **kwargs: Any) -> Any:
+        cls.call_cnt += 1
+        status_code = 429 if cls.call_cnt == 1 else 200
+        return {
+            "status_code": status_code,
+            "request_id": "mock",
+            "code": "" if status_code == 200 else "Throttling",
+            "message": "",
+            "output": {"text": "春天", "finish_reason": "stop"},
+            "usage": {"input_tokens": 10, "output_tokens": 2, "total_tokens": 12},
+        }
+
+
+class GenerationMetricsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics = enable_metrics(GenerationMetrics())
+        self.addCleanup(disable_metrics)
+        patcher = mock.patch.object(langfuse_context, "update_current_observation")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_call_with_retry(self):
+        MockGeneration._reset_fail_cnt()
+        response = MockGeneration.call(model="qwen-plus", prompt="metrics", retry_policy=NO_WAIT_RETRY)
+        assert response.status_code == 200
+        logger.info("exposition:\n%s", self.metrics.registry.exposition())
+        assert _sample(self.metrics, "langfarm_attempts_total", model="qwen-plus", status="429") == 2
+        assert _sample(self.metrics, "langfarm_attempts_total", model="qwen-plus", status="200") == 1
+        assert _sample(self.metrics, "langfarm_requests_total", model="qwen-plus", status="200") == 1
+        assert _sample(self.metrics, "langfarm_request_duration_seconds_count", model="qwen-plus", status="200") == 1
+        assert _sample(self.metrics, "langfarm_tokens_total", model="qwen-plus", type="output") == 5
+
+    def test_stream(self):
+        MockStreamGeneration.call_cnt = 0
+        responses = MockStreamGeneration.call(model="qwen-plus", prompt="metrics", stream=True, incremental_output=True)
+        assert len(list(responses)) == 3
+        assert _sample(self.metrics, "langfarm_ttft_seconds_count", model="qwen-plus") == 1
+        assert _sample(self.metrics, "langfarm_inter_chunk_seconds_count", model="qwen-plus") == 2
+        assert _sample(self.metrics, "langfarm_stream_chunks_total", model="qwen-plus") == 3
+        assert _sample(self.metrics, "langfarm_requests_total", model="qwen-plus", status="200") == 1
+        assert _sample(self.metrics, "langfarm_tokens_total", model="qwen-plus", type="output") == 3
+
+    def test_stream_error(self):
+        MockResumeGeneration.reset()
+        with self.assertRaises(Exception):
+            for _ in MockResumeGeneration.call(model="qwen-plus", prompt="metrics", stream=True):
+                pass
+        assert _sample(self.metrics, "langfarm_requests_total", model="qwen-plus", status="500") == 1
+        assert _sample(self.metrics, "langfarm_stream_chunks_total", model="qwen-plus") == 2
+
+    def test_tongyi(self):
+        MockClient.call_cnt = 0
+        patcher = mock.patch.object(tongyi, "_create_retry_decorator", _no_wait_retry_decorator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        llm = Tongyi(model="qwen-plus", api_key="mock", max_retries=3)
+        llm.client = MockClient
+        assert llm.invoke("春天") == "春天"
+        assert _sample(self.metrics, "langfarm_attempts_total", model="qwen-plus", status="429") == 1
+        assert _sample(self.metrics, "langfarm_requests_total", model="qwen-plus", status="200") == 1
+        assert _sample(self.metrics, "langfarm_tokens_total", model="qwen-plus", type="input") == 10
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from base import BaseTestCase, get_test_logger
+
+from langfarm.hooks.misc import OutputAccumulator, StreamStats, percentile
+
+logger = get_test_logger(__name__)
+
+
+class OutputAccumulatorTestCase(BaseTestCase):
+    def test_incremental(self):
+        acc = OutputAccumulator()
+        for chunk in ["春天", "，", "大地复苏"]:
+            acc.add(chunk)
+        assert acc.getvalue() == "春天，大地复苏"
+        assert acc.total_chars == 7
+        assert not acc.truncated
+
+    def test_not_incremental(self):
+        acc = OutputAccumulator(incremental=False)
+        for chunk in ["春", "春天", "春天到了"]:
+            acc.add(chunk)
+        assert acc.getvalue() == "春天到了"
+
+    def test_max_chars(self):
+        acc = OutputAccumulator(max_chars=10)
+        text = "".join(str(i % 10) for i in range(1000))
+        for i in range(0, len(text), 7):
+            acc.add(text[i : i + 7])
+        output = acc.getvalue()
+        logger.info("output=%s", output)
+        assert acc.truncated
+        assert acc.total_chars == 1000
+        assert output == "01234...[truncated 990 chars]...56789"
+        # 尾部最多多保留一个 chunk
+        assert acc._tail_len <= 5 + 7
+
+    def test_max_chars_not_incremental(self):
+        acc = OutputAccumulator(incremental=False, max_chars=4)
+        acc.add("abc")
+        assert acc.getvalue() == "abc"
+        acc.add("abcdefgh")
+        assert acc.getvalue() == "ab...[truncated 4 chars]...gh"
+
+
+class StreamStatsTestCase(BaseTestCase):
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 0.5) == 51
+        assert percentile(values, 0.95) == 96
+        assert percentile([], 0.5) == 0
+
+    def test_stream_stats(self):
+        stats = StreamStats(start=10.0)
+        assert stats.to_meta() == {"chunk_cnt": 0}
+        for now in (10.5, 10.6, 10.7, 11.5):
+            stats.add_chunk(now)
+        meta = stats.to_meta(output_tokens=100)
+        assert meta["ttft_second"] == 0.5
+        assert meta["chunk_cnt"] == 4
+        assert meta["inter_chunk_p50_second"] == 0.1
+        assert meta["inter_chunk_max_second"] == 0.8
+        assert meta["tokens_per_second"] == 100.0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import subprocess
+import sys
+import unittest
+
+from base import BaseTestCase, get_test_logger
+
+from langfarm.hooks import install, installed_hooks, measure_import_time, uninstall
+from langfarm.hooks.registry import Hook, Patch, _hooks, _version_tuple, register
+
+logger = get_test_logger(__name__)
+
+
+class Target:
+    def hello(self) -> str:
+        return "origin"
+
+
+def hooked_hello(self) -> str:
+    return "hooked"
+
+
+def other_hello(self) -> str:
+    return "other"
+
+
+def _hook(name: str, requires=None) -> Hook:
+    return Hook(name, [Patch(f"{__name__}:Target.hello", f"{__name__}:hooked_hello")], requires)
+
+
+class HookRegistryTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        register(_hook("test_target"))
+        # cleanup 按相反顺序执行：卸载、移除 hook、恢复 Target
+        self.addCleanup(setattr, Target, "hello", Target.__dict__["hello"])
+        self.addCleanup(_hooks.pop, "test_target", None)
+        self.addCleanup(uninstall, "test_target")
+
+    def test_install_uninstall(self):
+        assert install("test_target") == ["test_target"]
+        # 重复安装不重复打补丁
+        assert install("test_target") == ["test_target"]
+        assert Target().hello() == "hooked"
+        assert "test_target" in installed_hooks()
+
+        assert uninstall("test_target") == ["test_target"]
+        assert uninstall("test_target") == []
+        assert Target().hello() == "origin"
+
+    def test_version_guard(self):
+        register(_hook("test_target", {"langfuse": ("0.1", "1.0")}))
+        assert install("test_target") == []
+        assert Target().hello() == "origin"
+        assert install("test_target", force=True) == ["test_target"]
+        assert Target().hello() == "hooked"
+
+        missing = _hook("test_missing", {"not-a-real-dist": ("0", None)})
+        assert "not installed" in missing.check_requires()  # type: ignore
+
+    def test_uninstall_replaced(self):
+        install("test_target")
+        # 安装后被其他代码替换，卸载时不覆盖
+        Target.hello = other_hello  # type: ignore
+        uninstall("test_target")
+        assert Target().hello() == "other"
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            install("not_a_hook")
+
+    def test_version_tuple(self):
+        assert _version_tuple("0.3.31") == (0, 3, 31)
+        assert _version_tuple("2.60.10rc1") == (2, 60, 10)
+        assert _version_tuple("3") > _version_tuple("2.60.10")
+
+    def test_lazy_import(self):
+        # 导入 langfarm.hooks 不导入 langchain、dashscope
+        code = "import sys, langfarm.hooks; print(any(m.split('.')[0] in ('langchain_community', 'dashscope') for m in sys.modules))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "False"
+
+    def test_missing_dashscope(self):
+        # 没有安装 dashscope 时提示安装
+        code = (
+            "import sys; sys.modules['dashscope'] = None\n"
+            "try:\n    import langfarm.hooks.dashscope.generation\n"
+            "except ModuleNotFoundError as e:\n    print(e)"
+        )
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        assert "pip install dashscope" in output
+
+    def test_measure_import_time(self):
+        cost = measure_import_time("tongyi")
+        logger.info("import cost=%s", cost)
+        assert cost["tongyi"]["installed"] == ["tongyi"]
+        assert cost["tongyi"]["total"] >= cost["tongyi"]["registry"]
+
+
+if __name__ == "__main__":
+    unittest.main()
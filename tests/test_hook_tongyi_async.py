@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+from typing import Any, List
+from unittest import mock
+
+from base import BaseTestCase, get_test_logger
+from langchain_community.llms import tongyi
+from langfuse.decorators import langfuse_context
+from requests.exceptions import HTTPError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+
+from langfarm.hooks.langchain_community.llms.tongyi import Tongyi
+
+logger = get_test_logger(__name__)
+
+
+def _no_wait_retry_decorator(llm: Any):
+    return retry(reraise=True, stop=stop_after_attempt(llm.max_retries), retry=retry_if_exception_type(HTTPError))
+
+
+def _response(status_code: int, text: str = "", output_tokens: int = 0) -> dict:
+    return {
+        "status_code": status_code,
+        "request_id": "mock",
+        "code": "" if status_code == 200 else "Throttling",
+        "message": "",
+        "output": {"text": text, "finish_reason": "stop" if status_code == 200 else None},
+        "usage": {"input_tokens": 10, "output_tokens": output_tokens, "total_tokens": 10 + output_tokens},
+    }
+
+
+class MockClient:
+    """前 fail_cnt 次返回 429，之后成功。stream 时按 chunks 增量返回。"""
+
+    fail_cnt = 1
+    call_cnt = 0
+    chunks: List[str] = ["春", "天"]
+
+    @classmethod
+    def call(cls, **kwargs: Any) -> Any:
+        cls.call_cnt += 1
+        if cls.call_cnt <= cls.fail_cnt:
+            response = _response(429)
+            return iter([response]) if kwargs.get("stream") else response
+        if kwargs.get("stream"):
+            return iter(_response(200, text, i + 1) for i, text in enumerate(cls.chunks))
+        return _response(200, "".join(cls.chunks), len(cls.chunks))
+
+
+class HookTongyiAsyncTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        MockClient.call_cnt = 0
+        MockClient.fail_cnt = 1
+        patcher = mock.patch.object(tongyi, "_create_retry_decorator", _no_wait_retry_decorator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.llm = Tongyi(model="qwen-plus", api_key="mock", max_retries=3)
+        self.llm.client = MockClient
+
+    def _retry_meta(self, up: mock.MagicMock) -> dict:
+        calls = [c.kwargs for c in up.call_args_list if "metadata" in c.kwargs]
+        assert len(calls) == 1
+        return calls[0]
+
+    def test_ainvoke(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = asyncio.run(self.llm.ainvoke("春天"))
+        assert output == "春天"
+        obs = self._retry_meta(up)
+        logger.info("observation=%s", obs)
+        assert obs["level"] == "WARNING"
+        assert obs["metadata"]["run_cnt"] == 2
+
+    def test_ainvoke_error(self):
+        MockClient.fail_cnt = 5
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            with self.assertRaises(HTTPError):
+                asyncio.run(self.llm.ainvoke("春天"))
+        obs = self._retry_meta(up)
+        assert obs["level"] == "ERROR"
+        assert obs["metadata"]["run_cnt"] == 3
+
+    def test_stream(self):
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = "".join(self.llm.stream("春天"))
+        assert output == "春天"
+        assert MockClient.call_cnt == 2
+        assert any("completion_start_time" in c.kwargs for c in up.call_args_list)
+        # 流结束时的 metadata 包含重试信息和延迟统计
+        metadata = up.call_args.kwargs["metadata"]
+        logger.info("metadata=%s", metadata)
+        assert metadata["run_cnt"] == 2
+        assert metadata["chunk_cnt"] == 2
+        assert metadata["ttft_second"] >= 0
+        assert "inter_chunk_p95_second" in metadata
+
+    def test_astream(self):
+        async def _astream() -> str:
+            return "".join([chunk async for chunk in self.llm.astream("春天")])
+
+        with mock.patch.object(langfuse_context, "update_current_observation") as up:
+            output = asyncio.run(_astream())
+        assert output == "春天"
+        assert any("completion_start_time" in c.kwargs for c in up.call_args_list)
+        metadata = up.call_args.kwargs["metadata"]
+        assert metadata["run_cnt"] == 2
+        assert metadata["chunk_cnt"] == 2
+
+
+if __name__ == "__main__":
+    unittest.main()